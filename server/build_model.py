@@ -0,0 +1,232 @@
+"""
+Content-addressed model build: train -> convert -> headers.
+
+Each stage hashes its inputs (the training set's content manifest, roi.json,
+the scripts it runs and their hyperparameters) and is skipped when they are
+unchanged since it last produced the artifact that is currently in place.
+Artifacts are also cached under build_cache/<stage>/<key>/, so going back to
+an earlier dataset or script version restores them instead of rebuilding.
+The header step writes every model_data.h copy (server/, esp32gate/,
+tester/) and leaves those whose bytes are already right untouched.
+
+Exit codes: 0 built (or up to date), 1 a stage failed or a fine-tune
+regressed (nothing deployed), or the model has int8 input and the sketch
+headers were refused (the ESP32 sketches only feed float32).
+
+Usage: python build_model.py [--full] [--int8 [--float-io]] [--force]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from preprocessing import load_roi
+from dataset_store import open_dataset
+from model_header import HEADER_PATHS, deploy_headers
+
+DATA_DIR = "./data"
+ROI_PATH = "roi.json"
+KERAS_PATH = "gate_detector_tiny.keras"
+MANIFEST_PATH = "gate_detector_tiny.train.json"
+TFLITE_PATH = "gate_detector_tiny.tflite"
+REPORT_PATH = "quantization_report.json"
+CACHE_DIR = "build_cache"
+STATE_PATH = os.path.join(CACHE_DIR, "state.json")
+# Cache entries kept per stage (most recently used first).
+CACHE_KEEP = 8
+
+# Code each stage depends on; an edit to any of these reruns the stage.
+COMMON_SOURCES = ["preprocessing.py", "dataset_store.py", "parallel_loader.py"]
+TRAIN_SOURCES = {"full": ["train_tiny_cnn.py", "training_data.py"],
+                 "finetune": ["finetune_tiny_cnn.py", "training_data.py"]}
+CONVERT_SOURCES = ["convert_tiny_cnn.py", "model_eval.py", "interpreter_pool.py", "model_header.py"]
+# Environment hyperparameters read by the training scripts.
+TRAIN_ENV = ["GATE_TRAIN_SEED", "GATE_FINETUNE_EPOCHS", "GATE_FINETUNE_TOLERANCE"]
+
+
+def sha256_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path):
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    except FileNotFoundError:
+        return None
+    return h.hexdigest()
+
+
+def digest(obj):
+    return sha256_bytes(json.dumps(obj, sort_keys=True).encode())
+
+
+def dataset_digest(dataset):
+    """Hash of the training set's content and labels; renaming or reordering files does not change it."""
+    return digest(sorted(zip(dataset.hashes, dataset.labels.tolist())))
+
+
+def load_state():
+    try:
+        with open(STATE_PATH, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = STATE_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_PATH)
+
+
+# === Artifact cache ===
+def cache_path(stage, key):
+    return os.path.join(CACHE_DIR, stage, key)
+
+
+def cache_store(stage, key, files):
+    """Copies the stage's output files into the cache and drops the oldest entries."""
+    entry = cache_path(stage, key)
+    os.makedirs(entry, exist_ok=True)
+    for path in files:
+        if os.path.exists(path):
+            shutil.copy2(path, os.path.join(entry, os.path.basename(path)))
+    stage_dir = os.path.join(CACHE_DIR, stage)
+    entries = sorted((os.path.join(stage_dir, name) for name in os.listdir(stage_dir)),
+                     key=os.path.getmtime, reverse=True)
+    for old in entries[CACHE_KEEP:]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def cache_restore(stage, key, files):
+    """Copies cached outputs back into place. Returns False if the entry is missing or incomplete."""
+    entry = cache_path(stage, key)
+    cached = [os.path.join(entry, os.path.basename(path)) for path in files]
+    if not all(os.path.exists(p) for p in cached):
+        return False
+    for src, dst in zip(cached, files):
+        shutil.copy2(src, dst)
+    os.utime(entry)  # most recently used
+    return True
+
+
+def run_script(*args):
+    print(f">>> {' '.join(args)}")
+    return subprocess.run([sys.executable, *args]).returncode
+
+
+# === Stages ===
+def stage_up_to_date(state, stage, inputs, output_path, force):
+    """The artifact in place was built from exactly these inputs and has not been touched since."""
+    previous = state.get(stage)
+    return (not force and previous is not None and previous["inputs"] == inputs
+            and previous["output"] == sha256_file(output_path))
+
+
+def train_stage(state, data_hash, roi, mode, force):
+    """
+    Returns "skipped", "restored", "built", "unchanged" (a fine-tune found
+    nothing new), "no model" (fine-tune exit 2) or "failed".
+    """
+    inputs = digest({"mode": mode, "data": data_hash, "roi": roi,
+                     "sources": {p: sha256_file(p) for p in COMMON_SOURCES + TRAIN_SOURCES[mode]},
+                     "env": {name: os.environ.get(name) for name in TRAIN_ENV}})
+    if stage_up_to_date(state, "train", inputs, KERAS_PATH, force):
+        return "skipped"
+    # A fine-tune's output also depends on the model it starts from.
+    key = digest([inputs, sha256_file(KERAS_PATH)]) if mode == "finetune" else inputs
+    outputs = [KERAS_PATH, MANIFEST_PATH]
+    if not force and cache_restore("train", key, outputs):
+        result = "restored"
+    else:
+        before = sha256_file(KERAS_PATH)
+        script = "train_tiny_cnn.py" if mode == "full" else "finetune_tiny_cnn.py"
+        status = run_script(script)
+        if status != 0:
+            return "no model" if mode == "finetune" and status == 2 else "failed"
+        cache_store("train", key, outputs)
+        result = "unchanged" if sha256_file(KERAS_PATH) == before else "built"
+    state["train"] = {"inputs": inputs, "output": sha256_file(KERAS_PATH), "mode": mode,
+                      "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    return result
+
+
+def convert_stage(state, data_hash, convert_args, force):
+    inputs = digest({"keras": sha256_file(KERAS_PATH), "args": convert_args,
+                     # int8 calibration reads the training set
+                     "data": data_hash if "--int8" in convert_args else None,
+                     "sources": {p: sha256_file(p) for p in COMMON_SOURCES + CONVERT_SOURCES}})
+    if stage_up_to_date(state, "convert", inputs, TFLITE_PATH, force):
+        return "skipped"
+    outputs = [TFLITE_PATH] + ([REPORT_PATH] if "--int8" in convert_args else [])
+    if not force and cache_restore("convert", inputs, outputs):
+        result = "restored"
+    else:
+        if run_script("convert_tiny_cnn.py", *convert_args) != 0:
+            return "failed"
+        cache_store("convert", inputs, outputs)
+        result = "built"
+    state["convert"] = {"inputs": inputs, "output": sha256_file(TFLITE_PATH),
+                        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train, convert and deploy the model, skipping unchanged stages")
+    parser.add_argument("--full", action="store_true", help="train from scratch instead of fine-tuning")
+    parser.add_argument("--int8", action="store_true", help="full-integer quantized conversion")
+    parser.add_argument("--float-io", action="store_true", help="with --int8, keep float32 input/output")
+    parser.add_argument("--force", action="store_true", help="rebuild every stage")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    state = load_state()
+    roi = list(load_roi(ROI_PATH))
+    data_hash = dataset_digest(open_dataset(DATA_DIR, roi, "box48"))
+
+    # 1. Train (fine-tune unless asked for a full training or there is nothing to start from)
+    mode = "full" if args.full or not (os.path.exists(KERAS_PATH) and os.path.exists(MANIFEST_PATH)) else "finetune"
+    train = train_stage(state, data_hash, roi, mode, args.force)
+    if train == "no model":
+        print("No model to fine-tune from, running a full training.")
+        mode = "full"
+        train = train_stage(state, data_hash, roi, mode, args.force)
+    print(f"Train ({mode}): {train}")
+    if train == "failed":
+        print("❌ Training failed or regressed. Not deploying.")
+        return 1
+    save_state(state)
+
+    # 2. Convert
+    convert_args = (["--int8"] if args.int8 else []) + (["--float-io"] if args.float_io else [])
+    convert = convert_stage(state, data_hash, convert_args, args.force)
+    print(f"Convert: {convert}")
+    if convert == "failed":
+        print("❌ Conversion failed. Not deploying.")
+        return 1
+    save_state(state)
+
+    # 3. Headers for the server and both sketches
+    with open(TFLITE_PATH, "rb") as f:
+        results = deploy_headers(f.read())
+    for path in HEADER_PATHS:
+        print(f"Header {os.path.normpath(path)}: {results[path]}")
+    if "refused" in results.values():
+        print("❌ The sketches feed the model float32 input, but this model's input is not float32. "
+              "Their headers were left as they were; rebuild with --int8 --float-io to deploy it there.")
+        return 1
+    print(f"Build finished in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
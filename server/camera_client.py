@@ -0,0 +1,277 @@
+import asyncio
+import base64
+import http.client
+import io
+import queue
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+from PIL import Image
+
+# Matches MAX_JPG_SIZE in the ESP32 firmware; grown on demand for larger frames.
+DEFAULT_BUFFER_SIZE = 256 * 1024
+
+
+class CameraError(Exception):
+    """Raised when a snapshot cannot be fetched after all retries; status is the camera's HTTP error code, if any."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def is_transient(error):
+    """True for a camera error worth retrying: a 5xx answer."""
+    return error.status is not None and error.status >= 500
+
+
+class _Connection:
+    """A keep-alive connection plus the receive buffer reused across requests."""
+
+    def __init__(self, buffer_size):
+        self.conn = None
+        self.buffer = bytearray(buffer_size)
+
+
+class CameraClient:
+    """
+    HTTP snapshot client for the gate camera. Keeps a small pool of persistent
+    keep-alive connections, applies separate connect and read timeouts, reads
+    each body into a preallocated per-connection buffer and retries failed
+    fetches in-process with a short backoff. read_timeout bounds the whole
+    response of an attempt, not just each socket read, so a camera dripping
+    a few bytes at a time cannot hold a fetch open.
+    """
+
+    def __init__(self, url, user=None, password=None, connect_timeout=3.0, read_timeout=5.0,
+                 retries=2, backoff=0.25, pool_size=2, buffer_size=DEFAULT_BUFFER_SIZE):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported camera URL scheme: {parts.scheme}")
+        self.url = url
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path + (f"?{parts.query}" if parts.query else "")
+        self._headers = {"Connection": "keep-alive"}
+        if user is not None:
+            auth_b64 = base64.b64encode(f"{user}:{password}".encode("ascii")).decode("ascii")
+            self._headers["Authorization"] = "Basic " + auth_b64
+
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+
+        self._pool = queue.LifoQueue()
+        for _ in range(pool_size):
+            self._pool.put(_Connection(buffer_size))
+
+        self._lock = threading.Lock()
+        self._fetches = 0
+        self._retries = 0
+        self._errors = 0
+        self._connects = 0
+
+    def _connect(self, slot):
+        cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        conn = cls(self._host, self._port, timeout=self.connect_timeout)
+        conn.connect()
+        # Connect timeout only covers the handshake; reads get their own limit.
+        conn.sock.settimeout(self.read_timeout)
+        conn.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        slot.conn = conn
+        with self._lock:
+            self._connects += 1
+
+    def _remaining(self, slot, deadline):
+        """Limits the next socket read to what is left of the attempt's deadline."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Camera response took longer than {self.read_timeout}s")
+        slot.conn.sock.settimeout(remaining)
+
+    def _read_body(self, response, slot, deadline):
+        expected = response.length
+        if expected is not None and expected > len(slot.buffer):
+            slot.buffer = bytearray(expected)
+        total = 0
+        while True:
+            if total == len(slot.buffer):
+                slot.buffer.extend(bytearray(len(slot.buffer)))
+            self._remaining(slot, deadline)
+            # read1 makes a single socket read; readinto would block until the
+            # whole Content-Length arrived and never check the deadline.
+            chunk = response.read1(len(slot.buffer) - total)
+            if not chunk:
+                break
+            slot.buffer[total:total + len(chunk)] = chunk
+            total += len(chunk)
+        # read1 leaves a fully read Content-Length response open; close it so
+        # the keep-alive connection accepts the next request.
+        response.close()
+        # A connection closed mid-body would otherwise hand back a truncated JPEG.
+        if expected is not None and total < expected:
+            raise http.client.IncompleteRead(bytes(slot.buffer[:total]), expected - total)
+        with memoryview(slot.buffer) as view, view[:total] as body:
+            return bytes(body)
+
+    def _fetch_once(self, slot):
+        if slot.conn is None:
+            self._connect(slot)
+        deadline = time.monotonic() + self.read_timeout
+        self._remaining(slot, deadline)
+        slot.conn.request("GET", self._path, headers=self._headers)
+        response = slot.conn.getresponse()
+        body = self._read_body(response, slot, deadline)
+        if response.will_close:
+            slot.conn.close()
+            slot.conn = None
+        if response.status != 200:
+            raise CameraError(f"Camera returned HTTP {response.status}", response.status)
+        return body
+
+    def fetch(self):
+        """Returns the raw JPEG bytes of a fresh snapshot or raises CameraError."""
+        with self._lock:
+            self._fetches += 1
+        try:
+            slot = self._pool.get(timeout=self.connect_timeout + self.read_timeout)
+        except queue.Empty:
+            with self._lock:
+                self._errors += 1
+            raise CameraError("No camera connection available")
+
+        try:
+            last_error = None
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    with self._lock:
+                        self._retries += 1
+                    time.sleep(self.backoff * attempt)
+                try:
+                    return self._fetch_once(slot)
+                except CameraError as e:
+                    # The camera answered, so the connection is healthy. A 5xx
+                    # (busy, restarting) may clear up; a 4xx such as bad
+                    # credentials or a wrong path will not.
+                    last_error = e
+                    if not is_transient(e):
+                        break
+                except (OSError, http.client.HTTPException) as e:
+                    # Stale keep-alive socket, timeout or reset: reconnect and retry.
+                    last_error = e
+                    if slot.conn is not None:
+                        slot.conn.close()
+                        slot.conn = None
+            with self._lock:
+                self._errors += 1
+            raise CameraError(f"Camera fetch failed after {attempt + 1} attempt(s): {last_error}",
+                              getattr(last_error, "status", None))
+        finally:
+            self._pool.put(slot)
+
+    def fetch_image(self):
+        """Fetches a snapshot and returns it as a PIL Image."""
+        return Image.open(io.BytesIO(self.fetch()))
+
+    def close(self):
+        """Closes idle keep-alive connections; they reopen on the next fetch."""
+        slots = []
+        while True:
+            try:
+                slots.append(self._pool.get_nowait())
+            except queue.Empty:
+                break
+        for slot in slots:
+            if slot.conn is not None:
+                slot.conn.close()
+                slot.conn = None
+            self._pool.put(slot)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "fetches": self._fetches,
+                "retries": self._retries,
+                "errors": self._errors,
+                "connects": self._connects,
+            }
+
+
+class AsyncCameraClient:
+    """
+    asyncio counterpart of CameraClient for gate_async.py: one aiohttp session
+    with a keep-alive connection pool, separate connect/read timeouts and the
+    same in-process retry policy. Requires aiohttp.
+    """
+
+    def __init__(self, url, user=None, password=None, connect_timeout=3.0, read_timeout=5.0,
+                 retries=2, backoff=0.25, pool_size=2):
+        # Imported here so the sync server does not pay for it at startup.
+        try:
+            import aiohttp
+        except ImportError:
+            raise RuntimeError("aiohttp is required for AsyncCameraClient (pip install aiohttp)")
+        self._aiohttp = aiohttp
+        self.url = url
+        self._auth = aiohttp.BasicAuth(user, password) if user is not None else None
+        # total bounds a whole attempt, like CameraClient's per-attempt deadline.
+        self._timeout = aiohttp.ClientTimeout(total=connect_timeout + read_timeout,
+                                              sock_connect=connect_timeout, sock_read=read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self._session = None
+
+        self._fetches = 0
+        self._retries = 0
+        self._errors = 0
+
+    def _get_session(self):
+        # Created lazily so it binds to the running event loop.
+        if self._session is None or self._session.closed:
+            connector = self._aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=30)
+            self._session = self._aiohttp.ClientSession(connector=connector, timeout=self._timeout, auth=self._auth)
+        return self._session
+
+    async def _fetch_once(self):
+        async with self._get_session().get(self.url) as response:
+            body = await response.read()
+            if response.status != 200:
+                raise CameraError(f"Camera returned HTTP {response.status}", response.status)
+            return body
+
+    async def fetch(self):
+        """Returns the raw JPEG bytes of a fresh snapshot or raises CameraError."""
+        self._fetches += 1
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._retries += 1
+                await asyncio.sleep(self.backoff * attempt)
+            try:
+                return await self._fetch_once()
+            except CameraError as e:
+                last_error = e
+                if not is_transient(e):
+                    break
+            except (self._aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                last_error = e
+        self._errors += 1
+        raise CameraError(f"Camera fetch failed after {attempt + 1} attempt(s): {last_error!r}",
+                          getattr(last_error, "status", None))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def stats(self):
+        return {
+            "fetches": self._fetches,
+            "retries": self._retries,
+            "errors": self._errors,
+        }
@@ -0,0 +1,263 @@
+"""
+Stand-in for the Hikvision camera's ISAPI snapshot endpoint.
+
+Serves JPEGs from a directory on the same path as the real camera, behind
+Basic auth, so gate.py, the ESP32 tester sketch and the benchmarks can run
+without hardware. Faults seen in production can be injected: latency and
+jitter, HTTP errors, dropped connections and slow-drip bodies (a few bytes
+at a time, which a per-read socket timeout never trips).
+
+With --sequence the served label follows a script such as
+"closed:20,open:5,closed:30s": 20 requests from <frames>/closed, then 5 from
+<frames>/open, then closed for 30 seconds, then it starts over.
+
+Usage: python camera_simulator.py --frames data/train [--port 8080] [--latency 50 --jitter 20]
+         [--error-rate 0.05] [--drop-rate 0.01] [--drip-rate 2000] [--sequence closed:20,open:5]
+Point gate.py at it with GATE_CAMERA_URL=http://127.0.0.1:8080/ISAPI/ContentMgmt/StreamingProxy/channels/801/picture
+"""
+import argparse
+import base64
+import http.server
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+SNAPSHOT_PATH = "/ISAPI/ContentMgmt/StreamingProxy/channels/801/picture"
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg')
+
+
+def load_frames(frames_dir):
+    """{label: [jpeg bytes]} from frames_dir/<label>/*.jpg; loose JPEGs in frames_dir get the label "all"."""
+    frames = {}
+    for root, _, names in sorted(os.walk(frames_dir)):
+        label = os.path.relpath(root, frames_dir)
+        label = "all" if label == "." else label.split(os.sep)[0]
+        for name in sorted(names):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                with open(os.path.join(root, name), "rb") as f:
+                    frames.setdefault(label, []).append(f.read())
+    return frames
+
+
+def parse_sequence(spec):
+    """"closed:20,open:5s" -> [("closed", 20, None), ("open", None, 5.0)] (requests or seconds)."""
+    steps = []
+    for part in spec.split(","):
+        label, _, amount = part.strip().partition(":")
+        if amount.endswith("s"):
+            count, seconds = None, float(amount[:-1])
+        else:
+            count, seconds = int(amount or 1), None
+        if (count if count is not None else seconds) <= 0:
+            raise ValueError(f"Sequence step needs a positive count or duration: {part}")
+        steps.append((label, count, seconds))
+    return steps
+
+
+class FrameSequence:
+    """Picks the label to serve for each request, following the sequence steps in a loop."""
+
+    def __init__(self, steps):
+        self.steps = steps
+        self._lock = threading.Lock()
+        self._step = 0
+        self._served = 0
+        self._started = time.monotonic()
+
+    def next_label(self):
+        with self._lock:
+            while True:
+                label, count, seconds = self.steps[self._step]
+                expired = (self._served >= count) if count is not None \
+                    else (time.monotonic() - self._started >= seconds)
+                if not expired:
+                    break
+                self._step = (self._step + 1) % len(self.steps)
+                self._served = 0
+                self._started = time.monotonic()
+            self._served += 1
+            return label
+
+
+class CameraSimulator:
+    """
+    The simulated camera. frames is {label: [jpeg bytes]}; without a sequence
+    every label's frames are served round-robin. Times are in seconds.
+    """
+
+    def __init__(self, frames, host="127.0.0.1", port=0, path=SNAPSHOT_PATH, user="admin", password="",
+                 latency=0.0, jitter=0.0, error_rate=0.0, drop_rate=0.0,
+                 drip_rate=0.0, drip_chunk=256, drip_probability=1.0, sequence=None, seed=None):
+        if not any(frames.values()):
+            raise ValueError("No frames to serve")
+        self.frames = frames
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.drip_rate = drip_rate
+        self.drip_chunk = drip_chunk
+        self.drip_probability = drip_probability
+        self.sequence = FrameSequence(sequence) if sequence else None
+        if self.sequence:
+            missing = {label for label, _, _ in sequence} - set(frames)
+            if missing:
+                raise ValueError(f"No frames for sequence labels: {', '.join(sorted(missing))}")
+        self._all_frames = [data for label in sorted(frames) for data in frames[label]]
+        self._auth = ("Basic " + base64.b64encode(f"{user}:{password}".encode()).decode()) if user is not None else None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._next = {}
+        self._counts = {"requests": 0, "served": 0, "errors": 0, "dropped": 0, "dripped": 0, "unauthorized": 0}
+        self.last_label = None
+
+        simulator = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                simulator._handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{self.path}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="camera-simulator", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            return {**self._counts, "last_label": self.last_label}
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def _pick_frame(self):
+        if self.sequence is None:
+            label, frames = None, self._all_frames
+        else:
+            label = self.sequence.next_label()
+            frames = self.frames[label]
+        with self._lock:
+            i = self._next.get(label, 0)
+            self._next[label] = i + 1
+            self.last_label = label
+        return frames[i % len(frames)]
+
+    def _send(self, handler, status, body=b"", content_type="text/plain", headers=None):
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _handle(self, handler):
+        path = urlsplit(handler.path).path
+        if path == "/stats":
+            self._send(handler, 200, json.dumps(self.stats()).encode(), "application/json")
+            return
+        if path != self.path:
+            self._send(handler, 404, b"Not Found")
+            return
+        self._count("requests")
+        if self._auth is not None and handler.headers.get("Authorization") != self._auth:
+            self._count("unauthorized")
+            self._send(handler, 401, b"Unauthorized", headers={"WWW-Authenticate": 'Basic realm="IP Camera"'})
+            return
+
+        with self._lock:
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            roll_drop, roll_error, roll_drip = (self._random.random() for _ in range(3))
+        if delay > 0:
+            time.sleep(delay)
+
+        if roll_drop < self.drop_rate:
+            # No response at all: the client sees a reset or an empty reply.
+            self._count("dropped")
+            handler.close_connection = True
+            return
+        if roll_error < self.error_rate:
+            self._count("errors")
+            self._send(handler, 503, b"Service Unavailable")
+            return
+
+        data = self._pick_frame()
+        if self.drip_rate > 0 and roll_drip < self.drip_probability:
+            self._count("dripped")
+            handler.send_response(200)
+            handler.send_header("Content-Type", "image/jpeg")
+            handler.send_header("Content-Length", str(len(data)))
+            handler.end_headers()
+            handler.wfile.flush()
+            for i in range(0, len(data), self.drip_chunk):
+                handler.wfile.write(data[i:i + self.drip_chunk])
+                handler.wfile.flush()
+                time.sleep(self.drip_chunk / self.drip_rate)
+        else:
+            self._send(handler, 200, data, "image/jpeg")
+        self._count("served")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve JPEGs like the Hikvision camera's ISAPI snapshot endpoint")
+    parser.add_argument("--frames", default="data/train", help="directory of JPEGs, optionally in <label>/ subfolders")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--path", default=SNAPSHOT_PATH)
+    parser.add_argument("--user", default="admin")
+    parser.add_argument("--password", default="pccw1234")
+    parser.add_argument("--latency", type=float, default=0.0, help="added response delay in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay of up to this many ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="fraction of connections closed without a reply")
+    parser.add_argument("--drip-rate", type=float, default=0.0, help="send bodies at this many bytes/s (0: at once)")
+    parser.add_argument("--drip-chunk", type=int, default=256, help="bytes per slow-drip write")
+    parser.add_argument("--drip-probability", type=float, default=1.0, help="fraction of responses that drip")
+    parser.add_argument("--sequence", help="label script, e.g. closed:20,open:5 (requests) or closed:60s,open:10s")
+    parser.add_argument("--seed", type=int, help="seed for the injected faults")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames)
+    simulator = CameraSimulator(
+        frames, args.host, args.port, args.path, args.user, args.password,
+        latency=args.latency / 1000, jitter=args.jitter / 1000, error_rate=args.error_rate,
+        drop_rate=args.drop_rate, drip_rate=args.drip_rate, drip_chunk=args.drip_chunk,
+        drip_probability=args.drip_probability,
+        sequence=parse_sequence(args.sequence) if args.sequence else None, seed=args.seed)
+    print(f"Serving {sum(len(v) for v in frames.values())} frames "
+          f"({', '.join(f'{k}={len(v)}' for k, v in sorted(frames.items()))}) at {simulator.url}")
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
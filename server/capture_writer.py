@@ -0,0 +1,164 @@
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+
+class CaptureQueueFull(Exception):
+    """Raised when the writer is too far behind to accept another capture."""
+
+
+def capture_filename(data, now=None):
+    """
+    Collision-free name for a capture: microsecond timestamp (so names still
+    sort by time) plus a short content hash.
+    """
+    now = now or datetime.now()
+    digest = hashlib.sha1(data).hexdigest()[:10]
+    return f"{now.strftime('%Y%m%d_%H%M%S_%f')}_{digest}.jpg"
+
+
+class CaptureWriter:
+    """
+    Writes captured camera frames to <root>/<label>/ on a background thread,
+    byte-for-byte as received (no re-encode). Files are written to a
+    temporary name, fsynced in batches of up to fsync_batch files (or after
+    fsync_interval seconds), then renamed into place, so a file only appears
+    once its contents are on disk.
+    """
+
+    def __init__(self, root=os.path.join("data", "train"), max_queue=64, fsync_batch=16, fsync_interval=1.0):
+        self.root = root
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self.written = 0
+        self.errors = 0
+        self.fsyncs = 0
+        self.bytes_written = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, data, label="unknown"):
+        """Queues data for writing and returns the path it will be written to."""
+        self.start()
+        path = os.path.join(self.root, label, capture_filename(data))
+        try:
+            self._queue.put_nowait((path, data))
+        except queue.Full:
+            raise CaptureQueueFull(f"Capture queue full ({self._queue.maxsize} pending)")
+        return path
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """Blocks until everything queued so far is on disk."""
+        self._queue.join()
+
+    def close(self, timeout=10.0):
+        """Writes out the remaining queue and stops the writer thread."""
+        if self._thread is not None:
+            self._queue.put((None, None))
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _run(self):
+        pending = []  # [(fd, tmp_path, path, size)], task_done() once committed
+        deadline = None
+        stop = False
+        while not stop:
+            timeout = None if not pending else max(deadline - time.monotonic(), 0)
+            try:
+                path, data = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            else:
+                entry = None
+                if path is None:
+                    stop = True
+                else:
+                    entry = self._write(path, data)
+                if entry is None:
+                    self._queue.task_done()
+                else:
+                    if not pending:
+                        deadline = time.monotonic() + self.fsync_interval
+                    pending.append(entry)
+
+            if pending and (stop or len(pending) >= self.fsync_batch or self._queue.empty()
+                            or time.monotonic() >= deadline):
+                self._commit(pending)
+                for _ in pending:
+                    self._queue.task_done()
+                pending = []
+
+    def _write(self, path, data):
+        tmp_path = path + ".part"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+            except Exception:
+                os.close(fd)
+                raise
+            return fd, tmp_path, path, len(data)
+        except Exception as e:
+            self._error(f"Error saving image to {path}: {e}")
+            return None
+
+    def _commit(self, pending):
+        """fsyncs a batch of written files, renames them into place and syncs their directories."""
+        directories = set()
+        for fd, tmp_path, path, size in pending:
+            try:
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+                os.replace(tmp_path, path)
+                directories.add(os.path.dirname(path))
+                with self._lock:
+                    self.written += 1
+                    self.bytes_written += size
+                logging.info(f"Saved image to {path}")
+            except Exception as e:
+                self._error(f"Error saving image to {path}: {e}")
+        for directory in directories:
+            try:
+                dir_fd = os.open(directory, os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+            except OSError:
+                pass  # not supported on every platform/filesystem
+        with self._lock:
+            self.fsyncs += 1
+
+    def _error(self, msg):
+        with self._lock:
+            self.errors += 1
+        logging.error(msg)
+        print(msg)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "written": self.written,
+                "errors": self.errors,
+                "fsync_batches": self.fsyncs,
+                "bytes_written": self.bytes_written,
+            }
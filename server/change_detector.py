@@ -0,0 +1,69 @@
+import threading
+
+import numpy as np
+
+
+class ChangeDetector:
+    """
+    Decides whether a frame needs to be scored again by comparing a small
+    ROI thumbnail against the one from the last scored frame. While the mean
+    absolute difference stays below threshold (in gray levels, 0-255) the
+    cached prediction is reused; every force_every-th frame is scored anyway
+    so a slow drift (dusk, rain) cannot keep a stale result forever.
+    A threshold of 0 disables skipping.
+    """
+
+    def __init__(self, threshold=2.0, force_every=12):
+        self.threshold = threshold
+        self.force_every = force_every
+        self._lock = threading.Lock()
+        self._reference = None  # thumbnail of the last scored frame
+        self._result = None
+        self._since_scored = 0
+        self.last_difference = None
+        self.scored = 0
+        self.skipped = 0
+
+    def difference(self, thumbnail):
+        """Mean absolute difference to the last scored frame, or None if there is none."""
+        with self._lock:
+            reference = self._reference
+        if reference is None or reference.shape != thumbnail.shape:
+            return None
+        return float(np.mean(np.abs(thumbnail.astype(np.int16) - reference)))
+
+    def cached(self, thumbnail):
+        """Returns the cached result if the frame is unchanged, else None."""
+        diff = self.difference(thumbnail)
+        with self._lock:
+            self.last_difference = diff
+            if (diff is None or self._result is None or diff >= self.threshold
+                    or self._since_scored + 1 >= self.force_every):
+                return None
+            self._since_scored += 1
+            self.skipped += 1
+            return self._result
+
+    def update(self, thumbnail, result):
+        """Records a freshly scored frame as the new reference."""
+        with self._lock:
+            self._reference = thumbnail
+            self._result = result
+            self._since_scored = 0
+            self.scored += 1
+
+    def reset(self):
+        with self._lock:
+            self._reference = None
+            self._result = None
+            self._since_scored = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "force_every": self.force_every,
+                "scored": self.scored,
+                "skipped": self.skipped,
+                "last_difference": None if self.last_difference is None else round(self.last_difference, 3),
+            }
@@ -1,50 +1,46 @@
+import argparse
+import json
 import tensorflow as tf
 import numpy as np
 import os
-import json
-from PIL import Image
+from preprocessing import load_roi, PreprocessMode
+from dataset_store import open_dataset
+import model_eval
+from model_header import render_c_header, write_if_changed
+
+# === Options ===
+parser = argparse.ArgumentParser(description="Convert gate_detector_tiny.keras to TFLite and model_data.h.")
+parser.add_argument("--int8", action="store_true",
+                    help="full-integer quantization (int8 weights, activations and I/O), calibrated on data/train")
+parser.add_argument("--float-io", action="store_true",
+                    help="with --int8, keep float32 input/output tensors (needed for the ESP32 sketches, which feed floats)")
+parser.add_argument("--calibration-samples", type=int, default=200,
+                    help="images used to calibrate int8 ranges (spread over the dataset)")
+args = parser.parse_args()
 
 # === Load ROI from JSON ===
-def load_roi(filepath="roi.json"):
-    with open(filepath, "r") as f:
-        roi_data = json.load(f)
-    return roi_data["x"], roi_data["y"], roi_data["x1"], roi_data["y1"]
-
 ROI = load_roi()
+DATA_DIR = "./data"
+CLASSES = ['closed', 'open']
+REPORT_PATH = "quantization_report.json"
 
-def crop_and_preprocess(img_path, target_size=(48, 48)):
-    img = Image.open(img_path).convert('L')
-    x, y, x1, y1 = ROI
-    img = img.crop((x, y, x1, y1))
-    img = img.resize(target_size)
-    return np.array(img).astype('float32') / 255.0
-
-def representative_dataset():
-    dataset_path = "./data/train"
-    images = []
-# Function to load dataset (assuming it loads and preprocesses images)
-def load_dataset(dataset_dir="./data", target_size=(48, 48)):
-    x_data = []
-    y_data = [] # Assuming labels are not needed for representative dataset
-    
+# Same BOX pipeline as training and gate.py; the packed store is decoded
+# in parallel once and then read lazily.
+def open_samples(dataset_dir=DATA_DIR, target_size=(48, 48)):
     # Collect images from 'train' subdirectory
     train_dir = os.path.join(dataset_dir, "train")
     if not os.path.exists(train_dir):
         print(f"Warning: Training directory '{train_dir}' not found. Representative dataset might be empty.")
-        return np.array([]), np.array([])
-
-    for root, _, files in os.walk(train_dir):
-        for file in files:
-            if file.endswith(".jpg"):
-                img_path = os.path.join(root, file)
-                img = crop_and_preprocess(img_path, target_size)
-                x_data.append(img.reshape(target_size[0], target_size[1], 1)) # Add channel dimension
-                if len(x_data) >= 100: # Limit to 100 samples for representative dataset
-                    break
-        if len(x_data) >= 100:
-            break
-            
-    return np.array(x_data), np.array(y_data) # Return as numpy arrays
+        return None
+    return open_dataset(dataset_dir, ROI, PreprocessMode(target_size, "box"), CLASSES)
+
+# Streams preprocessed samples for the representative dataset
+def iter_samples(dataset, limit=100):
+    if dataset is None or len(dataset) == 0:
+        return
+    # Spread the samples evenly over the (class-sorted) dataset, one (1, h, w, 1) sample at a time
+    for i in np.unique(np.linspace(0, len(dataset) - 1, min(limit, len(dataset))).astype(int)):
+        yield dataset.x([i])
 
 # === Model Conversion ===
 
@@ -58,47 +54,73 @@ def model_static(x):
 
 concrete_func = model_static.get_concrete_function()
 
+dataset = open_samples()
+
 # Use training data for representative dataset
-x_samples, _ = load_dataset("./data")
 def representative_dataset():
-    for i in range(min(100, len(x_samples))):
-        yield [x_samples[i:i+1].astype(np.float32)]
+    for sample in iter_samples(dataset, args.calibration_samples):
+        yield [sample]
 
 # Create TFLite Converter from concrete function
-converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_func])
-# converter.optimizations = [tf.lite.Optimize.DEFAULT]
-# converter.representative_dataset = representative_dataset
-# converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
-# converter.inference_input_type = tf.int8
-# converter.inference_output_type = tf.int8
-# Removed explicit Int8 I/O for better compatibility with TFLM wrappers
-
-tflite_model = converter.convert()
+def convert(int8=False):
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([concrete_func])
+    if int8:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        if not args.float_io:
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+    return converter.convert()
+
+float_model = convert()
+tflite_model = float_model
+if args.int8:
+    if dataset is None or len(dataset) == 0:
+        raise SystemExit("--int8 needs training images in ./data/train for calibration")
+    print(f"Calibrating int8 ranges on {min(args.calibration_samples, len(dataset))} images...")
+    tflite_model = convert(int8=True)
 
 # Save TFLite model
 with open("gate_detector_tiny.tflite", "wb") as f:
     f.write(tflite_model)
 
-print("TFLite model saved as gate_detector_tiny.tflite")
-
-# Convert TFLite to C Header
-def hex_to_c_array(hex_data, var_name):
-    c_str = f"const unsigned char {var_name}[] = {{\n  "
-    line_bytes = 12
-    for i, b in enumerate(hex_data):
-        c_str += f"0x{b:02x}, "
-        if (i + 1) % line_bytes == 0:
-            c_str += "\n  "
-    c_str = c_str.rstrip(", \n") + "\n};\n"
-    c_str += f"const int {var_name}_len = {len(hex_data)};\n"
-    return c_str
-
-c_array_content = hex_to_c_array(tflite_model, "gate_detector_model")
-
-with open("model_data.h", "w") as f:
-    f.write("#ifndef MODEL_DATA_H\n")
-    f.write("#define MODEL_DATA_H\n\n")
-    f.write(c_array_content)
-    f.write("\n#endif // MODEL_DATA_H\n")
-
-print("C header saved as model_data.h")
+print(f"TFLite model saved as gate_detector_tiny.tflite ({'int8' if args.int8 else 'float32'}, {len(tflite_model)} bytes)")
+
+# === Quantization Report ===
+# Float vs int8 on the whole training set, run through the server's TFLite runtime
+if args.int8:
+    float_interp = model_eval.load_model(model_content=float_model)
+    int8_interp = model_eval.load_model(model_content=tflite_model)
+    float_scores = model_eval.predict(float_interp, dataset)
+    int8_scores = model_eval.predict(int8_interp, dataset)
+    report = {
+        "size_bytes": {"float32": len(float_model), "int8": len(tflite_model),
+                       "ratio": round(len(float_model) / len(tflite_model), 2)},
+        "io": "float32" if args.float_io else "int8",
+        "calibration_samples": min(args.calibration_samples, len(dataset)),
+        "agreement": model_eval.agreement(float_scores, int8_scores, dataset.labels, CLASSES),
+        "invoke_ms": {"float32": model_eval.time_invoke(float_interp),
+                      "int8": model_eval.time_invoke(int8_interp)},
+    }
+    with open(REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print("\n" + "="*30)
+    print("     INT8 QUANTIZATION")
+    print("="*30)
+    print(f"Size:       {len(float_model)} -> {len(tflite_model)} bytes ({report['size_bytes']['ratio']}x smaller)")
+    for class_name in CLASSES:
+        if class_name in report["agreement"]:
+            c = report["agreement"][class_name]
+            print(f"{class_name.upper():<7} agreement {c['agreement']*100:.2f}% "
+                  f"(accuracy float {c['reference_accuracy']*100:.2f}%, int8 {c['accuracy']*100:.2f}%, "
+                  f"{c['images']} images)")
+    print(f"Invoke p50: float {report['invoke_ms']['float32']['p50']:.3f} ms, "
+          f"int8 {report['invoke_ms']['int8']['p50']:.3f} ms")
+    print(f"Report saved as {REPORT_PATH}")
+    print("="*30 + "\n")
+
+# Convert TFLite to C Header (streamed; left untouched if the bytes are the same)
+result = write_if_changed("model_data.h", render_c_header(tflite_model))
+print(f"C header saved as model_data.h ({result})")
@@ -1,27 +1,35 @@
 
-import json
 import os
 from PIL import Image
+from parallel_loader import parallel_map
+from preprocessing import load_roi
 
 # Configuration
 ROI_FILE = 'roi.json'
 INPUT_DIR = 'data/train'
 OUTPUT_DIR = 'data/roboflow'
 
-def load_roi(roi_path):
-    with open(roi_path, 'r') as f:
-        return json.load(f)
-
 def ensure_dir(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
+def crop_one(task):
+    """Crops one image; returns an error message or None. Runs in a worker process."""
+    input_path, output_path, box = task
+    try:
+        with Image.open(input_path) as img:
+            cropped_img = img.crop(box)
+            cropped_img.save(output_path)
+    except Exception as e:
+        return str(e)
+    return None
+
 def crop_and_save_images(roi):
-    x, y, x1, y1 = roi['x'], roi['y'], roi['x1'], roi['y1']
-    box = (x, y, x1, y1)
+    box = tuple(roi)
     
     print(f"Cropping with box: {box}")
 
+    tasks = []
     for category in ['open', 'closed']:
         input_category_dir = os.path.join(INPUT_DIR, category)
         output_category_dir = os.path.join(OUTPUT_DIR, category)
@@ -38,20 +46,17 @@ def crop_and_save_images(roi):
         for filename in files:
             input_path = os.path.join(input_category_dir, filename)
             output_path = os.path.join(output_category_dir, filename)
-            
-            try:
-                with Image.open(input_path) as img:
-                    cropped_img = img.crop(box)
-                    cropped_img.save(output_path)
-                    # print(f"Saved {output_path}")
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
+            tasks.append((input_path, output_path, box))
+
+    # Decode/crop/encode on all cores
+    for (input_path, _, _), error in zip(tasks, parallel_map(crop_one, tasks, label="Cropping")):
+        if error:
+            print(f"Error processing {os.path.basename(input_path)}: {error}")
 
 if __name__ == '__main__':
     # Script assumes it's run from the server directory
     if not os.path.exists(ROI_FILE):
         print(f"Error: {ROI_FILE} not found. Please run this script from the 'server' directory.")
     else:
-        roi_data = load_roi(ROI_FILE)
-        crop_and_save_images(roi_data)
+        crop_and_save_images(load_roi(ROI_FILE))
         print("Done.")
@@ -0,0 +1,253 @@
+"""
+Packed, memory-mapped store of preprocessed training images.
+
+Decoding every JPEG under data/train on each train/convert/verify run is
+most of their runtime. The store keeps the preprocessed ROI of each image
+as a uint8 row in one flat file (images.u8, read through np.memmap) plus an
+index (index.json) of label, filename, content hash and stat per row.
+Opening it only decodes images that are new or changed since the last run.
+
+Stores live in data/packed/<key>/, where the key covers the ROI and the
+preprocessing mode, so editing roi.json or changing the input size starts
+a fresh store instead of serving stale crops.
+
+Usage: python dataset_store.py [--mode box48] [--rebuild]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from preprocessing import load_roi, get_mode
+from parallel_loader import preprocess_files
+
+CLASSES = ['closed', 'open']
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg')
+FORMAT_VERSION = 1
+
+# Rewrite images.u8 once more than this fraction of its rows is unreferenced.
+COMPACT_RATIO = 0.5
+
+
+def store_key(roi, mode):
+    mode = get_mode(mode)
+    spec = json.dumps({"roi": list(roi), "size": list(mode.size), "method": mode.method,
+                       "version": FORMAT_VERSION}, sort_keys=True)
+    return f"{mode.method}{mode.size[0]}x{mode.size[1]}-{hashlib.sha1(spec.encode()).hexdigest()[:12]}"
+
+
+def file_sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def scan_images(data_dir, classes=CLASSES):
+    """[(relative path, label index)] for data_dir/train/<class>/*.jpg, sorted by path."""
+    files = []
+    for label, class_name in enumerate(classes):
+        class_dir = os.path.join(data_dir, "train", class_name)
+        if not os.path.isdir(class_dir):
+            print(f"Warning: {class_dir} not found")
+            continue
+        for name in sorted(os.listdir(class_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                files.append((os.path.join("train", class_name, name), label))
+    return files
+
+
+class PackedDataset:
+    """A read-only view of a store: uint8 images plus per-image labels, files and hashes."""
+
+    def __init__(self, path, index):
+        self.path = path
+        self.classes = index["classes"]
+        self.size = tuple(index["size"])
+        entries = index["entries"]
+        self.files = [e["file"] for e in entries]
+        self.labels = np.array([e["label"] for e in entries], dtype=np.int64)
+        self.hashes = [e["sha1"] for e in entries]
+        self.rows = np.array([e["row"] for e in entries], dtype=np.int64)
+        width, height = self.size
+        rows_total = index["rows"]
+        self._images = (np.memmap(os.path.join(path, "images.u8"), dtype=np.uint8, mode="r",
+                                  shape=(rows_total, height, width))
+                        if rows_total else np.zeros((0, height, width), dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.files)
+
+    def images(self, indices=None):
+        """uint8 (n, h, w) array for the given dataset indices (default: all)."""
+        rows = self.rows if indices is None else self.rows[indices]
+        return np.asarray(self._images[rows])
+
+    def x(self, indices=None):
+        """float32 (n, h, w, 1) model input in 0-1, same values as preprocess()."""
+        return (self.images(indices).astype(np.float32) / 255.0)[..., np.newaxis]
+
+
+class DatasetStore:
+    """Builds and updates one packed store directory."""
+
+    def __init__(self, data_dir="./data", roi=None, mode="box48", classes=CLASSES, store_root=None):
+        self.data_dir = data_dir
+        self.roi = tuple(roi if roi is not None else load_roi())
+        self.mode = get_mode(mode)
+        self.classes = list(classes)
+        store_root = store_root or os.path.join(data_dir, "packed")
+        self.path = os.path.join(store_root, store_key(self.roi, self.mode))
+        self.index_path = os.path.join(self.path, "index.json")
+        self.images_path = os.path.join(self.path, "images.u8")
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # A shorter images file than the index claims means an interrupted write.
+        row_bytes = self.mode.size[0] * self.mode.size[1]
+        if not os.path.exists(self.images_path) or os.path.getsize(self.images_path) < index["rows"] * row_bytes:
+            return None
+        return index
+
+    def _write_index(self, index):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _empty_index(self):
+        return {"version": FORMAT_VERSION, "roi": list(self.roi), "size": list(self.mode.size),
+                "method": self.mode.method, "classes": self.classes, "rows": 0, "entries": []}
+
+    def rebuild(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        return self.update()
+
+    def update(self, decode=None):
+        """
+        Brings the store in line with data_dir/train and returns a PackedDataset.
+        decode(paths) -> iterable of uint8 (h, w) arrays (None for an image that
+        failed to decode), in order; defaults to decoding on a process pool
+        with the store's ROI and mode.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        index = self._read_index()
+        if index is None or index["classes"] != self.classes:
+            index = self._empty_index()
+            open(self.images_path, "wb").close()
+        # Rows past the index are left over from an interrupted update.
+        row_bytes = self.mode.size[0] * self.mode.size[1]
+        with open(self.images_path, "r+b") as f:
+            f.truncate(index["rows"] * row_bytes)
+
+        known = {e["file"]: e for e in index["entries"]}
+        # Renamed or relabelled (moved) files keep their row.
+        rows_by_hash = {e["sha1"]: e["row"] for e in index["entries"]}
+        entries = []
+        to_decode = []  # (entry, absolute path)
+        for rel_path, label in scan_images(self.data_dir, self.classes):
+            abs_path = os.path.join(self.data_dir, rel_path)
+            st = os.stat(abs_path)
+            entry = known.get(rel_path)
+            if entry is not None and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                entry["label"] = label
+                entries.append(entry)
+                continue
+            sha1 = file_sha1(abs_path)
+            if entry is not None and entry["sha1"] == sha1:
+                entry.update(label=label, size=st.st_size, mtime_ns=st.st_mtime_ns)
+                entries.append(entry)
+                continue
+            entry = {"file": rel_path, "label": label, "sha1": sha1, "size": st.st_size,
+                     "mtime_ns": st.st_mtime_ns, "row": rows_by_hash.get(sha1)}
+            entries.append(entry)
+            if entry["row"] is None:
+                to_decode.append((entry, abs_path))
+
+        if to_decode:
+            if decode is None:
+                decode = self._decode
+            rows = index["rows"]
+            with open(self.images_path, "ab") as f:
+                for (entry, path), pixels in zip(to_decode, decode([p for _, p in to_decode])):
+                    if pixels is None:
+                        print(f"Warning: could not decode {path}, skipping")
+                        continue
+                    f.write(np.ascontiguousarray(pixels, dtype=np.uint8).tobytes())
+                    entry["row"] = rows
+                    rows += 1
+                f.flush()
+                os.fsync(f.fileno())
+            index["rows"] = rows
+            print(f"Packed {sum(e['row'] is not None for e, _ in to_decode)} new images into {self.path}")
+
+        index["entries"] = [e for e in entries if e["row"] is not None]
+        entries = index["entries"]
+        if index["rows"] and len(entries) < index["rows"] * COMPACT_RATIO:
+            index = self._compact(index)
+        self._write_index(index)
+        return PackedDataset(self.path, index)
+
+    def _decode(self, paths):
+        return preprocess_files(paths, self.roi, self.mode)
+
+    def _compact(self, index):
+        """Drops unreferenced rows by rewriting images.u8 in index order."""
+        width, height = self.mode.size
+        old = np.memmap(self.images_path, dtype=np.uint8, mode="r", shape=(index["rows"], height, width))
+        tmp_path = self.images_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            for row, entry in enumerate(index["entries"]):
+                f.write(old[entry["row"]].tobytes())
+                entry["row"] = row
+            f.flush()
+            os.fsync(f.fileno())
+        del old
+        os.replace(tmp_path, self.images_path)
+        index["rows"] = len(index["entries"])
+        return index
+
+
+def open_dataset(data_dir="./data", roi=None, mode="box48", classes=CLASSES, decode=None):
+    """Updates the store for (roi, mode) incrementally and returns it as a PackedDataset."""
+    return DatasetStore(data_dir, roi, mode, classes).update(decode)
+
+
+def stratified_split(dataset, val_fraction=0.2, seed=0):
+    """
+    Splits dataset indices into (train, val) with val_fraction of each class
+    in val. Images are ranked by a hash of their content and the seed, not by
+    position, so the split is the same on every run and an image keeps its
+    side when others are added, renamed or moved between runs.
+    """
+    ranks = np.array([int(hashlib.sha1(f"{seed}:{h}".encode()).hexdigest()[:15], 16) for h in dataset.hashes],
+                     dtype=np.int64)
+    train, val = [], []
+    for label in np.unique(dataset.labels):
+        members = np.flatnonzero(dataset.labels == label)
+        members = members[np.argsort(ranks[members], kind="stable")]
+        n_val = int(round(len(members) * val_fraction))
+        val.append(members[:n_val])
+        train.append(members[n_val:])
+    if not train:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    return np.sort(np.concatenate(train)), np.sort(np.concatenate(val))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the packed training dataset.")
+    parser.add_argument("--data", default="./data")
+    parser.add_argument("--mode", default="box48", help="preprocessing mode, e.g. box48, box96, esp32")
+    parser.add_argument("--rebuild", action="store_true", help="discard the store and decode everything")
+    args = parser.parse_args()
+
+    store = DatasetStore(args.data, mode=args.mode)
+    dataset = store.rebuild() if args.rebuild else store.update()
+    counts = np.bincount(dataset.labels, minlength=len(CLASSES)) if len(dataset) else [0] * len(CLASSES)
+    print(f"{store.path}: {len(dataset)} images "
+          + ", ".join(f"{c}={n}" for c, n in zip(CLASSES, counts)))
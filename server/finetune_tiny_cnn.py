@@ -0,0 +1,99 @@
+"""
+Incremental retraining: warm-starts from gate_detector_tiny.keras instead of
+training from scratch.
+
+Images the current model has not been trained on (per its .train.json
+manifest) are mixed with a random replay subset of the old training images
+so the model does not forget them, and trained for a few epochs with early
+stopping on validation loss. Validation accuracy is measured before and
+after on the same stratified split train_tiny_cnn.py uses; if it got worse
+the fine-tuned model is discarded and the script exits non-zero.
+
+Exit codes: 0 saved (or nothing new to learn), 1 regression or error,
+2 no model/manifest to start from (run train_tiny_cnn.py).
+"""
+import os
+import sys
+
+import numpy as np
+import tensorflow as tf
+
+from preprocessing import load_roi
+from dataset_store import open_dataset, stratified_split
+from training_data import make_dataset, read_manifest, write_manifest
+
+# === Config ===
+ROI = load_roi()
+DATA_DIR = "./data"
+MODEL_PATH = "gate_detector_tiny.keras"
+BATCH_SIZE = 32
+VALIDATION_SPLIT = 0.2
+# Old images replayed per new image, and at least this many.
+REPLAY_RATIO = 4
+REPLAY_MIN = 64
+MAX_EPOCHS = int(os.environ.get("GATE_FINETUNE_EPOCHS", "20"))
+PATIENCE = 3
+LEARNING_RATE = 1e-4
+# Allowed drop in validation accuracy (0-1) before refusing to save.
+TOLERANCE = float(os.environ.get("GATE_FINETUNE_TOLERANCE", "0"))
+
+manifest = read_manifest(MODEL_PATH)
+if not os.path.exists(MODEL_PATH) or manifest is None:
+    print(f"No {MODEL_PATH} with a training manifest; run train_tiny_cnn.py for a full training.")
+    sys.exit(2)
+seed = manifest.get("seed", 0)
+
+dataset = open_dataset(DATA_DIR, ROI, "box48")
+train_idx, val_idx = stratified_split(dataset, VALIDATION_SPLIT, seed=seed)
+trained_on = set(manifest["trained_on"])
+is_new = np.array([dataset.hashes[i] not in trained_on for i in train_idx], dtype=bool)
+new_idx, old_idx = train_idx[is_new], train_idx[~is_new]
+print(f"{len(dataset)} images: {len(new_idx)} new, {len(old_idx)} already trained on, {len(val_idx)} validation.")
+
+if len(new_idx) == 0:
+    print("Nothing new to learn; keeping the current model.")
+    sys.exit(0)
+
+# New samples plus a replay subset of old ones
+rng = np.random.default_rng(seed)
+n_replay = min(len(old_idx), max(REPLAY_MIN, REPLAY_RATIO * len(new_idx)))
+replay_idx = rng.choice(old_idx, n_replay, replace=False) if n_replay else old_idx
+finetune_idx = np.concatenate([new_idx, replay_idx])
+tf.keras.utils.set_random_seed(seed)
+
+train_ds = make_dataset(dataset, finetune_idx, BATCH_SIZE, augment=True, shuffle=True, seed=seed)
+val_ds = make_dataset(dataset, val_idx, BATCH_SIZE, cache=True)
+
+model = tf.keras.models.load_model(MODEL_PATH)
+model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=LEARNING_RATE),
+              loss='sparse_categorical_crossentropy',
+              metrics=['accuracy'])
+
+before_loss, before_acc = model.evaluate(val_ds, verbose=0)
+
+print(f"Fine-tuning on {len(new_idx)} new + {len(replay_idx)} replayed images...")
+early_stopping = tf.keras.callbacks.EarlyStopping(monitor='val_loss', patience=PATIENCE,
+                                                  restore_best_weights=True)
+history = model.fit(train_ds, epochs=MAX_EPOCHS, validation_data=val_ds, callbacks=[early_stopping])
+
+after_loss, after_acc = model.evaluate(val_ds, verbose=0)
+
+print("\n" + "="*30)
+print("     FINE-TUNE RESULTS")
+print("="*30)
+print(f"Epochs run:          {len(history.history['loss'])}")
+print(f"Val Accuracy before: {before_acc*100:.2f}%")
+print(f"Val Accuracy after:  {after_acc*100:.2f}%")
+print(f"Val Loss before:     {before_loss:.4f}")
+print(f"Val Loss after:      {after_loss:.4f}")
+print("="*30 + "\n")
+
+if after_acc < before_acc - TOLERANCE:
+    print(f"❌ Validation accuracy dropped ({before_acc*100:.2f}% -> {after_acc*100:.2f}%); "
+          f"keeping the current model.")
+    sys.exit(1)
+
+model.save(MODEL_PATH)
+# The replayed-but-unsampled old images still count as trained on.
+write_manifest(MODEL_PATH, dataset, np.concatenate([old_idx, new_idx]), seed=seed, val_accuracy=float(after_acc))
+print(f"Fine-tuned model saved as {MODEL_PATH}")
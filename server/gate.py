@@ -1,26 +1,28 @@
+import time
+_import_started = time.perf_counter()  # for the startup report at the bottom
+
 import io
 import json
 import numpy as np
-try:
-    import tensorflow as tf
-    Interpreter = tf.lite.Interpreter
-except ImportError:
-    try:
-        import tflite_runtime.interpreter as tflite
-        Interpreter = tflite.Interpreter
-    except ImportError:
-        # Fallback will be handled in main code or let it crash if essential
-        print("Warning: Neither tensorflow nor tflite_runtime installed.")
-        Interpreter = None
 from PIL import Image
 from flask import Flask, request, Response
-import urllib.request
-import base64
+from werkzeug.exceptions import RequestEntityTooLarge
 import logging
 from datetime import datetime
 import os
-import time
-import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from singleflight import SingleFlight
+from interpreter_pool import InterpreterPool, PoolTimeout, BACKEND, BACKEND_IMPORT_SECONDS
+from model_reload import ModelReloader
+from camera_client import CameraClient
+import preprocessing
+from image_batch import images_from_request, ImageBatchError
+from change_detector import ChangeDetector
+from state_events import StateTracker
+from capture_writer import CaptureWriter, CaptureQueueFull
+from multi_camera import CameraGroup, load_camera_config
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # === Setup Logging ===
 logging.basicConfig(
@@ -33,151 +35,508 @@ logging.basicConfig(
 app = Flask(__name__)
 
 # === Load ROI from JSON ===
-def load_roi(filepath="roi.json"):
-    """Loads the region of interest (ROI) from a JSON file."""
-    try:
-        with open(filepath, "r") as f:
-            roi_data = json.load(f)
-        return roi_data["x"], roi_data["y"], roi_data["x1"], roi_data["y1"]
-    except FileNotFoundError:
-        print(f"Error: ROI file not found at {filepath}. Using default ROI (0,0,640,480).")
-        return 0, 0, 640, 480
+# Same reader as training and evaluation, so they all crop the same region.
+try:
+    ROI = preprocessing.load_roi("roi.json")
+except FileNotFoundError:
+    print("Error: ROI file not found at roi.json. Using default ROI (0,0,640,480).")
+    ROI = (0, 0, 640, 480)
+
+# === Metrics ===
+# Exposed in Prometheus text format on /metrics.
+STAGE_SECONDS = REGISTRY.histogram(
+    "gate_stage_duration_seconds",
+    "Time spent per pipeline stage (camera_fetch, change_detect, decode, preprocess, invoke, serialize).",
+    ["stage"])
+CAMERA_ERRORS = REGISTRY.counter("gate_camera_errors_total", "Camera fetches that failed after all retries.")
+PREDICTIONS = REGISTRY.counter("gate_predictions_total", "Predictions by class.", ["source", "status"])
+LOW_CONFIDENCE = REGISTRY.counter("gate_low_confidence_predictions_total",
+                                  "Predictions below LOW_CONFIDENCE_THRESHOLD.", ["source"])
+# Same cut-off the ESP32 firmware uses to capture low_confidence samples.
+LOW_CONFIDENCE_THRESHOLD = float(os.environ.get("GATE_LOW_CONFIDENCE", "0.65"))
 
-ROI = load_roi()
+def record_prediction(status, confidence, source="camera"):
+    PREDICTIONS.inc(source=source, status=status)
+    if confidence < LOW_CONFIDENCE_THRESHOLD:
+        LOW_CONFIDENCE.inc(source=source)
 
 # === Crop and Preprocess function ===
-def crop_and_preprocess(image: Image.Image, target_size=(48, 48)):
-    """Crops the input image to the ROI and preprocesses it for the model."""
-    # Convert to grayscale
-    img = image.convert('L')
-    
-    # Crop
-    x, y, x1, y1 = ROI
-    img = img.crop((x, y, x1, y1))
-    
-    # Resize (Use BOX or BILINEAR to match training/ESP32)
-    resample_filter = Image.BOX if hasattr(Image, 'BOX') else Image.BILINEAR
-    img = img.resize(target_size, resample=resample_filter)
-    
-    # Normalize to 0-1 float32
-    img_array = np.array(img).astype('float32') / 255.0
+# Decode JPEGs at reduced scale straight to grayscale (see utils/check_decode_parity.py).
+FAST_DECODE = os.environ.get("GATE_FAST_DECODE", "0") == "1"
+
+def decode_image(image: Image.Image, target_size=(48, 48), roi=None):
+    """
+    Decodes the image data (at reduced scale with FAST_DECODE) so decoding
+    can be timed apart from preprocessing. Returns the full-resolution size.
+    """
+    full_size = image.size
+    if FAST_DECODE:
+        preprocessing.draft_for_roi(image, ROI if roi is None else roi, target_size)
+    image.load()
+    return full_size
+
+def crop_and_preprocess(image: Image.Image, target_size=(48, 48), full_size=None, roi=None):
+    """Crops the input image to the ROI (default: roi.json) and preprocesses it for the model."""
+    roi = ROI if roi is None else roi
+    if FAST_DECODE:
+        img_array = preprocessing.fast_crop_and_preprocess(image, roi, target_size, full_size)
+    else:
+        # Grayscale, crop, BOX resize (same as training), 0-1 float32
+        img_array = preprocessing.preprocess(image, roi, preprocessing.PreprocessMode(target_size, "box"))
     
     # Add batch and channel dimensions: (1, 48, 48, 1)
-    img_array = img_array.reshape(1, 48, 48, 1)
-    return img_array
+    return img_array.reshape(1, target_size[1], target_size[0], 1)
+
+def prepare_camera_input(image, roi, target_size):
+    """Model input for a cameras.json frame, through the same decode path as /."""
+    return crop_and_preprocess(image, target_size, decode_image(image, target_size, roi), roi)
 
 # === Model ===
 MODEL_PATH = "gate_detector_tiny.tflite"
 
-def load_interpreter(model_path):
-    """Loads the TFLite interpreter."""
-    if Interpreter is None:
-        return None
-    try:
-        interpreter = Interpreter(model_path=model_path)
-        interpreter.allocate_tensors()
-        print(f"Loaded TFLite model from {model_path}")
-        return interpreter
-    except Exception as e:
-        print(f"Error loading TFLite model: {e}")
-        return None
+# Interpreter pool settings
+POOL_SIZE = int(os.environ.get("GATE_POOL_SIZE", "2"))
+NUM_THREADS = int(os.environ.get("GATE_NUM_THREADS", "1"))
+USE_XNNPACK = os.environ.get("GATE_XNNPACK", "1") != "0"
+CHECKOUT_TIMEOUT = float(os.environ.get("GATE_CHECKOUT_TIMEOUT", "5"))
 
-interpreter = load_interpreter(MODEL_PATH)
-if interpreter:
-    input_details = interpreter.get_input_details()
-    output_details = interpreter.get_output_details()
-else:
-    print("CRITICAL: Failed to load TFLite interpreter.")
+CLASSES = ["closed", "open"]
+
+# Hot reload: the model file is polled every MODEL_WATCH_INTERVAL seconds (0
+# disables it) and POST /admin/reload reloads on demand. A new model must
+# classify at least CANARY_MIN_ACCURACY of canary/<label>/*.jpg correctly.
+MODEL_WATCH_INTERVAL = float(os.environ.get("GATE_MODEL_WATCH_INTERVAL", "5"))
+CANARY_DIR = os.environ.get("GATE_CANARY_DIR", "canary")
+# An explicitly configured canary set must exist; the default one is optional.
+CANARY_REQUIRED = "GATE_CANARY_DIR" in os.environ
+CANARY_MIN_ACCURACY = float(os.environ.get("GATE_CANARY_MIN_ACCURACY", "1.0"))
+ADMIN_TOKEN = os.environ.get("GATE_ADMIN_TOKEN")
+
+def model_input_size(pool):
+    """(width, height) the pool's model expects, e.g. (48, 48)."""
+    return pool.input_shape[2], pool.input_shape[1]
+
+def build_interpreter_pool(model_content):
+    """Builds and warms up a pool of TFLite interpreters for the model bytes."""
+    pool = InterpreterPool(MODEL_PATH, size=POOL_SIZE, num_threads=NUM_THREADS, use_xnnpack=USE_XNNPACK,
+                           checkout_timeout=CHECKOUT_TIMEOUT, model_content=model_content)
+    pool.warm_up()
+    return pool
+
+def check_canary(pool):
+    """Classifies the canary images with pool. Returns (ok, details)."""
+    files = [(label, os.path.join(CANARY_DIR, label, name))
+             for label in CLASSES if os.path.isdir(os.path.join(CANARY_DIR, label))
+             for name in sorted(os.listdir(os.path.join(CANARY_DIR, label)))
+             if name.lower().endswith(('.jpg', '.jpeg', '.png'))]
+    if not files:
+        msg = f"No canary images in {os.path.abspath(CANARY_DIR)}/<label>/; the new model is not checked"
+        if CANARY_REQUIRED:
+            return False, {"images": 0, "message": msg}
+        print(f"Warning: {msg}")
+        logging.warning(msg)
+        return True, {"images": 0, "message": msg}
+
+    target_size = model_input_size(pool)
+    correct = 0
+    failures = []
+    for label, path in files:
+        with Image.open(path) as img:
+            input_data = crop_and_preprocess(img, target_size)
+        with pool.checkout() as slot:
+            predicted = CLASSES[int(np.argmax(slot.run(input_data)))]
+        if predicted == label:
+            correct += 1
+        else:
+            failures.append(path)
+    accuracy = correct / len(files)
+    details = {"images": len(files), "correct": correct, "accuracy": round(accuracy, 4), "failures": failures}
+    return accuracy >= CANARY_MIN_ACCURACY, details
+
+def model_status():
+    """model_reloader.status() plus the served model's input shape and dtype (int8 when quantized)."""
+    status = model_reloader.status()
+    pool = interpreter_pool
+    if pool is not None:
+        status["input"] = {"shape": list(pool.input_shape), "dtype": pool.input_dtype}
+    return status
+
+def swap_interpreter_pool(pool):
+    """Publishes a new pool; requests already holding the old one finish on it."""
+    global interpreter_pool
+    interpreter_pool = pool
+    # Cached predictions came from the old model.
+    change_detector.reset()
+    # Cameras in cameras.json that use this model share the pool.
+    if camera_group is not None:
+        camera_group.replace_pool(os.path.abspath(MODEL_PATH), pool)
+    print(f"Loaded TFLite model from {MODEL_PATH} ({POOL_SIZE} interpreters, "
+          f"{NUM_THREADS} threads each, XNNPACK {'on' if pool.use_xnnpack else 'off'})")
+
+interpreter_pool = None
+camera_group = None  # set below when cameras.json exists
+model_reloader = ModelReloader(MODEL_PATH, build_interpreter_pool, check_canary, swap_interpreter_pool)
 
 # === Camera URL and Credentials ===
-gate_url = 'http://192.168.50.82/ISAPI/ContentMgmt/StreamingProxy/channels/801/picture?cmd=refresh'
-gate_user = 'admin'
-gate_password = 'pccw1234'
-auth_str = f'{gate_user}:{gate_password}'.encode('ascii')
-auth_b64 = base64.b64encode(auth_str).decode('ascii')
-headers = {'Authorization': 'Basic ' + auth_b64}
+# GATE_CAMERA_URL etc. point the server elsewhere, e.g. at camera_simulator.py.
+gate_url = os.environ.get("GATE_CAMERA_URL",
+                          'http://192.168.50.82/ISAPI/ContentMgmt/StreamingProxy/channels/801/picture?cmd=refresh')
+gate_user = os.environ.get("GATE_CAMERA_USER", 'admin')
+gate_password = os.environ.get("GATE_CAMERA_PASSWORD", 'pccw1234')
 
-def get_camera_image():
-    """Fetches an image from the camera."""
+camera = CameraClient(gate_url, gate_user, gate_password,
+                      connect_timeout=float(os.environ.get("GATE_CONNECT_TIMEOUT", "3")),
+                      read_timeout=float(os.environ.get("GATE_READ_TIMEOUT", "5")),
+                      retries=int(os.environ.get("GATE_CAMERA_RETRIES", "2")))
+
+def get_camera_frame():
+    """Fetches the raw JPEG bytes of a snapshot from the camera."""
     try:
-        req = urllib.request.Request(gate_url, headers=headers)
-        with urllib.request.urlopen(req, timeout=5) as response:
-            img_data = response.read()
-        return Image.open(io.BytesIO(img_data))
+        with STAGE_SECONDS.time(stage="camera_fetch"):
+            return camera.fetch()
     except Exception as e:
+        CAMERA_ERRORS.inc()
         msg = f"Error fetching image from camera: {e}"
         print(msg)
         logging.error(msg)
-        
-        # Fallback to CURL if Python network is blocked (e.g., VPN issues)
-        print("Attempting fallback to curl...")
-        try:
-            # Construct curl command
-            cmd = [
-                "curl", "-s",
-                "-u", f"{gate_user}:{gate_password}",
-                gate_url,
-                "--connect-timeout", "5"
-            ]
-            result = subprocess.run(cmd, capture_output=True, check=True)
-            return Image.open(io.BytesIO(result.stdout))
-        except Exception as curl_e:
-            curl_msg = f"Curl fallback failed: {curl_e}"
-            print(curl_msg)
-            logging.error(curl_msg)
-            return None
+        return None
 
+def get_camera_image():
+    """Fetches an image from the camera."""
+    data = get_camera_frame()
+    return Image.open(io.BytesIO(data)) if data is not None else None
 
-def predict_gate_status(image):
-    """Predicts the gate status (open/closed) using TFLite model."""
+
+def classify_image(image):
+    """
+    Runs the TFLite model on an image and returns (status, confidence).
+    With FAST_DECODE the image is drafted (decoded at reduced scale) in place.
+    """
     if image is None:
-        return "error"
+        return "error", 0.0
     
-    if interpreter is None:
-        return "error - model not loaded"
+    pool = interpreter_pool  # stays on one model even if a reload swaps it meanwhile
+    if pool is None:
+        return "error - model not loaded", 0.0
 
     try:
-        # Preprocess
-        input_data = crop_and_preprocess(image)
-        
-        # Check input details (for debugging or if model changes)
-        # input_details[0]['index'] is the input tensor index
-        
-        interpreter.set_tensor(input_details[0]['index'], input_data)
-        interpreter.invoke()
+        target_size = model_input_size(pool)
+        with STAGE_SECONDS.time(stage="decode"):
+            full_size = decode_image(image, target_size)
+        with STAGE_SECONDS.time(stage="preprocess"):
+            input_data = crop_and_preprocess(image, target_size, full_size)
         
-        output_data = interpreter.get_tensor(output_details[0]['index'])
+        with pool.checkout() as slot:
+            with STAGE_SECONDS.time(stage="invoke"):
+                output_data = slot.run(input_data)
         # Output is likely [1, 2] probability scores (softmax)
         
-        predicted_class = np.argmax(output_data)
+        predicted_class = int(np.argmax(output_data))
+        confidence = float(output_data[0][predicted_class])
         
         # Classes: 0=closed, 1=open
-        return "closed" if predicted_class == 0 else "open"
+        record_prediction(CLASSES[predicted_class], confidence)
+        return CLASSES[predicted_class], confidence
         
     except Exception as e:
         print(f"Prediction error: {e}")
-        return "error"
+        return "error", 0.0
 
-# === Image Saving Helper ===
-def save_image(image, label="unknown"):
-    """Saves the image to the data/train/<label> directory."""
+
+# === Change Detection ===
+# Mean absolute ROI difference (gray levels) below which a frame reuses the
+# last prediction (0 disables), and the number of frames after which the
+# model runs regardless.
+CHANGE_THRESHOLD = float(os.environ.get("GATE_CHANGE_THRESHOLD", "2.0"))
+FORCE_RESCORE_EVERY = int(os.environ.get("GATE_FORCE_RESCORE_EVERY", "12"))
+
+change_detector = ChangeDetector(CHANGE_THRESHOLD, FORCE_RESCORE_EVERY)
+
+# Load the model now that everything swap_interpreter_pool touches exists.
+load_result = model_reloader.load()
+if interpreter_pool is None:
+    print(f"Error loading TFLite model: {load_result.get('message')}")
+    print("CRITICAL: Failed to load TFLite interpreter.")
+SKIPPED = REGISTRY.counter("gate_inference_skipped_total",
+                           "Camera frames that reused the cached prediction because the ROI was unchanged.")
+REGISTRY.callback("gate_frame_difference", "Mean absolute ROI difference of the last frame to the last scored frame.",
+                  lambda: change_detector.last_difference or 0.0)
+
+def classify_frame(data):
+    """
+    Classifies raw camera JPEG bytes, skipping inference when the ROI has
+    not changed since the last scored frame. Returns (status, confidence).
+    """
     try:
-        if image is None:
-            return False, "No image to save"
-        
-        # Create directory if it doesn't exist
-        save_dir = os.path.join("data", "train", label)
-        os.makedirs(save_dir, exist_ok=True)
-        
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}.jpg"
-        filepath = os.path.join(save_dir, filename)
-        
-        image.save(filepath)
-        logging.info(f"Saved image to {filepath}")
-        return True, filepath
+        with STAGE_SECONDS.time(stage="change_detect"):
+            thumbnail = preprocessing.roi_thumbnail(Image.open(io.BytesIO(data)), ROI)
     except Exception as e:
+        print(f"Change detection error: {e}")
+        thumbnail = None
+
+    if thumbnail is not None:
+        cached = change_detector.cached(thumbnail)
+        if cached is not None:
+            SKIPPED.inc()
+            return cached
+
+    # Classify a separate Image: the fast decode path decodes it in place at reduced scale.
+    status, confidence = classify_image(Image.open(io.BytesIO(data)))
+    if thumbnail is not None and "error" not in status:
+        change_detector.update(thumbnail, (status, confidence))
+    return status, confidence
+
+def predict_gate_status(image):
+    """Predicts the gate status (open/closed) using TFLite model."""
+    status, _ = classify_image(image)
+    return status
+
+# === Batch Prediction ===
+# Images per interpreter call; larger uploads are split into several batches.
+PREDICT_BATCH_SIZE = int(os.environ.get("GATE_PREDICT_BATCH", "32"))
+PREDICT_MAX_IMAGES = int(os.environ.get("GATE_PREDICT_MAX_IMAGES", "1000"))
+# Uploads larger than this are refused before they are buffered (also
+# enforced by Flask for chunked bodies without a Content-Length).
+PREDICT_MAX_BYTES = int(os.environ.get("GATE_PREDICT_MAX_BYTES", str(256 * 1024 * 1024)))
+# Flask truncates a chunked body at the limit; one spare byte tells a body
+# exactly at the limit from a longer one.
+app.config['MAX_CONTENT_LENGTH'] = PREDICT_MAX_BYTES + 1
+# Limits on what a (compressed) tar upload may expand to.
+PREDICT_MAX_TAR_BYTES = int(os.environ.get("GATE_PREDICT_MAX_TAR_BYTES", str(PREDICT_MAX_BYTES)))
+PREDICT_MAX_TAR_MEMBERS = int(os.environ.get("GATE_PREDICT_MAX_TAR_MEMBERS", str(4 * PREDICT_MAX_IMAGES)))
+
+preprocess_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4,
+                                         thread_name_prefix="preprocess")
+
+def _preprocess_bytes(data, target_size=(48, 48)):
+    try:
+        return crop_and_preprocess(Image.open(io.BytesIO(data)), target_size)
+    except Exception as e:
+        return e
+
+def classify_batch(images):
+    """
+    Classifies [(name, jpeg_bytes)] in one pass: decodes/preprocesses in
+    parallel, then runs the model on batches of PREDICT_BATCH_SIZE.
+    Returns one result dict per image, in order.
+    """
+    pool = interpreter_pool  # one model for the whole request
+    target_sizes = [model_input_size(pool)] * len(images)
+    inputs = list(preprocess_executor.map(_preprocess_bytes, [data for _, data in images], target_sizes))
+
+    results = [None] * len(images)
+    valid = []
+    for i, ((name, _), item) in enumerate(zip(images, inputs)):
+        if isinstance(item, Exception):
+            results[i] = {"name": name, "status": "error", "message": f"Failed to decode image: {item}"}
+        else:
+            valid.append(i)
+
+    for start in range(0, len(valid), PREDICT_BATCH_SIZE):
+        chunk = valid[start:start + PREDICT_BATCH_SIZE]
+        batch = np.concatenate([inputs[i] for i in chunk])
+        with pool.checkout() as slot:
+            output_data = slot.run(batch)
+        for i, scores in zip(chunk, output_data):
+            predicted_class = int(np.argmax(scores))
+            record_prediction(CLASSES[predicted_class], float(scores[predicted_class]), source="batch")
+            results[i] = {
+                "name": images[i][0],
+                "status": CLASSES[predicted_class],
+                "confidence": round(float(scores[predicted_class]), 4),
+                "scores": {c: float(s) for c, s in zip(CLASSES, scores)},
+            }
+    return results
+
+# === Single-flight Capture ===
+# Concurrent requests that arrive while a camera fetch + inference is already
+# running wait for that result instead of hitting the camera again. This also
+# spares the interpreter pool from duplicate work.
+capture_flight = SingleFlight()
+
+REGISTRY.callback("gate_capture_coalesced_total", "Requests that shared an in-flight capture.",
+                  lambda: capture_flight.coalesced, type="counter")
+# Retries replace the old curl fallback as the signal for a flaky camera link.
+REGISTRY.callback("gate_camera_retries_total", "Camera fetch retries after a connection error.",
+                  lambda: camera.stats()["retries"], type="counter")
+
+def _capture_and_classify():
+    data = get_camera_frame()
+    if data is None:
+        return None, "error", 0.0, None
+    # The frame's age counts from when the camera delivered it, not from after inference.
+    captured_at = time.time()
+    status, confidence = classify_frame(data)
+    return data, status, confidence, captured_at
+
+def capture_and_classify():
+    """
+    Fetches a camera frame and classifies it, coalescing concurrent callers.
+    Returns (jpeg bytes, status, confidence, time the fetch completed).
+    """
+    return capture_flight.do("camera", _capture_and_classify)
+
+# === Background Sampler ===
+# Poll interval in seconds for the background sampler (0 disables it).
+SAMPLE_INTERVAL = float(os.environ.get("GATE_SAMPLE_INTERVAL", "5"))
+
+# Consecutive agreeing samples before a state change is pushed (NUMCHECK in the firmware).
+NUMCHECK = int(os.environ.get("GATE_NUMCHECK", "2"))
+
+state_tracker = StateTracker(NUMCHECK)
+REGISTRY.callback("gate_event_subscribers", "Connected /events and /state subscribers.",
+                  lambda: state_tracker.subscribers)
+
+class GateSampler:
+    """Polls the camera in the background and caches the latest prediction."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL, tracker=None):
+        self.interval = interval
+        self.tracker = tracker
+        self._lock = threading.Lock()
+        self._latest = None  # {"status", "confidence", "captured_at"}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts the polling thread (no-op if disabled or already running)."""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="gate-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 10)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        """Captures and classifies a fresh frame. Returns the new result or None."""
+        _, status, confidence, captured_at = capture_and_classify()
+        if "error" in status:
+            logging.error(f"Sampler: {status}")
+            return None
+
+        result = {"status": status, "confidence": confidence, "captured_at": captured_at}
+        with self._lock:
+            self._latest = result
+        if self.tracker is not None:
+            self.tracker.observe(result)
+        return result
+
+    def latest(self):
+        with self._lock:
+            return self._latest
+
+    def get(self, max_age=None):
+        """
+        Returns the cached result, capturing a fresh one first if there is
+        no cached result yet or it is older than max_age seconds.
+        """
+        result = self.latest()
+        if result is None or (max_age is not None and time.time() - result["captured_at"] > max_age):
+            result = self.sample()
+        return result
+
+sampler = GateSampler(tracker=state_tracker)
+
+# === Multiple Cameras ===
+# Optional: cameras.json lists more cameras, each with its own ROI, model and
+# poll interval, served on /gates and /gates/<name>. Without it, /gates
+# serves the single camera above as "gate".
+CAMERAS_FILE = os.environ.get("GATE_CAMERAS", "cameras.json")
+
+def load_camera_group(filepath):
+    """Loads the camera group from filepath, or returns None if there is none."""
+    if not os.path.exists(filepath):
+        return None
+    try:
+        configs = load_camera_config(filepath)
+        # The built-in camera is already polled (and change-detected) by the
+        # sampler, so the group serves it from there instead of polling it again.
+        builtin = [c for c in configs if c.url == gate_url]
+        for c in builtin:
+            if tuple(c.roi) != tuple(ROI) or c.model != os.path.abspath(MODEL_PATH):
+                msg = (f"Camera {c.name} in {filepath} is the built-in camera; it is served with "
+                       f"roi.json and {MODEL_PATH}, not its own ROI and model")
+                print(msg)
+                logging.warning(msg)
+        # The served model is shared, so its reloads (and canary checks) reach the cameras too.
+        pools = {os.path.abspath(MODEL_PATH): interpreter_pool} if interpreter_pool is not None else None
+        group = CameraGroup(configs, pool_size=POOL_SIZE, num_threads=NUM_THREADS,
+                            use_xnnpack=USE_XNNPACK, checkout_timeout=CHECKOUT_TIMEOUT,
+                            camera_options={"connect_timeout": camera.connect_timeout,
+                                            "read_timeout": camera.read_timeout,
+                                            "retries": camera.retries},
+                            pools=pools, samplers={c.name: sampler for c in builtin},
+                            prepare=prepare_camera_input, change_threshold=CHANGE_THRESHOLD,
+                            force_every=FORCE_RESCORE_EVERY,
+                            batch_window=float(os.environ.get("GATE_CAMERA_BATCH_WINDOW", "0.05")))
+        print(f"Loaded {len(group.names)} cameras from {filepath}: {', '.join(group.names)}")
+        return group
+    except Exception as e:
+        msg = f"Error loading camera config {filepath}: {e}"
+        print(msg)
+        logging.error(msg)
+        return None
+
+camera_group = load_camera_group(CAMERAS_FILE)
+
+def reload_models(force=False):
+    """
+    Reloads the served model and any other model files cameras.json uses.
+    Returns model_reloader's result, plus {"cameras": {file: result}}.
+    """
+    result = model_reloader.load(force=force)
+    if camera_group is not None and camera_group.reloaders:
+        result = {**result, "cameras": camera_group.reload(force=force)}
+    return result
+
+def watch_models(interval=MODEL_WATCH_INTERVAL):
+    model_reloader.watch(interval)
+    if camera_group is not None:
+        camera_group.watch(interval)
+
+def gate_results(max_age=None):
+    """{name: sampler result or None} for every configured camera."""
+    if camera_group is None:
+        return {"gate": sampler.get(max_age=max_age)}
+    return camera_group.get_all(max_age=max_age)
+
+def gate_result(name, max_age=None):
+    """Result for one camera; raises KeyError for an unknown name."""
+    if camera_group is None:
+        if name != "gate":
+            raise KeyError(name)
+        return sampler.get(max_age=max_age)
+    return camera_group.get(name, max_age=max_age)
+
+# === Image Saving Helper ===
+# Captures are written as the original camera JPEG bytes by a background
+# thread; /capture only queues them.
+capture_writer = CaptureWriter(
+    root=os.path.join("data", "train"),
+    max_queue=int(os.environ.get("GATE_CAPTURE_QUEUE", "64")),
+    fsync_batch=int(os.environ.get("GATE_FSYNC_BATCH", "16")))
+REGISTRY.callback("gate_capture_queue_depth", "Captures waiting to be written to disk.", capture_writer.depth)
+REGISTRY.callback("gate_captures_written_total", "Captures written to disk.",
+                  lambda: capture_writer.written, type="counter")
+REGISTRY.callback("gate_capture_write_errors_total", "Captures that failed to write.",
+                  lambda: capture_writer.errors, type="counter")
+
+def save_image(data, label="unknown"):
+    """Queues raw JPEG bytes for writing to data/train/<label>. Returns (success, path or error)."""
+    if data is None:
+        return False, "No image to save"
+    try:
+        return True, capture_writer.submit(data, label)
+    except CaptureQueueFull as e:
         err_msg = f"Error saving image: {e}"
         logging.error(err_msg)
         print(err_msg)
@@ -185,53 +544,286 @@ def save_image(image, label="unknown"):
 
 # === Routes ===
 
+def clean_label(status):
+    """Cleans a capture label to be safe for the filesystem."""
+    status = "".join([c for c in status if c.isalnum() or c in ('_', '-')])
+    return status or "unknown"
+
+def status_payload(result):
+    """JSON body for GET / from a sampler result."""
+    return {
+        "status": result["status"],
+        "confidence": round(result["confidence"], 4),
+        "captured_at": datetime.fromtimestamp(result["captured_at"]).isoformat(timespec='milliseconds'),
+        "age": round(time.time() - result["captured_at"], 3),
+    }
+
+def event_payload(event):
+    """JSON body for a debounced state change."""
+    return {
+        "id": event["id"],
+        "status": event["status"],
+        "previous": event["previous"],
+        "confidence": round(event["confidence"], 4),
+        "captured_at": datetime.fromtimestamp(event["captured_at"]).isoformat(timespec='milliseconds'),
+        "changed_at": datetime.fromtimestamp(event["changed_at"]).isoformat(timespec='milliseconds'),
+    }
+
+def sse_message(event):
+    return f"id: {event['id']}\nevent: state\ndata: {json.dumps(event_payload(event))}\n\n"
+
+# Seconds between SSE keep-alive comments, and the cap on a /state long poll.
+SSE_KEEPALIVE = float(os.environ.get("GATE_SSE_KEEPALIVE", "15"))
+LONG_POLL_MAX = 60.0
+
 @app.route("/capture", methods=['GET'])
 def capture_image_route():
     """
     API endpoint to capture and save an image with a specific label.
     Usage: /capture?status=open|closed|low_confidence
     """
-    status = request.args.get('status', 'unknown')
-    
-    # Clean status to be safe for filesystem
-    status = "".join([c for c in status if c.isalnum() or c in ('_', '-')])
-    if not status:
-        status = "unknown"
+    status = clean_label(request.args.get('status', 'unknown'))
 
-    image = get_camera_image()
+    data, _, _, _ = capture_and_classify()
     
-    if image is None:
+    if data is None:
          return Response(json.dumps({"status": "error", "message": "Failed to fetch image from camera"}),
                         status=500, mimetype='application/json')
                         
-    success, result = save_image(image, status)
+    success, result = save_image(data, status)
     
     if success:
         return Response(json.dumps({"status": "success", "file": result, "label": status}),
                         mimetype='application/json')
     else:
+        # Writer backlog: ask the client to retry later.
         return Response(json.dumps({"status": "error", "message": result}),
-                        status=500, mimetype='application/json')
+                        status=503, mimetype='application/json')
 
 
 @app.route("/", methods=['GET'])
 def get_gate_status():
     """
     Web service endpoint that returns the gate status as JSON.
+    Serves the sampler's cached result; use /?max_age=<seconds> to force a
+    fresh capture when the cached result is older than that.
     """
-    image = get_camera_image()
-    status = predict_gate_status(image)
+    max_age = request.args.get('max_age', type=float)
+    result = sampler.get(max_age=max_age)
     
-    if "error" in status:
+    if result is None:
         return Response(json.dumps({"status": "error", "message": "Failed to retrieve image or predict"}),
                         status=500, mimetype='application/json')
 
+    status = result["status"]
     log_msg = f"Gate status: {status}"
     logging.info(log_msg)
 
-    response_data = {"status": status}
+    with STAGE_SECONDS.time(stage="serialize"):
+        return Response(json.dumps(status_payload(result)), mimetype='application/json')
+
+@app.route("/gates", methods=['GET'])
+def gates_route():
+    """Status of every configured camera; accepts ?max_age=<seconds> like /."""
+    results = gate_results(max_age=request.args.get('max_age', type=float))
+    response_data = {name: status_payload(result) if result else {"status": "error"}
+                     for name, result in results.items()}
     return Response(json.dumps(response_data), mimetype='application/json')
 
+@app.route("/gates/<name>", methods=['GET'])
+def gate_route(name):
+    """Status of one camera from cameras.json, same body as /."""
+    try:
+        result = gate_result(name, max_age=request.args.get('max_age', type=float))
+    except KeyError:
+        return Response(json.dumps({"status": "error", "message": f"Unknown camera: {name}"}),
+                        status=404, mimetype='application/json')
+    if result is None:
+        return Response(json.dumps({"status": "error", "message": "Failed to retrieve image or predict"}),
+                        status=500, mimetype='application/json')
+    return Response(json.dumps(status_payload(result)), mimetype='application/json')
+
+@app.route("/predict", methods=['POST'])
+def predict_route():
+    """
+    Batch prediction for uploaded images. Accepts multipart file uploads,
+    a tar archive, or one or more concatenated JPEGs as the request body.
+    Usage: curl --data-binary @frames.tar http://host:5001/predict
+    """
+    if interpreter_pool is None:
+        return Response(json.dumps({"status": "error", "message": "Model not loaded"}),
+                        status=500, mimetype='application/json')
+    too_large = Response(json.dumps({"status": "error",
+                                     "message": f"Request body too large (max {PREDICT_MAX_BYTES} bytes)"}),
+                         status=413, mimetype='application/json')
+    if request.content_length is not None and request.content_length > PREDICT_MAX_BYTES:
+        return too_large
+    try:
+        images = images_from_request(request, PREDICT_MAX_BYTES, PREDICT_MAX_TAR_BYTES, PREDICT_MAX_TAR_MEMBERS)
+    except ImageBatchError as e:
+        return Response(json.dumps({"status": "error", "message": str(e)}),
+                        status=400, mimetype='application/json')
+    except RequestEntityTooLarge as e:
+        if e.description == RequestEntityTooLarge.description:
+            return too_large
+        return Response(json.dumps({"status": "error", "message": e.description}),
+                        status=413, mimetype='application/json')
+
+    if not images:
+        return Response(json.dumps({"status": "error", "message": "No images in request"}),
+                        status=400, mimetype='application/json')
+    if len(images) > PREDICT_MAX_IMAGES:
+        return Response(json.dumps({"status": "error", "message": f"Too many images (max {PREDICT_MAX_IMAGES})"}),
+                        status=413, mimetype='application/json')
+
+    try:
+        results = classify_batch(images)
+    except PoolTimeout as e:
+        # Every interpreter is busy: ask the client to retry rather than fail with a 500.
+        return Response(json.dumps({"status": "error", "message": f"Server busy: {e}"}),
+                        status=503, mimetype='application/json', headers={"Retry-After": "1"})
+    return Response(json.dumps({"status": "success", "count": len(results), "results": results}),
+                    mimetype='application/json')
+
+@app.route("/events", methods=['GET'])
+def events_route():
+    """
+    Server-Sent Events stream of debounced gate state changes, fed by the
+    background sampler. Sends the current state on connect, then one
+    "state" event per change. Resumes from Last-Event-ID or ?since=<id>.
+    """
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    if since is None:
+        since = max(state_tracker.last_id - 1, 0)
+
+    def stream(since):
+        with state_tracker.subscription():
+            while True:
+                events = state_tracker.wait(since, timeout=SSE_KEEPALIVE)
+                if not events:
+                    yield ": keepalive\n\n"
+                    continue
+                for event in events:
+                    yield sse_message(event)
+                since = events[-1]["id"]
+
+    return Response(stream(since), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route("/state", methods=['GET'])
+def state_route():
+    """
+    Long-poll alternative to /events. Without since, returns the current
+    state immediately; with /state?since=<id>&timeout=<s> waits up to
+    timeout seconds for changes after that id.
+    """
+    since = request.args.get('since', type=int)
+    with state_tracker.subscription():
+        if since is None:
+            events = state_tracker.events_since(max(state_tracker.last_id - 1, 0))
+        else:
+            timeout = min(request.args.get('timeout', 30.0, type=float), LONG_POLL_MAX)
+            events = state_tracker.wait(since, timeout=timeout)
+    response_data = {
+        "last_id": events[-1]["id"] if events else state_tracker.last_id,
+        "events": [event_payload(e) for e in events],
+    }
+    return Response(json.dumps(response_data), mimetype='application/json')
+
+def admin_authorized():
+    """Admin routes need the X-Admin-Token header when GATE_ADMIN_TOKEN is set."""
+    return ADMIN_TOKEN is None or request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+
+RELOAD_STATUS_CODES = {"loaded": 200, "unchanged": 200, "rejected": 409, "error": 500}
+
+@app.route("/admin/reload", methods=['POST'])
+def reload_route():
+    """
+    Loads gate_detector_tiny.tflite again if it changed (?force=1 to reload
+    anyway). The new model is warmed up and checked against the canary set
+    before it replaces the current one; / keeps serving meanwhile.
+    """
+    if not admin_authorized():
+        return Response(json.dumps({"status": "error", "message": "Forbidden"}),
+                        status=403, mimetype='application/json')
+    result = reload_models(force=request.args.get('force') == '1')
+    return Response(json.dumps(result), status=RELOAD_STATUS_CODES[result["result"]],
+                    mimetype='application/json')
+
+@app.route("/model", methods=['GET'])
+def model_route():
+    """Hash, size, load time and input of the model being served, and the last reload attempt."""
+    return Response(json.dumps(model_status()), mimetype='application/json')
+
+@app.route("/ready", methods=['GET'])
+def ready_route():
+    """Readiness probe: 200 once a warmed-up model is loaded, else 503."""
+    ready = interpreter_pool is not None
+    return Response(json.dumps({"ready": ready, "startup": startup_report}),
+                    status=200 if ready else 503, mimetype='application/json')
+
+@app.route("/stats", methods=['GET'])
+def stats_route():
+    """Reports request coalescing, interpreter pool and camera counters."""
+    response_data = {
+        "singleflight": capture_flight.stats(),
+        "camera": camera.stats(),
+        "interpreter_pool": interpreter_pool.stats() if interpreter_pool else None,
+        "change_detector": change_detector.stats(),
+        "capture_writer": capture_writer.stats(),
+        "camera_group": camera_group.stats() if camera_group else None,
+    }
+    return Response(json.dumps(response_data), mimetype='application/json')
+
+@app.route("/metrics", methods=['GET'])
+def metrics_route():
+    """Prometheus scrape endpoint: per-stage latency histograms and counters."""
+    return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+# === Startup Report ===
+startup_report = {
+    "tflite_backend": BACKEND,
+    "backend_import_seconds": round(BACKEND_IMPORT_SECONDS, 3),
+    "model_load_seconds": model_reloader.info["load_seconds"] if model_reloader.info else None,
+    "ready_seconds": round(time.perf_counter() - _import_started, 3),
+}
+REGISTRY.callback("gate_startup_seconds", "Seconds from import to a warmed-up model.",
+                  lambda: startup_report["ready_seconds"])
+print(f"Startup: {BACKEND} imported in {startup_report['backend_import_seconds']}s, "
+      + (f"model loaded and warmed up in {startup_report['model_load_seconds']}s, "
+         if interpreter_pool is not None else "no model loaded, ")
+      + f"done in {startup_report['ready_seconds']}s")
+logging.info(f"Startup: {startup_report}")
+
+# === Background Threads ===
+_background_lock = threading.Lock()
+_background_started = False
+
+def start_background():
+    """Starts the sampler, the camera group and the model watchers once."""
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+        sampler.start()
+        if camera_group is not None:
+            camera_group.start()
+        watch_models()
+
+@app.before_request
+def _start_background_on_first_request():
+    # Under a WSGI server (gunicorn gate:app) __main__ never runs; without
+    # this, / would keep serving the first sample unless the client sent max_age.
+    if not _background_started:
+        start_background()
+
 if __name__ == "__main__":
-    # Use 0.0.0.0 to listen on all interfaces
-    app.run(host='0.0.0.0', port=5001, debug=False)
+    start_background()
+    try:
+        # Use 0.0.0.0 to listen on all interfaces
+        app.run(host='0.0.0.0', port=5001, debug=False)
+    finally:
+        capture_writer.close()
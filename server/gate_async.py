@@ -0,0 +1,358 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+
+# Reuses the model, preprocessing and saving code (and the gate_status.log setup) from gate.py
+import gate
+from camera_client import AsyncCameraClient
+from singleflight import AsyncSingleFlight
+from state_events import StateTracker
+from metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE
+
+# === Configuration ===
+HOST = os.environ.get("GATE_HOST", "0.0.0.0")
+PORT = int(os.environ.get("GATE_PORT", "5001"))
+# Bounded executor for inference and disk writes; matches the interpreter pool
+# so queued work waits here instead of in the pool checkout.
+EXECUTOR_WORKERS = gate.POOL_SIZE
+SHUTDOWN_TIMEOUT = float(os.environ.get("GATE_SHUTDOWN_TIMEOUT", "10"))
+
+executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="inference")
+# /gates blocks on the (sync) camera group's fetches; those wait here so slow
+# cameras never hold the inference threads / needs.
+CAMERA_WORKERS = int(os.environ.get("GATE_CAMERA_WORKERS", "4"))
+camera_executor = ThreadPoolExecutor(max_workers=CAMERA_WORKERS, thread_name_prefix="camera-group")
+camera = AsyncCameraClient(gate.gate_url, gate.gate_user, gate.gate_password,
+                           connect_timeout=gate.camera.connect_timeout,
+                           read_timeout=gate.camera.read_timeout,
+                           retries=gate.camera.retries)
+capture_flight = AsyncSingleFlight()
+
+# Point the scrape-time counters at this module's camera and single-flight.
+REGISTRY.callback("gate_capture_coalesced_total", "Requests that shared an in-flight capture.",
+                  lambda: capture_flight.coalesced, type="counter")
+REGISTRY.callback("gate_camera_retries_total", "Camera fetch retries after a connection error.",
+                  lambda: camera.stats()["retries"], type="counter")
+
+
+async def _capture_and_classify():
+    try:
+        with gate.STAGE_SECONDS.time(stage="camera_fetch"):
+            data = await camera.fetch()
+    except Exception as e:
+        gate.CAMERA_ERRORS.inc()
+        msg = f"Error fetching image from camera: {e}"
+        print(msg)
+        logging.error(msg)
+        return None, "error", 0.0, None
+    captured_at = time.time()
+    loop = asyncio.get_running_loop()
+    status, confidence = await loop.run_in_executor(executor, gate.classify_frame, data)
+    return data, status, confidence, captured_at
+
+
+async def capture_and_classify():
+    """Fetches a camera frame and classifies it, coalescing concurrent callers."""
+    return await capture_flight.do("camera", _capture_and_classify)
+
+
+# === Background Sampler ===
+class AsyncGateSampler:
+    """asyncio version of gate.GateSampler."""
+
+    def __init__(self, interval=gate.SAMPLE_INTERVAL, tracker=None):
+        self.interval = interval
+        self.tracker = tracker
+        self._latest = None
+        self._task = None
+
+    def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self.sample()
+            await asyncio.sleep(self.interval)
+
+    async def sample(self):
+        _, status, confidence, captured_at = await capture_and_classify()
+        if "error" in status:
+            logging.error(f"Sampler: {status}")
+            return None
+        self._latest = {"status": status, "confidence": confidence, "captured_at": captured_at}
+        if self.tracker is not None:
+            self.tracker.observe(self._latest)
+        return self._latest
+
+    def latest(self):
+        return self._latest
+
+    async def get(self, max_age=None):
+        result = self._latest
+        if result is None or (max_age is not None and time.time() - result["captured_at"] > max_age):
+            result = await self.sample()
+        return result
+
+
+# === State Change Events ===
+state_tracker = StateTracker(gate.NUMCHECK)
+REGISTRY.callback("gate_event_subscribers", "Connected /events and /state subscribers.",
+                  lambda: state_tracker.subscribers)
+_state_changed = asyncio.Event()
+
+def _notify_state_change(event):
+    # Observed on the event loop by the sampler: wake every waiter at once.
+    global _state_changed
+    changed, _state_changed = _state_changed, asyncio.Event()
+    changed.set()
+
+state_tracker.add_listener(_notify_state_change)
+
+
+async def wait_for_events(since, timeout):
+    """asyncio version of StateTracker.wait."""
+    since = state_tracker.resume_point(since)
+    events = state_tracker.events_since(since)
+    if not events:
+        try:
+            await asyncio.wait_for(_state_changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        events = state_tracker.events_since(since)
+    return events
+
+
+sampler = AsyncGateSampler(tracker=state_tracker)
+
+
+class LoopSampler:
+    """
+    Lets gate.camera_group, which runs on worker threads, serve the built-in
+    camera from the async sampler instead of gate.py's (unstarted) one.
+    """
+
+    def __init__(self, sampler, loop):
+        self.sampler = sampler
+        self.loop = loop
+
+    def latest(self):
+        return self.sampler.latest()
+
+    def sample(self):
+        return asyncio.run_coroutine_threadsafe(self.sampler.sample(), self.loop).result()
+
+
+def json_response(data, status=200):
+    return web.Response(text=json.dumps(data), status=status, content_type='application/json')
+
+
+def _max_age(request):
+    try:
+        return float(request.query['max_age'])
+    except (KeyError, ValueError):
+        return None
+
+
+# === Routes ===
+routes = web.RouteTableDef()
+
+
+@routes.get("/capture")
+async def capture_image_route(request):
+    """
+    API endpoint to capture and save an image with a specific label.
+    Usage: /capture?status=open|closed|low_confidence
+    """
+    status = gate.clean_label(request.query.get('status', 'unknown'))
+
+    data, _, _, _ = await capture_and_classify()
+    if data is None:
+        return json_response({"status": "error", "message": "Failed to fetch image from camera"}, status=500)
+
+    # Only queues the bytes; the write happens on gate.capture_writer's thread.
+    success, result = gate.save_image(data, status)
+
+    if success:
+        return json_response({"status": "success", "file": result, "label": status})
+    return json_response({"status": "error", "message": result}, status=503)
+
+
+@routes.get("/")
+async def get_gate_status(request):
+    """
+    Web service endpoint that returns the gate status as JSON.
+    Same semantics as gate.py, including /?max_age=<seconds>.
+    """
+    result = await sampler.get(max_age=_max_age(request))
+
+    if result is None:
+        return json_response({"status": "error", "message": "Failed to retrieve image or predict"}, status=500)
+
+    logging.info(f"Gate status: {result['status']}")
+    with gate.STAGE_SECONDS.time(stage="serialize"):
+        return json_response(gate.status_payload(result))
+
+
+@routes.get("/gates")
+async def gates_route(request):
+    """Status of every configured camera, same as gate.py."""
+    if gate.camera_group is None:
+        results = {"gate": await sampler.get(max_age=_max_age(request))}
+    else:
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(camera_executor, gate.camera_group.get_all, _max_age(request))
+    return json_response({name: gate.status_payload(result) if result else {"status": "error"}
+                          for name, result in results.items()})
+
+
+@routes.get("/gates/{name}")
+async def gate_route(request):
+    """Status of one camera from cameras.json, same as gate.py."""
+    name = request.match_info['name']
+    if gate.camera_group is None and name == "gate":
+        result = await sampler.get(max_age=_max_age(request))
+    elif gate.camera_group is None or name not in gate.camera_group.configs:
+        return json_response({"status": "error", "message": f"Unknown camera: {name}"}, status=404)
+    else:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(camera_executor, gate.camera_group.get, name, _max_age(request))
+    if result is None:
+        return json_response({"status": "error", "message": "Failed to retrieve image or predict"}, status=500)
+    return json_response(gate.status_payload(result))
+
+
+@routes.get("/events")
+async def events_route(request):
+    """Server-Sent Events stream of debounced state changes, same as gate.py."""
+    try:
+        since = int(request.headers.get('Last-Event-ID') or request.query['since'])
+    except (KeyError, ValueError):
+        since = max(state_tracker.last_id - 1, 0)
+
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    await response.prepare(request)
+    with state_tracker.subscription():
+        try:
+            while True:
+                events = await wait_for_events(since, gate.SSE_KEEPALIVE)
+                if not events:
+                    await response.write(b": keepalive\n\n")
+                    continue
+                for event in events:
+                    await response.write(gate.sse_message(event).encode())
+                since = events[-1]["id"]
+        except ConnectionResetError:
+            pass
+    return response
+
+
+@routes.get("/state")
+async def state_route(request):
+    """Long-poll alternative to /events, same as gate.py."""
+    with state_tracker.subscription():
+        try:
+            since = int(request.query['since'])
+        except (KeyError, ValueError):
+            events = state_tracker.events_since(max(state_tracker.last_id - 1, 0))
+        else:
+            try:
+                timeout = min(float(request.query.get('timeout', 30)), gate.LONG_POLL_MAX)
+            except ValueError:
+                timeout = 30.0
+            events = await wait_for_events(since, timeout)
+    return json_response({
+        "last_id": events[-1]["id"] if events else state_tracker.last_id,
+        "events": [gate.event_payload(e) for e in events],
+    })
+
+
+@routes.post("/admin/reload")
+async def reload_route(request):
+    """Reloads the model in the background, same as gate.py."""
+    if not (gate.ADMIN_TOKEN is None or request.headers.get('X-Admin-Token') == gate.ADMIN_TOKEN):
+        return json_response({"status": "error", "message": "Forbidden"}, status=403)
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, gate.reload_models, request.query.get('force') == '1')
+    return json_response(result, status=gate.RELOAD_STATUS_CODES[result["result"]])
+
+
+@routes.get("/model")
+async def model_route(request):
+    """Hash, size and load time of the model being served."""
+    return json_response(gate.model_status())
+
+
+@routes.get("/ready")
+async def ready_route(request):
+    """Readiness probe, same as gate.py."""
+    ready = gate.interpreter_pool is not None
+    return json_response({"ready": ready, "startup": gate.startup_report}, status=200 if ready else 503)
+
+
+@routes.get("/stats")
+async def stats_route(request):
+    """Reports request coalescing, interpreter pool and camera counters."""
+    return json_response({
+        "singleflight": capture_flight.stats(),
+        "camera": camera.stats(),
+        "interpreter_pool": gate.interpreter_pool.stats() if gate.interpreter_pool else None,
+        "change_detector": gate.change_detector.stats(),
+        "capture_writer": gate.capture_writer.stats(),
+        "camera_group": gate.camera_group.stats() if gate.camera_group else None,
+    })
+
+
+@routes.get("/metrics")
+async def metrics_route(request):
+    """Prometheus scrape endpoint, same metrics as gate.py."""
+    return web.Response(body=REGISTRY.render().encode(), headers={"Content-Type": METRICS_CONTENT_TYPE})
+
+
+# === App lifecycle ===
+async def on_startup(app):
+    sampler.start()
+    if gate.camera_group is not None:
+        loop = asyncio.get_running_loop()
+        gate.camera_group.samplers = {name: LoopSampler(sampler, loop) for name in gate.camera_group.samplers}
+        gate.camera_group.start()
+    gate.watch_models()
+
+
+async def on_cleanup(app):
+    # Graceful shutdown: stop polling, let in-flight inference finish, close sockets.
+    await sampler.stop()
+    gate.model_reloader.stop()
+    await camera.close()
+    camera_executor.shutdown(wait=True)
+    executor.shutdown(wait=True)
+    gate.capture_writer.close()
+    if gate.camera_group is not None:
+        gate.camera_group.stop()
+
+
+def create_app():
+    app = web.Application()
+    app.add_routes(routes)
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    # Drop-in replacement for gate.py on the same port
+    web.run_app(create_app(), host=HOST, port=PORT, shutdown_timeout=SHUTDOWN_TIMEOUT)
@@ -1,17 +1,14 @@
 
-import io
 import json
 import numpy as np
 from PIL import Image
 from flask import Flask, request, Response
-import urllib.request
-import base64
 import logging
 from datetime import datetime
 import os
 import time
-import subprocess
 from inference_sdk import InferenceHTTPClient
+from camera_client import CameraClient
 
 # === Setup Logging ===
 logging.basicConfig(
@@ -38,39 +35,18 @@ client = InferenceHTTPClient(
 gate_url = 'http://192.168.50.82/ISAPI/ContentMgmt/StreamingProxy/channels/801/picture?cmd=refresh'
 gate_user = 'admin'
 gate_password = 'pccw1234'
-auth_str = f'{gate_user}:{gate_password}'.encode('ascii')
-auth_b64 = base64.b64encode(auth_str).decode('ascii')
-headers = {'Authorization': 'Basic ' + auth_b64}
+
+camera = CameraClient(gate_url, gate_user, gate_password)
 
 def get_camera_image():
     """Fetches an image from the camera."""
     try:
-        req = urllib.request.Request(gate_url, headers=headers)
-        with urllib.request.urlopen(req, timeout=5) as response:
-            img_data = response.read()
-        return Image.open(io.BytesIO(img_data))
+        return camera.fetch_image()
     except Exception as e:
         msg = f"Error fetching image from camera: {e}"
         print(msg)
         logging.error(msg)
-        
-        # Fallback to CURL if Python network is blocked (e.g., VPN issues)
-        print("Attempting fallback to curl...")
-        try:
-            # Construct curl command
-            cmd = [
-                "curl", "-s",
-                "-u", f"{gate_user}:{gate_password}",
-                gate_url,
-                "--connect-timeout", "5"
-            ]
-            result = subprocess.run(cmd, capture_output=True, check=True)
-            return Image.open(io.BytesIO(result.stdout))
-        except Exception as curl_e:
-            curl_msg = f"Curl fallback failed: {curl_e}"
-            print(curl_msg)
-            logging.error(curl_msg)
-            return None
+        return None
 
 
 def predict_gate_status(image):
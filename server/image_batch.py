@@ -0,0 +1,118 @@
+import io
+import tarfile
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+# Markers without a length field: TEM, RST0-7, SOI, EOI.
+_STANDALONE_MARKERS = {0x01} | set(range(0xD0, 0xDA))
+
+
+class ImageBatchError(ValueError):
+    """Raised when a request body cannot be split into images."""
+
+
+def _jpeg_end(data, start):
+    """Returns the offset just past the EOI of the JPEG starting at start."""
+    pos = start + 2  # skip SOI
+    n = len(data)
+    while pos < n:
+        if data[pos] != 0xFF:
+            raise ImageBatchError(f"Corrupt JPEG segment at byte {pos}")
+        marker = data[pos + 1] if pos + 1 < n else None
+        if marker is None:
+            break
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == 0xD9:  # EOI
+            return pos + 2
+        if marker in _STANDALONE_MARKERS:
+            pos += 2
+            continue
+        if pos + 4 > n:
+            break
+        length = (data[pos + 2] << 8) | data[pos + 3]
+        pos += 2 + length
+        if marker == 0xDA:  # SOS: entropy-coded data follows until the next real marker
+            while True:
+                pos = data.find(b"\xff", pos)
+                if pos < 0 or pos + 1 >= n:
+                    raise ImageBatchError("Truncated JPEG scan data")
+                following = data[pos + 1]
+                # FF00 is a stuffed byte and FFD0-FFD7 are restart markers inside the scan.
+                if following == 0x00 or 0xD0 <= following <= 0xD7:
+                    pos += 2
+                    continue
+                break
+    raise ImageBatchError("JPEG without end-of-image marker")
+
+
+def split_jpegs(data):
+    """
+    Splits a buffer of concatenated JPEG files into a list of byte strings by
+    walking the segment structure, so embedded EXIF thumbnails (which carry
+    their own SOI/EOI) do not cut an image short.
+    """
+    images = []
+    pos = 0
+    n = len(data)
+    while pos < n:
+        start = data.find(b"\xff\xd8", pos)
+        if start < 0:
+            if data[pos:].strip(b"\x00\r\n\t "):
+                raise ImageBatchError(f"Unexpected data at byte {pos}")
+            break
+        if data[pos:start].strip(b"\x00\r\n\t "):
+            raise ImageBatchError(f"Unexpected data at byte {pos}")
+        end = _jpeg_end(data, start)
+        images.append(data[start:end])
+        pos = end
+    return images
+
+
+def read_tar_images(data, max_bytes=None, max_members=None):
+    """
+    Returns [(name, bytes)] for image files in a (optionally compressed) tar
+    archive. A small compressed archive can expand to far more than the
+    upload, so extraction stops with RequestEntityTooLarge once the members'
+    total size passes max_bytes or their number passes max_members.
+    """
+    images = []
+    total = 0
+    try:
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as tar:
+            # Every member counts: skipping one still decompresses it.
+            for count, member in enumerate(tar, 1):
+                total += member.size
+                if max_members is not None and count > max_members:
+                    raise RequestEntityTooLarge(f"Tar archive has more than {max_members} members")
+                if max_bytes is not None and total > max_bytes:
+                    raise RequestEntityTooLarge(f"Tar archive expands to more than {max_bytes} bytes")
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    images.append((member.name, tar.extractfile(member).read()))
+    except tarfile.TarError as e:
+        raise ImageBatchError(f"Invalid tar archive: {e}")
+    return images
+
+
+def images_from_request(request, max_bytes=None, max_tar_bytes=None, max_tar_members=None):
+    """
+    Collects [(name, bytes)] from a Flask request carrying multipart file
+    uploads, a tar archive, or one or more concatenated JPEGs as the body.
+    Raises RequestEntityTooLarge for a body over max_bytes or a tar archive
+    past max_tar_bytes / max_tar_members once extracted.
+    """
+    if request.files:
+        return [(f.filename or field, f.read()) for field, f in request.files.items(multi=True)]
+
+    data = request.get_data()
+    # A chunked body (no Content-Length) is cut off at MAX_CONTENT_LENGTH instead
+    # of refused, so the app allows one byte more than max_bytes to notice it.
+    if max_bytes is not None and len(data) > max_bytes:
+        raise RequestEntityTooLarge()
+    mimetype = request.mimetype or ""
+    if "tar" in mimetype or tarfile.is_tarfile(io.BytesIO(data)):
+        return read_tar_images(data, max_tar_bytes, max_tar_members)
+    return [(f"image_{i}", jpeg) for i, jpeg in enumerate(split_jpegs(data))]
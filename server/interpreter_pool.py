@@ -0,0 +1,226 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# The standalone TFLite runtimes import in a fraction of the time (and
+# memory) of the full tensorflow package, so auto mode only tries those.
+# GATE_TFLITE_BACKEND=tensorflow|ai_edge_litert|tflite_runtime forces one;
+# tensorflow is only ever imported when asked for explicitly.
+TFLITE_BACKEND = os.environ.get("GATE_TFLITE_BACKEND", "auto")
+AUTO_BACKENDS = ("tflite_runtime", "ai_edge_litert")
+
+def _import_backend(backend):
+    """Returns (Interpreter, OpResolverType) for a backend name."""
+    if backend == "tflite_runtime":
+        import tflite_runtime.interpreter as tflite
+        return tflite.Interpreter, getattr(tflite, "OpResolverType", None)
+    if backend == "ai_edge_litert":
+        from ai_edge_litert import interpreter as litert
+        return litert.Interpreter, getattr(litert, "OpResolverType", None)
+    if backend == "tensorflow":
+        import tensorflow as tf
+        return tf.lite.Interpreter, tf.lite.experimental.OpResolverType
+    raise ValueError(f"Unknown TFLite backend: {backend}")
+
+def load_backend(backend=TFLITE_BACKEND):
+    """Imports the first available backend. Returns (name, Interpreter, OpResolverType)."""
+    for name in (AUTO_BACKENDS if backend == "auto" else (backend,)):
+        try:
+            interpreter_cls, resolver_type = _import_backend(name)
+        except ImportError:
+            continue
+        return name, interpreter_cls, resolver_type
+    # Fallback will be handled in main code or let it crash if essential
+    print(f"Warning: No TFLite runtime installed (tried {backend}). Install ai-edge-litert or "
+          "tflite-runtime, or set GATE_TFLITE_BACKEND=tensorflow to use the full tensorflow package.")
+    return None, None, None
+
+_start = time.perf_counter()
+BACKEND, Interpreter, OpResolverType = load_backend()
+BACKEND_IMPORT_SECONDS = time.perf_counter() - _start
+
+
+class PoolTimeout(Exception):
+    """Raised when no interpreter becomes free within the checkout timeout."""
+
+
+def xnnpack_in_effect(use_xnnpack):
+    """
+    Whether interpreters will use XNNPACK. Turning it off needs the backend's
+    OpResolverType; without it the request is ignored, so warn and report on.
+    """
+    if not use_xnnpack and Interpreter is not None and OpResolverType is None:
+        print(f"Warning: {BACKEND} cannot disable XNNPACK (no OpResolverType); interpreters keep using it.")
+        return True
+    return use_xnnpack
+
+def create_interpreter(model_path, num_threads=1, use_xnnpack=True, model_content=None):
+    """Creates and allocates a single TFLite interpreter (from model_content if given)."""
+    kwargs = {"num_threads": num_threads}
+    if model_content is not None:
+        kwargs["model_content"] = model_content
+    else:
+        kwargs["model_path"] = model_path
+    if not use_xnnpack and OpResolverType is not None:
+        # The default resolver applies the XNNPACK delegate; this one does not.
+        kwargs["experimental_op_resolver_type"] = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+    interpreter = Interpreter(**kwargs)
+    interpreter.allocate_tensors()
+    return interpreter
+
+
+def quantize_input(data, detail):
+    """
+    Float model input -> the input tensor's integer type (int8/uint8 models),
+    using its scale and zero point. Other inputs are returned unchanged.
+    """
+    dtype = detail['dtype']
+    if dtype not in (np.int8, np.uint8) or not np.issubdtype(data.dtype, np.floating):
+        return data
+    scale, zero_point = detail['quantization']
+    limits = np.iinfo(dtype)
+    return np.clip(np.round(data / scale + zero_point), limits.min, limits.max).astype(dtype)
+
+
+def dequantize_output(data, detail):
+    """Integer model output -> float scores; float outputs are returned unchanged."""
+    if detail['dtype'] not in (np.int8, np.uint8):
+        return data
+    scale, zero_point = detail['quantization']
+    return (data.astype(np.float32) - zero_point) * scale
+
+
+class PooledInterpreter:
+    """An interpreter plus its cached tensor details."""
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.input_details = interpreter.get_input_details()
+        self.output_details = interpreter.get_output_details()
+        # None until a batch > 1 has been tried; models converted with a
+        # static batch of 1 (reshape to [1, N]) cannot be resized.
+        self.supports_batch = None
+
+    def _resize(self, batch_size):
+        index = self.input_details[0]['index']
+        shape = list(self.input_details[0]['shape'])
+        shape[0] = batch_size
+        self.interpreter.resize_tensor_input(index, shape)
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()
+        self.output_details = self.interpreter.get_output_details()
+
+    def _invoke(self, input_data):
+        self.interpreter.set_tensor(self.input_details[0]['index'], quantize_input(input_data, self.input_details[0]))
+        self.interpreter.invoke()
+        # Copy: the output buffer is reused by the next invoke.
+        output = self.interpreter.get_tensor(self.output_details[0]['index']).copy()
+        return dequantize_output(output, self.output_details[0])
+
+    def run(self, input_data):
+        """
+        Runs a (N, ...) input batch and returns the (N, ...) float output;
+        for quantized models float input is quantized and the output
+        dequantized. Resizes the input tensor with resize_tensor_input when
+        N differs from the current batch size, and falls back to one invoke
+        per sample when the model does not support batching.
+        """
+        batch_size = input_data.shape[0]
+        if batch_size != self.input_details[0]['shape'][0]:
+            if batch_size == 1 or self.supports_batch is not False:
+                try:
+                    self._resize(batch_size)
+                    if batch_size > 1:
+                        self.supports_batch = True
+                except (RuntimeError, ValueError):
+                    self.supports_batch = False
+                    self._resize(1)
+        if batch_size == self.input_details[0]['shape'][0]:
+            return self._invoke(input_data)
+        return np.concatenate([self._invoke(input_data[i:i + 1]) for i in range(batch_size)])
+
+
+class InterpreterPool:
+    """
+    A fixed set of pre-allocated TFLite interpreters. TFLite interpreters are
+    not thread-safe, so each request thread checks one out for exclusive use
+    and returns it when done.
+    """
+
+    def __init__(self, model_path, size=2, num_threads=1, use_xnnpack=True, checkout_timeout=5.0,
+                 model_content=None):
+        if Interpreter is None:
+            raise RuntimeError("No TFLite runtime available")
+        if size < 1:
+            raise ValueError(f"InterpreterPool needs at least one interpreter, got size={size}")
+        self.model_path = model_path
+        self.size = size
+        self.num_threads = num_threads
+        # What the interpreters actually do, which /stats reports.
+        self.use_xnnpack = xnnpack_in_effect(use_xnnpack)
+        self.checkout_timeout = checkout_timeout
+
+        self._free = queue.Queue()
+        for _ in range(size):
+            interpreter = create_interpreter(model_path, num_threads, use_xnnpack, model_content)
+            self._free.put(PooledInterpreter(interpreter))
+        # Model input shape as loaded, e.g. [1, 48, 48, 1]
+        self.input_shape = tuple(int(d) for d in interpreter.get_input_details()[0]['shape'])
+        # float32, or int8/uint8 for a fully quantized model (run() converts)
+        self.input_dtype = np.dtype(interpreter.get_input_details()[0]['dtype']).name
+
+        self._lock = threading.Lock()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def warm_up(self):
+        """Runs one zero-input invoke on every interpreter so the first request does not pay for it."""
+        slots = [self._free.get() for _ in range(self.size)]
+        try:
+            for slot in slots:
+                detail = slot.input_details[0]
+                slot.run(np.zeros(detail['shape'], dtype=detail['dtype']))
+        finally:
+            for slot in slots:
+                self._free.put(slot)
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """Yields a PooledInterpreter, waiting up to timeout seconds for one."""
+        if timeout is None:
+            timeout = self.checkout_timeout
+        start = time.perf_counter()
+        try:
+            slot = self._free.get(timeout=timeout)
+        except queue.Empty:
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeout(f"No interpreter free after {timeout}s")
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        try:
+            yield slot
+        finally:
+            self._free.put(slot)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "available": self._free.qsize(),
+                "num_threads": self.num_threads,
+                "xnnpack": self.use_xnnpack,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "wait_avg_ms": round(1000 * self._wait_total / self._checkouts, 3) if self._checkouts else 0.0,
+                "wait_max_ms": round(1000 * self._wait_max, 3),
+            }
@@ -0,0 +1,183 @@
+"""
+Scores TFLite models on the packed dataset, without TensorFlow.
+
+Shared by convert_tiny_cnn.py (float vs int8 parity report) and the
+evaluation scripts. Quantized models are fed and read through
+PooledInterpreter.run, which handles int8 I/O; batches go through
+resize_tensor_input, with one invoke per image for models converted with a
+static batch of 1.
+"""
+import time
+
+import numpy as np
+
+from dataset_store import CLASSES, open_dataset
+from interpreter_pool import PooledInterpreter, create_interpreter
+from preprocessing import mode_for_input_shape
+
+
+def load_model(model_path=None, model_content=None, num_threads=1):
+    """A PooledInterpreter for a .tflite file or its bytes."""
+    return PooledInterpreter(create_interpreter(model_path, num_threads, True, model_content))
+
+
+def input_mode(model):
+    """The preprocessing mode matching the model's input shape."""
+    return mode_for_input_shape(model.input_details[0]['shape'])
+
+
+def predict(model, dataset, indices=None, batch_size=32):
+    """Float (n, classes) scores for the given dataset indices (default: all)."""
+    indices = np.arange(len(dataset)) if indices is None else np.asarray(indices)
+    if len(indices) == 0:
+        return np.zeros((0, int(model.output_details[0]['shape'][-1])), dtype=np.float32)
+    return np.concatenate([model.run(dataset.x(indices[i:i + batch_size]))
+                           for i in range(0, len(indices), batch_size)])
+
+
+def time_invoke(model, runs=200, warmup=10):
+    """Single-image invoke latency in ms: {"mean", "p50", "p95"}."""
+    detail = model.input_details[0]
+    sample = np.random.default_rng(0).random([1, *detail['shape'][1:]]).astype(np.float32)
+    for _ in range(warmup):
+        model.run(sample)
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        model.run(sample)
+        times.append((time.perf_counter() - start) * 1000)
+    return {"mean": round(float(np.mean(times)), 4),
+            "p50": round(float(np.percentile(times, 50)), 4),
+            "p95": round(float(np.percentile(times, 95)), 4)}
+
+
+def agreement(reference_scores, scores, labels, classes):
+    """
+    Per true class: images, how often the two models pick the same class,
+    and each model's accuracy. Plus the largest absolute score difference.
+    """
+    reference_pred = np.argmax(reference_scores, axis=1)
+    pred = np.argmax(scores, axis=1)
+    report = {}
+    for label, class_name in enumerate(classes):
+        members = labels == label
+        n = int(members.sum())
+        if n == 0:
+            continue
+        report[class_name] = {
+            "images": n,
+            "agreement": round(float(np.mean(reference_pred[members] == pred[members])), 4),
+            "reference_accuracy": round(float(np.mean(reference_pred[members] == label)), 4),
+            "accuracy": round(float(np.mean(pred[members] == label)), 4),
+        }
+    report["overall_agreement"] = round(float(np.mean(reference_pred == pred)), 4) if len(pred) else None
+    report["max_score_difference"] = round(float(np.max(np.abs(reference_scores - scores))), 4) if len(pred) else None
+    return report
+
+
+def confusion_matrix(labels, predictions, n_classes):
+    """[true][predicted] counts."""
+    matrix = np.zeros((n_classes, n_classes), dtype=np.int64)
+    np.add.at(matrix, (labels, predictions), 1)
+    return matrix
+
+
+def calibration(confidence, correct, bins=10):
+    """
+    Confidence histogram: per bin of top-class confidence, how many images
+    fell in it, their mean confidence and their accuracy. Also returns the
+    expected calibration error (count-weighted |accuracy - confidence|).
+    """
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    which = np.clip(np.digitize(confidence, edges[1:-1], right=True), 0, bins - 1)
+    histogram = []
+    ece = 0.0
+    for b in range(bins):
+        members = which == b
+        n = int(members.sum())
+        entry = {"range": [round(float(edges[b]), 3), round(float(edges[b + 1]), 3)], "count": n}
+        if n:
+            entry["mean_confidence"] = round(float(confidence[members].mean()), 4)
+            entry["accuracy"] = round(float(correct[members].mean()), 4)
+            ece += n * abs(entry["accuracy"] - entry["mean_confidence"])
+        histogram.append(entry)
+    return histogram, round(ece / max(len(confidence), 1), 4)
+
+
+def summarize(scores, dataset, classes, invoke_seconds, bins=10):
+    """Accuracy, confusion matrix, calibration, misclassified files and throughput for one model."""
+    labels = dataset.labels
+    predictions = np.argmax(scores, axis=1) if len(scores) else np.zeros(0, dtype=np.int64)
+    confidence = scores[np.arange(len(scores)), predictions] if len(scores) else np.zeros(0)
+    correct = predictions == labels
+    histogram, ece = calibration(confidence, correct, bins)
+    per_class = {}
+    for label, class_name in enumerate(classes):
+        members = labels == label
+        if members.any():
+            per_class[class_name] = {"images": int(members.sum()),
+                                     "accuracy": round(float(correct[members].mean()), 4)}
+    return {
+        "images": len(labels),
+        "accuracy": round(float(correct.mean()), 4) if len(labels) else None,
+        "per_class": per_class,
+        "confusion_matrix": confusion_matrix(labels, predictions, len(classes)).tolist(),
+        "calibration": histogram,
+        "expected_calibration_error": ece,
+        "misclassified": [{"file": dataset.files[i], "label": classes[labels[i]],
+                           "predicted": classes[predictions[i]], "confidence": round(float(confidence[i]), 4)}
+                          for i in np.flatnonzero(~correct)],
+        "invoke_seconds": round(invoke_seconds, 3),
+        "images_per_second": round(len(labels) / invoke_seconds, 1) if invoke_seconds > 0 else None,
+    }
+
+
+def evaluate(model_paths, data_dir="./data", roi=None, classes=CLASSES, batch_size=256, bins=10, num_threads=1):
+    """
+    Evaluates one or more .tflite files on data_dir/train in a single pass:
+    each batch is decoded from the packed store once and run through every
+    model that takes that input size. With two or more models the result
+    also has their pairwise agreement and the files they disagree on.
+    """
+    models = {path: load_model(path, num_threads=num_threads) for path in model_paths}
+    by_mode = {}
+    for path, model in models.items():
+        by_mode.setdefault(input_mode(model), []).append(path)
+
+    results = {}
+    scores = {}
+    files = {}
+    for mode, paths in by_mode.items():
+        start = time.perf_counter()
+        dataset = open_dataset(data_dir, roi, mode, classes)
+        load_seconds = time.perf_counter() - start
+        batches = {path: [] for path in paths}
+        invoke_seconds = dict.fromkeys(paths, 0.0)
+        for i in range(0, len(dataset), batch_size):
+            x = dataset.x(np.arange(i, min(i + batch_size, len(dataset))))
+            for path in paths:
+                start = time.perf_counter()
+                batches[path].append(models[path].run(x))
+                invoke_seconds[path] += time.perf_counter() - start
+        for path in paths:
+            scores[path] = (np.concatenate(batches[path]) if batches[path]
+                            else np.zeros((0, len(classes)), dtype=np.float32))
+            results[path] = summarize(scores[path], dataset, classes, invoke_seconds[path], bins)
+            results[path].update(input_size=list(mode.size), load_seconds=round(load_seconds, 3),
+                                 batched=bool(models[path].supports_batch))
+        files[mode] = dataset.files
+
+    report = {"data_dir": data_dir, "batch_size": batch_size, "models": results}
+    if len(model_paths) > 1:
+        report["comparison"] = []
+        reference = model_paths[0]
+        for other in model_paths[1:]:
+            entry = {"models": [reference, other]}
+            mode = input_mode(models[reference])
+            if mode == input_mode(models[other]):
+                a, b = np.argmax(scores[reference], axis=1), np.argmax(scores[other], axis=1)
+                entry["agreement"] = round(float(np.mean(a == b)), 4) if len(a) else None
+                entry["disagreements"] = [{"file": files[mode][i], "predicted": [classes[a[i]], classes[b[i]]]}
+                                          for i in np.flatnonzero(a != b)]
+            report["comparison"].append(entry)
+    return report
@@ -0,0 +1,93 @@
+"""
+Writes the TFLite model as the C header (model_data.h) the ESP32 sketches
+include.
+
+The header is streamed a row at a time, so the cost is linear in the model
+size, and the output is byte-for-byte what convert_tiny_cnn.py has always
+produced. A copy whose bytes would not change is left untouched (same
+mtime), so the Arduino build does not recompile it.
+"""
+import io
+import os
+
+VAR_NAME = "gate_detector_model"
+BYTES_PER_LINE = 12
+_HEX = [f"0x{b:02x}" for b in range(256)]
+
+# Every copy of the header, relative to server/
+SKETCH_HEADER_PATHS = [os.path.join("..", "esp32gate", "model_data.h"),
+                       os.path.join("..", "tester", "model_data.h")]
+HEADER_PATHS = ["model_data.h"] + SKETCH_HEADER_PATHS
+
+
+def write_c_header(data, f, var_name=VAR_NAME):
+    """Streams model bytes to the text file f as a C array plus its length."""
+    f.write("#ifndef MODEL_DATA_H\n")
+    f.write("#define MODEL_DATA_H\n\n")
+    f.write(f"const unsigned char {var_name}[] = {{")
+    view = memoryview(data)
+    for start in range(0, len(view), BYTES_PER_LINE):
+        row = ", ".join(_HEX[b] for b in view[start:start + BYTES_PER_LINE])
+        # Rows after the first continue the previous one's trailing ", "
+        f.write(("\n  " if start == 0 else ", \n  ") + row)
+    f.write("\n};\n")
+    f.write(f"const int {var_name}_len = {len(view)};\n")
+    f.write("\n#endif // MODEL_DATA_H\n")
+
+
+def render_c_header(data, var_name=VAR_NAME):
+    """The header as bytes."""
+    buf = io.StringIO()
+    write_c_header(data, buf, var_name)
+    return buf.getvalue().encode("ascii")
+
+
+def write_if_changed(path, content):
+    """
+    Atomically writes content (bytes) to path unless the file already holds
+    exactly those bytes. Returns "written", "unchanged" or "skipped" when
+    the directory does not exist (e.g. a checkout without the sketches).
+    """
+    directory = os.path.dirname(path) or "."
+    if not os.path.isdir(directory):
+        return "skipped"
+    try:
+        if os.path.getsize(path) == len(content):
+            with open(path, "rb") as f:
+                if f.read() == content:
+                    return "unchanged"
+    except OSError:
+        pass
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return "written"
+
+
+def input_dtype(tflite_model):
+    """Name of the model's input tensor type ("float32", "int8", ...), or None without any TFLite runtime."""
+    # Imported here so rendering headers does not load a TFLite runtime.
+    import interpreter_pool
+    interpreter_cls = interpreter_pool.Interpreter
+    if interpreter_cls is None:
+        # The build machine has the full tensorflow package even when the server runtimes are missing.
+        try:
+            interpreter_cls, _ = interpreter_pool._import_backend("tensorflow")
+        except ImportError:
+            return None
+    interpreter = interpreter_cls(model_content=tflite_model)
+    return interpreter.get_input_details()[0]["dtype"].__name__
+
+
+def deploy_headers(tflite_model, paths=HEADER_PATHS, float_input_paths=SKETCH_HEADER_PATHS):
+    """
+    Renders the header once and writes every copy that differs. Returns
+    {path: result}. The sketches feed the model a float array through
+    EloquentTinyML, so a model with any other input type is "refused" for
+    float_input_paths and their current header is kept.
+    """
+    content = render_c_header(tflite_model)
+    dtype = input_dtype(tflite_model) if any(p in float_input_paths for p in paths) else "float32"
+    return {path: "refused" if path in float_input_paths and dtype != "float32"
+            else write_if_changed(path, content) for path in paths}
@@ -0,0 +1,130 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from metrics import REGISTRY
+
+RELOADS = REGISTRY.counter("gate_model_reloads_total", "Model load attempts by result.", ["result"])
+
+
+class ModelReloader:
+    """
+    Loads the model file into a new interpreter pool and swaps it in only
+    once it is ready: build_pool(content) builds and warms up the pool,
+    check(pool) returns (ok, details) for the canary set, and on_swap(pool)
+    publishes it. Requests keep using the old pool until on_swap runs.
+    The file can be watched for changes or reloaded on demand.
+    """
+
+    def __init__(self, model_path, build_pool, check=None, on_swap=None):
+        self.model_path = model_path
+        self.build_pool = build_pool
+        self.check = check
+        self.on_swap = on_swap
+        self.pool = None
+        self.info = None  # status of the model currently served
+        self.last_result = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load(self, force=False):
+        """
+        Loads the model file if its content changed (or force). Returns a
+        result dict whose "result" is loaded, unchanged, rejected or error.
+        Concurrent calls are serialized.
+        """
+        with self._reload_lock:
+            result = self._load(force)
+        RELOADS.inc(result=result["result"])
+        self.last_result = result
+        level = logging.INFO if result["result"] in ("loaded", "unchanged") else logging.ERROR
+        logging.log(level, f"Model reload: {result}")
+        return result
+
+    def _load(self, force):
+        start = time.perf_counter()
+        try:
+            with open(self.model_path, "rb") as f:
+                content = f.read()
+        except OSError as e:
+            return {"result": "error", "message": f"Cannot read {self.model_path}: {e}"}
+        sha256 = hashlib.sha256(content).hexdigest()
+        if not force and self.info is not None and self.info["sha256"] == sha256:
+            return {"result": "unchanged", "sha256": sha256}
+
+        try:
+            pool = self.build_pool(content)
+        except Exception as e:
+            return {"result": "error", "sha256": sha256, "message": f"Failed to build interpreter: {e}"}
+
+        canary = None
+        if self.check is not None:
+            try:
+                ok, canary = self.check(pool)
+            except Exception as e:
+                # e.g. an unreadable canary image: keep serving the old pool.
+                return {"result": "error", "sha256": sha256, "message": f"Canary check failed: {e}"}
+            # With nothing loaded yet, serving an unverified model beats serving none.
+            if not ok and self.pool is not None:
+                return {"result": "rejected", "sha256": sha256, "canary": canary}
+
+        load_seconds = time.perf_counter() - start
+        self.pool = pool
+        self.info = {
+            "path": self.model_path,
+            "sha256": sha256,
+            "size": len(content),
+            "loaded_at": datetime.now().isoformat(timespec='milliseconds'),
+            "load_seconds": round(load_seconds, 3),
+            "canary": canary,
+        }
+        if self.on_swap is not None:
+            self.on_swap(pool)
+        return {"result": "loaded", **self.info}
+
+    def status(self):
+        return {"model": self.info, "last_reload": self.last_result, "watching": self._thread is not None}
+
+    # === File watcher ===
+    def watch(self, interval=2.0):
+        """Polls the model file and reloads it once a change has settled."""
+        if self._thread is None and interval > 0:
+            self._thread = threading.Thread(target=self._watch, args=(interval,), name="model-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _stat(self):
+        try:
+            st = os.stat(self.model_path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _watch(self, interval):
+        seen = self._stat()
+        while not self._stop.wait(interval):
+            current = self._stat()
+            if current is None or current == seen:
+                continue
+            # Wait for the writer (e.g. retrain_deploy.sh) to finish.
+            while not self._stop.wait(interval):
+                settled = self._stat()
+                if settled == current:
+                    break
+                current = settled
+            seen = current
+            if current is not None:
+                try:
+                    self.load()
+                except Exception as e:
+                    # Keep watching: the next retrain should still be picked up.
+                    logging.exception(f"Model reload failed: {e}")
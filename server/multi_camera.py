@@ -0,0 +1,318 @@
+import io
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+
+import numpy as np
+from PIL import Image
+
+import preprocessing
+from camera_client import CameraClient
+from change_detector import ChangeDetector
+from interpreter_pool import InterpreterPool
+from metrics import REGISTRY
+from model_reload import ModelReloader
+
+CameraConfig = namedtuple("CameraConfig", ["name", "url", "user", "password", "roi", "model", "interval"])
+
+CAMERA_DEFAULTS = {"user": "admin", "password": "", "roi": "roi.json",
+                   "model": "gate_detector_tiny.tflite", "interval": 5.0}
+
+CLASSES = ["closed", "open"]
+
+# A fetched frame: the model input (None when the cached prediction is reused)
+# and the pool it was prepared for.
+_Frame = namedtuple("_Frame", ["name", "captured_at", "thumbnail", "input_data", "pool", "cached"])
+
+POLLS = REGISTRY.counter("gate_camera_polls_total", "Multi-camera polls by camera and result.", ["camera", "result"])
+BATCH_SIZE = REGISTRY.histogram("gate_inference_batch_size", "Frames per multi-camera inference batch.",
+                                buckets=(1, 2, 4, 8, 16, 32))
+
+
+def load_camera_config(filepath="cameras.json"):
+    """
+    Reads the multi-camera config: {"defaults": {...}, "cameras": [{...}]}.
+    Each camera needs a name and url; user, password, roi, model and
+    interval fall back to "defaults" and then CAMERA_DEFAULTS. roi is either
+    a roi.json-style file or an inline {"x", "y", "x1", "y1"} object. Paths
+    are relative to the config file.
+    """
+    with open(filepath, "r") as f:
+        data = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(filepath))
+
+    configs = []
+    for entry in data["cameras"]:
+        entry = {**CAMERA_DEFAULTS, **data.get("defaults", {}), **entry}
+        roi = entry["roi"]
+        if isinstance(roi, str):
+            roi = preprocessing.load_roi(os.path.join(base_dir, roi))
+        else:
+            roi = (roi["x"], roi["y"], roi["x1"], roi["y1"])
+        configs.append(CameraConfig(entry["name"], entry["url"], entry["user"], entry["password"],
+                                    tuple(roi), os.path.abspath(os.path.join(base_dir, entry["model"])),
+                                    float(entry["interval"])))
+
+    names = [c.name for c in configs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate camera names in {filepath}")
+    return configs
+
+
+def default_prepare(image, roi, target_size):
+    """Crops and BOX-resizes a frame to a (1, h, w, 1) model input, as in training."""
+    img_array = preprocessing.preprocess(image, roi, preprocessing.PreprocessMode(target_size, "box"))
+    return img_array.reshape(1, target_size[1], target_size[0], 1)
+
+
+class CameraGroup:
+    """
+    Polls several cameras. Cameras with the same interval are polled
+    together: each tick fetches them concurrently, and the frames that are
+    ready within batch_window seconds of the first one are classified in one
+    batch per model, so a slow camera holds the others back by at most that
+    long. Cameras sharing a model file share one interpreter pool.
+
+    As in gate.py's classify_frame, each camera has a ChangeDetector
+    (change_threshold, force_every) and a frame whose ROI has not changed
+    reuses that camera's last prediction. prepare(image, roi, target_size)
+    turns a frame into the model input; gate.py passes its own so
+    GATE_FAST_DECODE applies here too.
+
+    Each model file is loaded through a ModelReloader, so reload() and
+    watch() pick up a retrained model like gate.py does. pools can hand in
+    {model path: pool} loaded elsewhere (gate.py's own model); the owner
+    then publishes new versions with replace_pool.
+
+    samplers maps camera names to an object with sample() and latest() that
+    already polls that camera (gate.py's GateSampler for the built-in one);
+    the group serves those cameras from it instead of polling them twice.
+    """
+
+    def __init__(self, configs, pool_size=2, num_threads=1, use_xnnpack=True, checkout_timeout=5.0,
+                 camera_options=None, pools=None, samplers=None, prepare=default_prepare,
+                 change_threshold=2.0, force_every=12, batch_window=0.05):
+        self.configs = {c.name: c for c in configs}
+        self.samplers = dict(samplers or {})
+        self.prepare = prepare
+        self.batch_window = batch_window
+        self._lock = threading.Lock()
+        camera_options = camera_options or {}
+        configs = [c for c in configs if c.name not in self.samplers]
+        self.cameras = {c.name: CameraClient(c.url, c.user, c.password, **camera_options) for c in configs}
+        self.detectors = {c.name: ChangeDetector(change_threshold, force_every) for c in configs}
+        self.pools = {}
+        self.input_sizes = {}  # name -> (width, height) of its model's input
+        self.reloaders = {}
+        for model, pool in (pools or {}).items():
+            self.replace_pool(model, pool)
+
+        def build_pool(model, content):
+            pool = InterpreterPool(model, size=pool_size, num_threads=num_threads, use_xnnpack=use_xnnpack,
+                                   checkout_timeout=checkout_timeout, model_content=content)
+            pool.warm_up()
+            return pool
+
+        for c in configs:
+            if c.model not in self.pools:
+                reloader = ModelReloader(c.model, partial(build_pool, c.model),
+                                         on_swap=partial(self.replace_pool, c.model))
+                result = reloader.load()
+                if result["result"] != "loaded":
+                    raise RuntimeError(f"Cannot load {c.model}: {result.get('message')}")
+                self.reloaders[c.model] = reloader
+
+        self._fetch_executor = ThreadPoolExecutor(max_workers=len(self.configs), thread_name_prefix="camera")
+        self._latest = {}  # name -> {"status", "confidence", "captured_at"}
+        self._stop = threading.Event()
+        self._threads = {}
+
+    @property
+    def names(self):
+        return list(self.configs)
+
+    def replace_pool(self, model, pool):
+        """Serves model with a new pool; frames already being scored finish on the old one."""
+        names = [name for name, c in self.configs.items() if c.model == model and name in self.cameras]
+        if not names:
+            return
+        with self._lock:
+            for name in names:
+                self.input_sizes[name] = (pool.input_shape[2], pool.input_shape[1])
+            self.pools[model] = pool
+        # Cached predictions came from the old model.
+        for name in names:
+            self.detectors[name].reset()
+
+    def reload(self, force=False):
+        """Reloads the model files this group loaded itself. Returns {model file: reload result}."""
+        return {os.path.basename(model): reloader.load(force=force) for model, reloader in self.reloaders.items()}
+
+    def watch(self, interval):
+        for reloader in self.reloaders.values():
+            reloader.watch(interval)
+
+    def start(self):
+        """Starts one polling thread per distinct interval."""
+        if self._threads:
+            return
+        by_interval = {}
+        for name, config in self.configs.items():
+            if config.interval > 0 and name in self.cameras:
+                by_interval.setdefault(config.interval, []).append(name)
+        for interval, names in by_interval.items():
+            thread = threading.Thread(target=self._run, args=(names, interval),
+                                      name=f"cameras-{interval:g}s", daemon=True)
+            thread.start()
+            self._threads[interval] = thread
+
+    def stop(self):
+        self._stop.set()
+        for interval, thread in self._threads.items():
+            thread.join(timeout=interval + 10)
+        self._threads = {}
+        for reloader in self.reloaders.values():
+            reloader.stop()
+        self._fetch_executor.shutdown(wait=True)
+        for camera in self.cameras.values():
+            camera.close()
+
+    def _run(self, names, interval):
+        while not self._stop.is_set():
+            self.sample(names)
+            self._stop.wait(interval)
+
+    def _fetch(self, name):
+        """Fetches one camera's frame and prepares its model input unless the ROI is unchanged."""
+        config = self.configs[name]
+        data = self.cameras[name].fetch()
+        captured_at = time.time()
+        try:
+            thumbnail = preprocessing.roi_thumbnail(Image.open(io.BytesIO(data)), config.roi)
+        except Exception as e:
+            print(f"Change detection error ({name}): {e}")
+            thumbnail = None
+        cached = self.detectors[name].cached(thumbnail) if thumbnail is not None else None
+        if cached is not None:
+            return _Frame(name, captured_at, thumbnail, None, None, cached)
+        with self._lock:
+            pool = self.pools[config.model]
+            target_size = self.input_sizes[name]
+        input_data = self.prepare(Image.open(io.BytesIO(data)), config.roi, target_size)
+        return _Frame(name, captured_at, thumbnail, input_data, pool, None)
+
+    def _poll_error(self, name, e):
+        POLLS.inc(camera=name, result="error")
+        msg = f"Error polling camera {name}: {e}"
+        print(msg)
+        logging.error(msg)
+
+    def _classify(self, frames):
+        """Scores frames in one batch per pool and input shape. Returns {name: result}."""
+        results = {}
+        batches = {}
+        for frame in frames:
+            if frame.cached is not None:
+                status, confidence = frame.cached
+                results[frame.name] = {"status": status, "confidence": confidence, "captured_at": frame.captured_at}
+            else:
+                batches.setdefault((id(frame.pool), frame.input_data.shape), []).append(frame)
+
+        for batch in batches.values():
+            BATCH_SIZE.observe(len(batch))
+            try:
+                with batch[0].pool.checkout() as slot:
+                    output_data = slot.run(np.concatenate([frame.input_data for frame in batch]))
+            except Exception as e:
+                for frame in batch:
+                    self._poll_error(frame.name, e)
+                continue
+            for frame, scores in zip(batch, output_data):
+                predicted_class = int(np.argmax(scores))
+                status, confidence = CLASSES[predicted_class], float(scores[predicted_class])
+                if frame.thumbnail is not None:
+                    self.detectors[frame.name].update(frame.thumbnail, (status, confidence))
+                results[frame.name] = {"status": status, "confidence": confidence, "captured_at": frame.captured_at}
+
+        for name, result in results.items():
+            POLLS.inc(camera=name, result=result["status"])
+        with self._lock:
+            self._latest.update(results)
+        return results
+
+    def sample(self, names=None):
+        """Captures and classifies the given cameras (default: all) concurrently. Returns {name: result}."""
+        names = list(names or self.configs)
+        shared = {self._fetch_executor.submit(self.samplers[name].sample): name
+                  for name in names if name in self.samplers}
+        fetches = {self._fetch_executor.submit(self._fetch, name): name
+                   for name in names if name not in self.samplers}
+
+        results = {}
+        pending = set(fetches)
+        while pending:
+            ready, pending = wait(pending, return_when=FIRST_COMPLETED)
+            if pending and self.batch_window > 0:
+                # Give the other cameras a moment so their frames share the batch.
+                more, pending = wait(pending, timeout=self.batch_window)
+                ready |= more
+            frames = []
+            for future in ready:
+                try:
+                    frames.append(future.result())
+                except Exception as e:
+                    self._poll_error(fetches[future], e)
+            results.update(self._classify(frames))
+
+        for future, name in shared.items():
+            result = future.result()
+            if result is not None:
+                results[name] = result
+        return results
+
+    def sample_one(self, name):
+        """Captures and classifies one camera. Returns the new result or None."""
+        return self.sample([name]).get(name)
+
+    def get_all(self, max_age=None):
+        """
+        Returns {name: result or None}, re-capturing (concurrently) the cameras
+        with no result yet or one older than max_age seconds.
+        """
+        now = time.time()
+        latest = self._latest_results()
+        stale = [name for name in self.configs
+                 if latest.get(name) is None
+                 or (max_age is not None and now - latest[name]["captured_at"] > max_age)]
+        if stale:
+            latest.update(self.sample(stale))
+        return {name: latest.get(name) for name in self.configs}
+
+    def get(self, name, max_age=None):
+        """Like get_all for a single camera; raises KeyError for an unknown name."""
+        if name not in self.configs:
+            raise KeyError(name)
+        result = self._latest_results().get(name)
+        if result is None or (max_age is not None and time.time() - result["captured_at"] > max_age):
+            result = self.sample([name]).get(name)
+        return result
+
+    def _latest_results(self):
+        with self._lock:
+            latest = dict(self._latest)
+        for name, sampler in self.samplers.items():
+            latest[name] = sampler.latest()
+        return latest
+
+    def stats(self):
+        return {
+            "shared": sorted(self.samplers),
+            "cameras": {name: camera.stats() for name, camera in self.cameras.items()},
+            "change_detectors": {name: detector.stats() for name, detector in self.detectors.items()},
+            "interpreter_pools": {os.path.basename(model): pool.stats() for model, pool in self.pools.items()},
+        }
@@ -0,0 +1,109 @@
+"""
+Parallel image decoding for the dataset scripts.
+
+parallel_map() fans a picklable function out over a process pool in
+chunks and yields the results in input order. Only a few chunks are in
+flight at a time, so it can feed a consumer that streams (e.g. the TFLite
+converter's representative dataset) without holding everything in memory.
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from preprocessing import preprocess_file
+
+# Below this many items a process pool costs more than it saves.
+MIN_PARALLEL_ITEMS = 16
+
+
+class Progress:
+    """A one-line, rate-limited "label done/total (pct) rate" readout on stderr."""
+
+    def __init__(self, total, label="Processing", enabled=True, interval=0.2):
+        self.total = total
+        self.label = label
+        self.enabled = enabled and total > 0
+        self.interval = interval
+        self.done = 0
+        self._start = time.perf_counter()
+        self._last = 0.0
+
+    def update(self, n=1):
+        self.done += n
+        now = time.perf_counter()
+        if self.enabled and (now - self._last >= self.interval or self.done == self.total):
+            self._last = now
+            rate = self.done / max(now - self._start, 1e-9)
+            sys.stderr.write(f"\r{self.label}: {self.done}/{self.total} "
+                             f"({100 * self.done / self.total:.0f}%) {rate:.0f}/s")
+            sys.stderr.flush()
+
+    def close(self):
+        if self.enabled and self.done:
+            sys.stderr.write("\n")
+            sys.stderr.flush()
+
+
+def _run_chunk(fn, items, skip_errors):
+    results = []
+    for item in items:
+        try:
+            results.append(fn(item))
+        except Exception:
+            if not skip_errors:
+                raise
+            results.append(None)
+    return results
+
+
+def parallel_map(fn, items, workers=None, chunksize=None, progress=True, label="Processing", skip_errors=False):
+    """
+    Yields fn(item) for every item, in order, computed on a process pool.
+    With skip_errors an item whose fn raises yields None instead of
+    stopping the whole run. fn must be picklable (a module-level function
+    or a functools.partial of one).
+    """
+    items = list(items)
+    workers = workers or os.cpu_count() or 1
+    meter = Progress(len(items), label, enabled=progress)
+    try:
+        if workers <= 1 or len(items) < MIN_PARALLEL_ITEMS:
+            for item in items:
+                result = _run_chunk(fn, [item], skip_errors)[0]
+                meter.update()
+                yield result
+            return
+
+        chunksize = chunksize or max(1, min(64, len(items) // (workers * 4)))
+        chunks = [items[i:i + chunksize] for i in range(0, len(items), chunksize)]
+        max_in_flight = workers * 2
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            pending = []
+            next_chunk = 0
+            while pending or next_chunk < len(chunks):
+                while next_chunk < len(chunks) and len(pending) < max_in_flight:
+                    pending.append(pool.submit(_run_chunk, fn, chunks[next_chunk], skip_errors))
+                    next_chunk += 1
+                results = pending.pop(0).result()
+                meter.update(len(results))
+                yield from results
+    finally:
+        meter.close()
+
+
+def _preprocess_uint8(path, roi, mode):
+    return np.rint(preprocess_file(path, roi, mode) * 255.0).astype(np.uint8)
+
+
+def preprocess_files(paths, roi, mode, workers=None, progress=True, skip_errors=True):
+    """
+    Yields the preprocessed ROI of each image file as a uint8 (h, w) array
+    (None for files that fail to decode), in order. Divide by 255 for the
+    float model input.
+    """
+    return parallel_map(partial(_preprocess_uint8, roi=roi, mode=mode), paths, workers=workers,
+                        progress=progress, label="Preprocessing", skip_errors=skip_errors)
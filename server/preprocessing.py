@@ -0,0 +1,282 @@
+"""
+Shared ROI preprocessing for the server, training and verification scripts.
+
+Every mode has a vectorized NumPy implementation (preprocess_array) that is
+bit-exact with the code it replaces:
+
+- "box48" / "box96": grayscale, crop to the ROI, PIL BOX resize (gate.py,
+  train_tiny_cnn.py, test_model.py; predict_current_tiny.py used 96x96).
+- "bicubic48" / "bicubic96": same with PIL's default resampler (the old
+  convert_tiny_cnn.py and verify_tiny_cnn.py paths).
+- "esp32": the firmware's tjpg_callback, i.e. RGB565-derived gray mean-pooled
+  into a 64x64 grid with integer binning.
+
+Arrays may carry leading batch dimensions: (..., H, W) gray or (..., H, W, 3) RGB.
+"""
+import json
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+
+RESAMPLE_BOX = Image.BOX if hasattr(Image, 'BOX') else Image.BILINEAR
+
+# Scale denominators libjpeg can decode at directly (DCT-domain downscaling).
+JPEG_DRAFT_SCALES = (8, 4, 2, 1)
+
+# Fixed-point precision of Pillow's 8-bit resampler (Resample.c).
+_PRECISION_BITS = 32 - 8 - 2
+
+PreprocessMode = namedtuple("PreprocessMode", ["size", "method"])
+
+MODES = {
+    "box48": PreprocessMode((48, 48), "box"),
+    "box96": PreprocessMode((96, 96), "box"),
+    "bicubic48": PreprocessMode((48, 48), "bicubic"),
+    "bicubic96": PreprocessMode((96, 96), "bicubic"),
+    "esp32": PreprocessMode((64, 64), "esp32"),
+}
+
+DEFAULT_MODE = "box48"
+
+# === Load ROI from JSON ===
+def load_roi(filepath="roi.json"):
+    """Loads the region of interest (ROI) from a JSON file as (x, y, x1, y1)."""
+    with open(filepath, "r") as f:
+        roi_data = json.load(f)
+    return roi_data["x"], roi_data["y"], roi_data["x1"], roi_data["y1"]
+
+def get_mode(mode):
+    """Accepts a mode name or a PreprocessMode."""
+    if isinstance(mode, PreprocessMode):
+        return mode
+    try:
+        return MODES[mode]
+    except KeyError:
+        raise ValueError(f"Unknown preprocessing mode: {mode}")
+
+def mode_for_input_shape(shape, method="box"):
+    """Picks the mode matching a model input shape such as [1, 48, 48, 1]."""
+    height, width = int(shape[1]), int(shape[2])
+    return PreprocessMode((width, height), method)
+
+# === Grayscale ===
+def to_gray(rgb):
+    """RGB -> L exactly as PIL's convert('L') (ITU-R 601-2 luma, 16-bit fixed point)."""
+    rgb = np.asarray(rgb, dtype=np.uint32)
+    gray = rgb[..., 0] * 19595 + rgb[..., 1] * 38470 + rgb[..., 2] * 7471 + 0x8000
+    return (gray >> 16).astype(np.uint8)
+
+def esp32_gray(rgb):
+    """RGB -> RGB565 -> gray exactly as the firmware's tjpg_callback."""
+    rgb = np.asarray(rgb, dtype=np.int32)
+    # TJpgDec packs RGB565 by truncating the low bits of each channel.
+    r = ((rgb[..., 0] >> 3) * 255) // 31
+    g = ((rgb[..., 1] >> 2) * 255) // 63
+    b = ((rgb[..., 2] >> 3) * 255) // 31
+    # Same double-precision expression and truncating cast as the C code.
+    return (r * 0.299 + g * 0.587 + b * 0.114).astype(np.uint8)
+
+# === PIL-compatible resampling ===
+def _box_filter(x):
+    return ((x > -0.5) & (x <= 0.5)).astype(np.float64)
+
+def _bicubic_filter(x):
+    a = -0.5
+    x = np.abs(x)
+    return np.where(x < 1.0, ((a + 2.0) * x - (a + 3.0)) * x * x + 1,
+                    np.where(x < 2.0, (((x - 5) * x + 8) * x - 4) * a, 0.0))
+
+_FILTERS = {"box": (_box_filter, 0.5), "bicubic": (_bicubic_filter, 2.0)}
+_PIL_FILTERS = {"box": RESAMPLE_BOX, "bicubic": Image.BICUBIC}
+
+@lru_cache(maxsize=64)
+def _resample_coeffs(in_size, out_size, in0, in1, method):
+    """
+    Dense (out_size, in_size) matrix of the integer fixed-point weights
+    Pillow's precompute_coeffs/normalize_coeffs_8bpc produce. Stored as
+    float64 so BLAS does the dot products; every partial sum stays below 2**53
+    and is therefore exact.
+    """
+    filter_fn, filter_support = _FILTERS[method]
+    # Resample.c takes the box as C floats: (double)(in1 - in0) / outSize.
+    scale = float(np.float32(in1) - np.float32(in0)) / out_size
+    filterscale = max(scale, 1.0)
+    support = filter_support * filterscale
+    coeffs = np.zeros((out_size, in_size), dtype=np.float64)
+    for xx in range(out_size):
+        center = in0 + (xx + 0.5) * scale
+        xmin = max(int(center - support + 0.5), 0)
+        xmax = min(int(center + support + 0.5), in_size)
+        x = np.arange(xmin, xmax)
+        w = filter_fn((x - center + 0.5) * (1.0 / filterscale))
+        # Left-to-right sum like the C loop (np.sum's pairwise order can differ in the last bit).
+        total = np.cumsum(w)[-1] if len(w) else 0.0
+        if total != 0.0:
+            w = w / total
+        # C's (int)(w * 2**22 +/- 0.5): round half away from zero.
+        coeffs[xx, xmin:xmax] = np.trunc(w * (1 << _PRECISION_BITS) + np.where(w < 0, -0.5, 0.5))
+    return coeffs
+
+def _clip8(acc):
+    return np.clip(np.floor((acc + (1 << (_PRECISION_BITS - 1))) / (1 << _PRECISION_BITS)), 0, 255)
+
+def resize_gray(gray, size, box=None, method="box"):
+    """
+    Vectorized equivalent of Image.fromarray(gray).resize(size, method, box),
+    bit-exact for 8-bit grayscale (horizontal pass first, uint8 intermediate).
+    """
+    gray = np.asarray(gray)
+    in_h, in_w = gray.shape[-2:]
+    if box is None:
+        box = (0, 0, in_w, in_h)
+    out_w, out_h = size
+    # Resample.c receives the box as C floats.
+    x0, y0, x1, y1 = (float(np.float32(v)) for v in box)
+    out = gray.astype(np.float64)
+    if out_w != in_w or x0 or x1 != in_w:
+        out = _clip8(out @ _resample_coeffs(in_w, out_w, x0, x1, method).T)
+    if out_h != in_h or y0 or y1 != in_h:
+        out = _clip8(_resample_coeffs(in_h, out_h, y0, y1, method) @ out)
+    return out.astype(np.uint8)
+
+# === Firmware mean pooling ===
+@lru_cache(maxsize=16)
+def _esp32_bins(start, stop, roi_start, roi_len, grid):
+    """One-hot (len, grid) matrix mapping each pixel to (abs - ROI) * grid / ROI_LEN."""
+    target = ((np.arange(start, stop) - roi_start) * grid) // roi_len
+    return (target[:, None] == np.arange(grid)[None, :]).astype(np.float64)
+
+def esp32_pool(gray, roi, grid=64):
+    """
+    Mean-pools the ROI of a gray frame into a (grid, grid) float32 array in 0-1
+    exactly as the firmware does: uint16 sums, uint8 counts, integer average,
+    empty bins left at 0.
+    """
+    gray = np.asarray(gray)
+    frame_h, frame_w = gray.shape[-2:]
+    x, y, x1, y1 = roi
+    # Only pixels TJpgDec actually delivers (inside the frame) are accumulated.
+    cx0, cx1 = max(x, 0), min(x1, frame_w)
+    cy0, cy1 = max(y, 0), min(y1, frame_h)
+    bins_x = _esp32_bins(cx0, cx1, x, x1 - x, grid)
+    bins_y = _esp32_bins(cy0, cy1, y, y1 - y, grid)
+
+    region = gray[..., cy0:cy1, cx0:cx1].astype(np.float64)
+    sums = (bins_y.T @ region @ bins_x).astype(np.int64) % (1 << 16)
+    counts = np.outer(bins_y.sum(axis=0), bins_x.sum(axis=0)).astype(np.int64) % (1 << 8)
+
+    avg = np.zeros(sums.shape, dtype=np.int64)
+    np.floor_divide(sums, counts, out=avg, where=counts > 0)
+    avg = avg.astype(np.uint8)
+    return np.where(counts > 0, avg.astype(np.float32) / np.float32(255.0), np.float32(0.0))
+
+# === Entry points ===
+def preprocess_array(pixels, roi, mode=DEFAULT_MODE):
+    """
+    Preprocesses decoded pixels ((..., H, W) gray or (..., H, W, 3) RGB) into a
+    (..., h, w) float32 array in 0-1. The esp32 mode needs RGB input.
+    """
+    mode = get_mode(mode)
+    pixels = np.asarray(pixels)
+    rgb = pixels.ndim >= 3 and pixels.shape[-1] == 3
+    x, y, x1, y1 = roi
+
+    if mode.method == "esp32":
+        if not rgb:
+            raise ValueError("esp32 mode needs RGB pixels")
+        # Convert only the in-frame part of the ROI; esp32_pool() keeps the
+        # bin mapping relative to the full ROI.
+        frame_h, frame_w = pixels.shape[-3:-1]
+        cx0, cy0 = max(x, 0), max(y, 0)
+        cx1, cy1 = min(x1, frame_w), min(y1, frame_h)
+        gray = esp32_gray(pixels[..., cy0:cy1, cx0:cx1, :])
+        return esp32_pool(gray, (x - cx0, y - cy0, x1 - cx0, y1 - cy0), grid=mode.size[0])
+
+    if rgb:
+        pixels = pixels[..., y:y1, x:x1, :]
+        cropped = to_gray(pixels)
+    else:
+        cropped = pixels[..., y:y1, x:x1]
+    return resize_gray(cropped, mode.size, method=mode.method).astype(np.float32) / 255.0
+
+def preprocess(image: Image.Image, roi, mode=DEFAULT_MODE):
+    """
+    Preprocesses one PIL image into a (h, w) float32 array in 0-1. Gives the
+    same result as preprocess_array(); for a single frame the box/bicubic
+    modes go through Pillow's C resampler, which is faster than the dense
+    NumPy path.
+    """
+    mode = get_mode(mode)
+    if mode.method == "esp32":
+        return preprocess_array(np.asarray(image.convert('RGB')), roi, mode)
+
+    # Crop before converting: convert('L') is per-pixel, so the order does not matter.
+    img = image.crop(roi).convert('L')
+    img = img.resize(mode.size, resample=_PIL_FILTERS[mode.method])
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+def preprocess_file(path, roi, mode=DEFAULT_MODE):
+    """Opens an image file and preprocesses it; see preprocess()."""
+    with Image.open(path) as image:
+        return preprocess(image, roi, mode)
+
+# === Fast decode path ===
+def draft_scale(roi, target_size):
+    """
+    Largest JPEG draft scale at which the ROI still has at least target_size
+    pixels, so the BOX resize only ever downsamples.
+    """
+    x, y, x1, y1 = roi
+    roi_w, roi_h = x1 - x, y1 - y
+    for scale in JPEG_DRAFT_SCALES:
+        if roi_w / scale >= target_size[0] and roi_h / scale >= target_size[1]:
+            return scale
+    return 1
+
+def draft_for_roi(image: Image.Image, roi, target_size=(48, 48)):
+    """
+    Asks libjpeg to decode straight to grayscale at the largest scale that
+    still covers target_size over the ROI (Image.draft). Only takes effect
+    before the image is loaded. Returns the full-resolution (width, height).
+    """
+    width, height = image.size
+    scale = draft_scale(roi, target_size)
+    if image.format == 'JPEG' and scale > 1:
+        image.draft('L', (-(-width // scale), -(-height // scale)))
+    return width, height
+
+def fast_crop_and_preprocess(image: Image.Image, roi, target_size=(48, 48), full_size=None):
+    """
+    Fast path: decodes at reduced scale (draft_for_roi) and resamples only
+    the ROI box. Equivalent to the box modes of preprocess() up to
+    DCT-domain downscaling error; falls back to a full decode for non-JPEG
+    or already-loaded images. Pass full_size when the image was already
+    drafted by draft_for_roi.
+    """
+    if full_size is None:
+        full_size = draft_for_roi(image, roi, target_size)
+    img = _resize_roi(image, roi, full_size, target_size)
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+def roi_thumbnail(image: Image.Image, roi, size=(16, 16)):
+    """
+    Cheap uint8 grayscale thumbnail of the ROI for change detection: decodes
+    the JPEG at 1/8 scale and box-resizes the ROI. Drafts the image in place.
+    """
+    full_size = image.size
+    if image.format == 'JPEG':
+        image.draft('L', (-(-full_size[0] // 8), -(-full_size[1] // 8)))
+    return np.asarray(_resize_roi(image, roi, full_size, size), dtype=np.uint8)
+
+def _resize_roi(image, roi, full_size, size):
+    """Grayscale BOX resize of the ROI (given in full_size coordinates) of a possibly drafted image."""
+    width, height = full_size
+    img = image if image.mode == 'L' else image.convert('L')
+
+    sx = width / img.size[0]
+    sy = height / img.size[1]
+    x, y, x1, y1 = roi
+    box = (x / sx, y / sy, x1 / sx, y1 / sy)
+    return img.resize(size, resample=RESAMPLE_BOX, box=box)
@@ -15,31 +15,37 @@ else
     echo "Using system python: $PYTHON_CMD"
 fi
 
-# 1. Train Model
-echo ">>> Training Model..."
-$PYTHON_CMD train_tiny_cnn.py
-if [ $? -ne 0 ]; then
-    echo "❌ Training failed. Aborting."
-    exit 1
-fi
+# Incremental fine-tune by default; --full retrains from scratch
+# --int8 deploys a fully quantized model (see convert_tiny_cnn.py --help)
+# --float-io (with --int8) keeps float32 input/output around the int8 model
+# --force rebuilds stages even when their inputs are unchanged
+BUILD_ARGS=""
+for arg in "$@"; do
+    case $arg in
+        --full|--int8|--float-io|--force) BUILD_ARGS="$BUILD_ARGS $arg" ;;
+        *)
+            echo "❌ Unknown argument: $arg"
+            echo "Usage: $0 [--full] [--int8 [--float-io]] [--force]"
+            exit 1
+            ;;
+    esac
+done
 
-# 2. Convert Model (to TFLite and C Header)
-echo ">>> Converting Model..."
-$PYTHON_CMD convert_tiny_cnn.py
+# 1-3. Train, convert and write model_data.h for the server, esp32gate/ and tester/
+# (build_model.py skips stages whose inputs have not changed)
+echo ">>> Building Model..."
+$PYTHON_CMD build_model.py $BUILD_ARGS
 if [ $? -ne 0 ]; then
-    echo "❌ Conversion failed. Aborting."
+    echo "❌ Build failed or regressed. Not deploying."
     exit 1
 fi
 
-# 3. Deploy Header to ESP32 Project
-echo ">>> Deploying to ESP32..."
-if [ -d "../esp32gate" ]; then
-    cp model_data.h ../esp32gate/model_data.h
-    echo "✅ Copied model_data.h to ../esp32gate/"
-else
-    echo "⚠️ Warning: ../esp32gate directory not found. Skipping deployment to ESP32."
+# 4. Hot-reload a running gate server (it also notices the new file by itself)
+GATE_SERVER="${GATE_SERVER:-http://localhost:5001}"
+if reload_response=$(curl -s -X POST --max-time 60 -H "X-Admin-Token: ${GATE_ADMIN_TOKEN:-}" "$GATE_SERVER/admin/reload"); then
+    echo ">>> Gate server reload: $reload_response"
 fi
 
 echo "=== Pipeline Complete! ==="
 echo "New model is ready at: server/gate_detector_tiny.tflite"
-echo "New C header is ready at: esp32gate/model_data.h"
+echo "New C header is ready at: esp32gate/model_data.h and tester/model_data.h"
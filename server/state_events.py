@@ -0,0 +1,114 @@
+import collections
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Debouncer:
+    """
+    Port of updateHomeKitStatus() in esp32gate/DEV_DoorsWindows.h: the state
+    only flips after numcheck consecutive samples disagree with it, and any
+    sample that agrees resets the count. The first sample sets the state.
+    """
+
+    def __init__(self, numcheck=2):
+        self.numcheck = numcheck
+        self.state = None
+        self.num_diff_state = 0
+
+    def update(self, status):
+        """Feeds one sample; returns True if the debounced state changed."""
+        if self.state is None:
+            self.state = status
+            return True
+        if status != self.state:
+            self.num_diff_state += 1
+            if self.num_diff_state >= self.numcheck:
+                self.state = status
+                self.num_diff_state = 0
+                return True
+        else:
+            self.num_diff_state = 0
+        return False
+
+
+class StateTracker:
+    """
+    Debounces sampler results and keeps a short, numbered history of state
+    changes so any number of subscribers (SSE streams, long polls) can be fed
+    from one sampler. Thread-safe; listeners are called on the observing thread.
+    """
+
+    def __init__(self, numcheck=2, history=32):
+        self._debouncer = Debouncer(numcheck)
+        self._cond = threading.Condition()
+        self._events = collections.deque(maxlen=history)
+        self._last_id = 0
+        self._listeners = []
+        self.subscribers = 0
+
+    @property
+    def last_id(self):
+        with self._cond:
+            return self._last_id
+
+    def add_listener(self, fn):
+        self._listeners.append(fn)
+
+    @contextmanager
+    def subscription(self):
+        """Counts a connected subscriber for the duration of the with-block."""
+        with self._cond:
+            self.subscribers += 1
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    def resume_point(self, since):
+        """Maps a client's last seen id to ours; ids from before a restart start over."""
+        return 0 if since > self._last_id else since
+
+    def observe(self, result):
+        """
+        Feeds a sampler result {"status", "confidence", "captured_at"}.
+        Returns the new event if the debounced state changed, else None.
+        """
+        with self._cond:
+            previous = self._debouncer.state
+            if not self._debouncer.update(result["status"]):
+                return None
+            self._last_id += 1
+            event = {
+                "id": self._last_id,
+                "status": result["status"],
+                "previous": previous,
+                "confidence": result["confidence"],
+                "captured_at": result["captured_at"],
+                "changed_at": time.time(),
+            }
+            self._events.append(event)
+            self._cond.notify_all()
+        for fn in self._listeners:
+            fn(event)
+        return event
+
+    def events_since(self, since):
+        """
+        Events with id > since. A client that fell further behind than the
+        history gets the latest event only, which still carries the state.
+        """
+        with self._cond:
+            since = self.resume_point(since)
+            events = [e for e in self._events if e["id"] > since]
+            if events and events[0]["id"] > since + 1:
+                events = events[-1:]
+            return events
+
+    def wait(self, since, timeout=None):
+        """Blocks until there are events after since (or timeout) and returns them."""
+        with self._cond:
+            since = self.resume_point(since)
+            self._cond.wait_for(lambda: self._last_id > since, timeout=timeout)
+        return self.events_since(since)
@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from camera_client import CameraClient, CameraError
+from camera_simulator import CameraSimulator, FrameSequence, parse_sequence
+
+FRAMES = {"closed": [b"closed-1", b"closed-2"], "open": [b"open-1"]}
+
+
+@pytest.fixture
+def simulator():
+    sim = CameraSimulator(FRAMES, user="admin", password="secret",
+                          sequence=parse_sequence("closed:2,open:1")).start()
+    yield sim
+    sim.stop()
+
+
+def test_serves_sequence_with_basic_auth(simulator):
+    client = CameraClient(simulator.url + "?cmd=refresh", "admin", "secret", retries=0)
+    bodies = [client.fetch() for _ in range(4)]
+    assert bodies == [b"closed-1", b"closed-2", b"open-1", b"closed-1"]
+    assert simulator.stats()["served"] == 4
+    client.close()
+
+
+def test_rejects_bad_credentials(simulator):
+    client = CameraClient(simulator.url, "admin", "wrong", retries=0)
+    with pytest.raises(CameraError):
+        client.fetch()
+    assert simulator.stats()["unauthorized"] == 1
+    client.close()
+
+
+def test_timed_sequence_steps():
+    seq = FrameSequence(parse_sequence("open:0.05s,closed:2"))
+    assert seq.next_label() == "open"
+    time.sleep(0.06)
+    assert [seq.next_label() for _ in range(3)] == ["closed", "closed", "open"]
+    with pytest.raises(ValueError):
+        parse_sequence("open:0")
+
+
+def test_retries_server_errors_but_not_client_errors():
+    sim = CameraSimulator(FRAMES, user="admin", password="secret", error_rate=1.0).start()
+    try:
+        client = CameraClient(sim.url, "admin", "secret", retries=2, backoff=0)
+        with pytest.raises(CameraError) as e:
+            client.fetch()
+        assert e.value.status == 503
+        assert sim.stats()["errors"] == 3 and client.stats()["retries"] == 2
+        client.close()
+
+        client = CameraClient(sim.url, "admin", "wrong", retries=2, backoff=0)
+        with pytest.raises(CameraError):
+            client.fetch()
+        assert sim.stats()["unauthorized"] == 1 and client.stats()["retries"] == 0
+        client.close()
+    finally:
+        sim.stop()
+
+
+def test_read_timeout_bounds_a_slow_drip_body():
+    frames = {"closed": [b"x" * 4096]}
+    sim = CameraSimulator(frames, drip_rate=1024, drip_chunk=256).start()
+    try:
+        client = CameraClient(sim.url, "admin", "", read_timeout=0.5, retries=1, backoff=0)
+        start = time.monotonic()
+        with pytest.raises(CameraError):
+            client.fetch()
+        # Two attempts of 0.5s each, although every single read arrives well within it.
+        assert time.monotonic() - start < 1.5
+        assert client.stats()["retries"] == 1
+        client.close()
+    finally:
+        sim.stop()
@@ -0,0 +1,40 @@
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from capture_writer import CaptureWriter, capture_filename
+
+
+def files_under(root):
+    return sorted(os.path.relpath(os.path.join(d, f), root) for d, _, names in os.walk(root) for f in names)
+
+
+def test_same_second_captures_get_distinct_names():
+    now = datetime(2026, 1, 2, 3, 4, 5, 0)
+    # Same timestamp, different frames; and same frame a microsecond apart
+    assert capture_filename(b"frame-1", now) != capture_filename(b"frame-2", now)
+    assert capture_filename(b"frame-1", now) != capture_filename(b"frame-1", now.replace(microsecond=1))
+
+
+def test_flush_writes_under_label_without_part_files(tmp_path):
+    root = str(tmp_path / "data" / "train")
+    writer = CaptureWriter(root=root, fsync_batch=4)
+    paths = [writer.submit(f"jpeg-{i}".encode(), "open" if i % 2 else "closed") for i in range(10)]
+    writer.flush()
+    assert len(set(paths)) == 10
+    for i, path in enumerate(paths):
+        assert os.path.dirname(path) == os.path.join(root, "open" if i % 2 else "closed")
+        with open(path, "rb") as f:
+            assert f.read() == f"jpeg-{i}".encode()
+    assert not [f for f in files_under(root) if f.endswith(".part")]
+    assert writer.stats()["written"] == 10
+    writer.close()
+
+
+def test_close_writes_out_the_queue(tmp_path):
+    root = str(tmp_path / "train")
+    writer = CaptureWriter(root=root, fsync_batch=100, fsync_interval=60)
+    path = writer.submit(b"last frame", "low_confidence")
+    writer.close()
+    assert files_under(root) == [os.path.join("low_confidence", os.path.basename(path))]
@@ -0,0 +1,51 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from change_detector import ChangeDetector
+
+FRAME = np.full((16, 16), 100, dtype=np.uint8)
+
+
+def scored(detector, thumbnail, result=("closed", 0.9)):
+    detector.update(thumbnail, result)
+    return result
+
+
+def test_near_identical_frame_served_from_cache():
+    detector = ChangeDetector(threshold=2.0, force_every=12)
+    assert detector.cached(FRAME) is None  # nothing scored yet
+    result = scored(detector, FRAME)
+    noisy = FRAME.copy()
+    noisy[0, :8] += 3  # sensor noise in a few pixels
+    assert detector.cached(noisy) == result
+    assert detector.stats()["skipped"] == 1
+
+
+def test_changed_frame_is_rescored():
+    detector = ChangeDetector(threshold=2.0, force_every=12)
+    scored(detector, FRAME)
+    opened = FRAME.copy()
+    opened[4:12, :] = 200  # the gate moved across half the ROI
+    assert detector.cached(opened) is None
+    assert detector.last_difference > 2.0
+    # After reset (e.g. a model reload) nothing is served from the cache.
+    scored(detector, opened, ("open", 0.8))
+    detector.reset()
+    assert detector.cached(opened) is None
+
+
+def test_forced_rescore_after_count():
+    detector = ChangeDetector(threshold=2.0, force_every=3)
+    scored(detector, FRAME)
+    assert [detector.cached(FRAME) is not None for _ in range(3)] == [True, True, False]
+    scored(detector, FRAME)
+    assert detector.cached(FRAME) is not None
+
+
+def test_zero_threshold_disables_skipping():
+    detector = ChangeDetector(threshold=0, force_every=12)
+    scored(detector, FRAME)
+    assert detector.cached(FRAME) is None
@@ -0,0 +1,31 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dataset_store import stratified_split
+
+
+def fake_dataset(labels):
+    return SimpleNamespace(labels=np.array(labels), hashes=[f"{i:040x}" for i in range(len(labels))])
+
+
+def test_split_is_stratified_and_deterministic():
+    ds = fake_dataset([0] * 50 + [1] * 10)
+    train, val = stratified_split(ds, 0.2)
+    assert np.bincount(ds.labels[val]).tolist() == [10, 2]
+    assert sorted(np.concatenate([train, val]).tolist()) == list(range(60))
+    again_train, again_val = stratified_split(ds, 0.2)
+    assert np.array_equal(val, again_val) and np.array_equal(train, again_train)
+    assert not np.array_equal(val, stratified_split(ds, 0.2, seed=1)[1])
+
+
+def test_split_follows_content_not_position():
+    ds = fake_dataset([0] * 40)
+    val_hashes = {ds.hashes[i] for i in stratified_split(ds, 0.25)[1]}
+    # Same images in another order (e.g. renamed) land on the same side.
+    order = np.random.default_rng(0).permutation(40)
+    shuffled = SimpleNamespace(labels=ds.labels[order], hashes=[ds.hashes[i] for i in order])
+    assert {shuffled.hashes[i] for i in stratified_split(shuffled, 0.25)[1]} == val_hashes
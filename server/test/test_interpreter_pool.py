@@ -0,0 +1,45 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import interpreter_pool
+from interpreter_pool import InterpreterPool, quantize_input, dequantize_output
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gate_detector_tiny.tflite")
+
+INT8 = {"dtype": np.int8, "quantization": (1 / 255.0, -128)}
+FLOAT = {"dtype": np.float32, "quantization": (0.0, 0)}
+
+
+def test_quantize_roundtrip_int8():
+    x = np.array([[0.0, 0.5, 1.0]], dtype=np.float32)
+    q = quantize_input(x, INT8)
+    assert q.dtype == np.int8
+    assert q[0, 0] == -128 and q[0, 2] == 127
+    assert np.allclose(dequantize_output(q, INT8), x, atol=0.5 / 255.0)
+    # Out-of-range input saturates instead of wrapping around.
+    assert quantize_input(np.array([1.5, -0.5], dtype=np.float32), INT8).tolist() == [127, -128]
+
+
+def test_float_and_prequantized_pass_through():
+    x = np.array([0.25], dtype=np.float32)
+    assert quantize_input(x, FLOAT) is x
+    assert dequantize_output(x, FLOAT) is x
+    # Already-integer input (e.g. warm_up's zeros) is not quantized twice.
+    zeros = np.zeros(3, dtype=np.int8)
+    assert quantize_input(zeros, INT8) is zeros
+
+
+def test_pool_needs_an_interpreter():
+    with pytest.raises(ValueError):
+        InterpreterPool(MODEL_PATH, size=0)
+
+
+def test_stats_report_xnnpack_in_effect(monkeypatch):
+    assert InterpreterPool(MODEL_PATH, size=1, use_xnnpack=False).stats()["xnnpack"] is False
+    # A backend without OpResolverType cannot turn XNNPACK off.
+    monkeypatch.setattr(interpreter_pool, "OpResolverType", None)
+    assert InterpreterPool(MODEL_PATH, size=1, use_xnnpack=False).stats()["xnnpack"] is True
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from metrics import Registry
+
+
+def test_histogram_inf_bucket_equals_count():
+    registry = Registry()
+    histogram = registry.histogram("fetch_seconds", "Fetch time.", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="camera")
+    histogram.observe(0.5, stage="camera")
+    histogram.observe(30.0, stage="camera")
+    lines = registry.render().splitlines()
+    assert lines == [
+        "# HELP fetch_seconds Fetch time.",
+        "# TYPE fetch_seconds histogram",
+        'fetch_seconds_bucket{stage="camera",le="0.1"} 1',
+        'fetch_seconds_bucket{stage="camera",le="1.0"} 2',
+        'fetch_seconds_bucket{stage="camera",le="+Inf"} 3',
+        'fetch_seconds_sum{stage="camera"} 30.55',
+        'fetch_seconds_count{stage="camera"} 3',
+    ]
+
+
+def test_histogram_time_observes_on_error():
+    registry = Registry()
+    histogram = registry.histogram("work_seconds", "Work time.")
+    with pytest.raises(RuntimeError):
+        with histogram.time():
+            raise RuntimeError("boom")
+    assert 'work_seconds_count 1' in registry.render().splitlines()
+
+
+def test_counter_and_callback():
+    registry = Registry()
+    counter = registry.counter("errors_total", "Errors.", ["kind"])
+    counter.inc(kind="camera")
+    counter.inc(2, kind="camera")
+    assert counter.value(kind="camera") == 3
+    with pytest.raises(ValueError):
+        counter.inc(stage="camera")
+    registry.callback("subscribers", "Subscribers.", lambda: 4)
+    registry.callback("broken", "Raises.", lambda: 1 / 0)
+    assert registry.render().splitlines() == [
+        "# HELP errors_total Errors.",
+        "# TYPE errors_total counter",
+        'errors_total{kind="camera"} 3',
+        "# HELP subscribers Subscribers.",
+        "# TYPE subscribers gauge",
+        "subscribers 4",
+    ]
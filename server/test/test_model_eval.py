@@ -0,0 +1,24 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_eval import calibration, confusion_matrix
+
+
+def test_confusion_matrix_rows_are_true_class():
+    labels = np.array([0, 0, 1, 1, 1])
+    predictions = np.array([0, 1, 1, 1, 0])
+    assert confusion_matrix(labels, predictions, 2).tolist() == [[1, 1], [1, 2]]
+
+
+def test_calibration_bins_and_error():
+    confidence = np.array([0.55, 0.58, 0.95, 1.0])
+    correct = np.array([True, False, True, True])
+    histogram, ece = calibration(confidence, correct, bins=10)
+    counts = {tuple(b["range"]): b["count"] for b in histogram}
+    assert counts[(0.5, 0.6)] == 2 and counts[(0.9, 1.0)] == 2
+    assert sum(counts.values()) == 4
+    # |0.5 - 0.565| * 2 + |1.0 - 0.975| * 2, over 4 images
+    assert abs(ece - (0.065 * 2 + 0.025 * 2) / 4) < 1e-3
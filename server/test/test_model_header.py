@@ -0,0 +1,41 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_header import deploy_headers, render_c_header, write_if_changed
+
+
+def test_header_format():
+    header = render_c_header(bytes(range(14))).decode()
+    assert header == (
+        "#ifndef MODEL_DATA_H\n#define MODEL_DATA_H\n\n"
+        "const unsigned char gate_detector_model[] = {\n"
+        "  0x00, 0x01, 0x02, 0x03, 0x04, 0x05, 0x06, 0x07, 0x08, 0x09, 0x0a, 0x0b, \n"
+        "  0x0c, 0x0d\n};\n"
+        "const int gate_detector_model_len = 14;\n"
+        "\n#endif // MODEL_DATA_H\n")
+
+
+def test_unchanged_copies_are_not_rewritten(tmp_path):
+    paths = [str(tmp_path / "model_data.h"), str(tmp_path / "sketch" / "model_data.h")]
+    assert deploy_headers(b"\x01\x02", paths) == {paths[0]: "written", paths[1]: "skipped"}
+    mtime = os.stat(paths[0]).st_mtime_ns
+    assert write_if_changed(paths[0], render_c_header(b"\x01\x02")) == "unchanged"
+    assert os.stat(paths[0]).st_mtime_ns == mtime
+    assert deploy_headers(b"\x01\x03", paths[:1]) == {paths[0]: "written"}
+
+
+def test_sketches_only_get_float_input_models(tmp_path, monkeypatch):
+    import model_header
+    server_path, sketch_path = str(tmp_path / "model_data.h"), str(tmp_path / "model_data_sketch.h")
+    with open(os.path.join(os.path.dirname(model_header.__file__), "gate_detector_tiny.tflite"), "rb") as f:
+        model = f.read()
+    assert model_header.input_dtype(model) == "float32"
+    assert deploy_headers(model, [server_path, sketch_path], [sketch_path]) == {
+        server_path: "written", sketch_path: "written"}
+
+    monkeypatch.setattr(model_header, "input_dtype", lambda model: "int8")
+    assert deploy_headers(model + b"\x00", [server_path, sketch_path], [sketch_path]) == {
+        server_path: "written", sketch_path: "refused"}
+    with open(sketch_path, "rb") as f:
+        assert f.read() == render_c_header(model)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_reload import ModelReloader
+
+
+def test_canary_exception_keeps_old_pool(tmp_path):
+    model = tmp_path / "model.tflite"
+    model.write_bytes(b"v1")
+    swapped = []
+
+    def check(pool):
+        if pool == b"v2":
+            raise OSError("corrupt canary image")
+        return True, {"images": 0}
+
+    reloader = ModelReloader(str(model), lambda content: content, check, swapped.append)
+    assert reloader.load()["result"] == "loaded"
+    model.write_bytes(b"v2")
+    result = reloader.load()
+    assert result["result"] == "error" and "corrupt canary image" in result["message"]
+    assert reloader.pool == b"v1" and swapped == [b"v1"]
@@ -0,0 +1,127 @@
+import io
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+import pytest
+from PIL import Image
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+from camera_simulator import CameraSimulator
+from interpreter_pool import InterpreterPool
+from multi_camera import CameraGroup, load_camera_config
+
+MODEL = os.path.join(SERVER_DIR, "gate_detector_tiny.tflite")
+
+
+def jpeg(seed):
+    pixels = np.random.default_rng(seed).integers(0, 255, (120, 160, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def simulator():
+    sim = CameraSimulator({"all": [jpeg(0), jpeg(1)]}, user=None).start()
+    yield sim
+    sim.stop()
+
+
+def make_group(tmp_path, simulator, names=("front",), **kwargs):
+    shutil.copy(MODEL, tmp_path / "model.tflite")
+    config = {"defaults": {"model": "model.tflite", "interval": 0,
+                           "roi": {"x": 10, "y": 10, "x1": 150, "y1": 110}},
+              "cameras": [{"name": name, "url": simulator.url} for name in names]}
+    (tmp_path / "cameras.json").write_text(json.dumps(config))
+    return CameraGroup(load_camera_config(str(tmp_path / "cameras.json")), pool_size=1,
+                       camera_options={"retries": 0}, **kwargs)
+
+
+def test_reload_swaps_camera_pools(tmp_path, simulator):
+    group = make_group(tmp_path, simulator)
+    model = str(tmp_path / "model.tflite")
+    old_pool = group.pools[model]
+    assert group.reload()["model.tflite"]["result"] == "unchanged"
+    assert group.reload(force=True)["model.tflite"]["result"] == "loaded"
+    new_pool = group.pools[model]
+    assert new_pool is not old_pool
+    old_checkouts, new_checkouts = old_pool.stats()["checkouts"], new_pool.stats()["checkouts"]
+    assert group.sample_one("front")["status"] in ("closed", "open")
+    assert old_pool.stats()["checkouts"] == old_checkouts
+    assert new_pool.stats()["checkouts"] == new_checkouts + 1
+    group.stop()
+
+
+def test_shared_pool_follows_owner(tmp_path, simulator):
+    shared = InterpreterPool(MODEL, size=1)
+    model = str(tmp_path / "model.tflite")
+    group = make_group(tmp_path, simulator, pools={model: shared})
+    assert group.reloaders == {} and group.pools[model] is shared
+    # What gate.py's swap_interpreter_pool does after a successful reload
+    replacement = InterpreterPool(MODEL, size=1)
+    group.replace_pool(model, replacement)
+    assert group.pools[model] is replacement
+    group.stop()
+
+
+class FakeSampler:
+    def __init__(self):
+        self.result = None
+        self.samples = 0
+
+    def latest(self):
+        return self.result
+
+    def sample(self):
+        self.samples += 1
+        self.result = {"status": "open", "confidence": 0.9, "captured_at": 0.0}
+        return self.result
+
+
+def test_builtin_camera_is_served_by_its_sampler(tmp_path, simulator):
+    builtin = FakeSampler()
+    group = make_group(tmp_path, simulator, names=("gate", "side"), samplers={"gate": builtin})
+    assert list(group.cameras) == ["side"]
+    results = group.get_all()
+    assert results["gate"]["status"] == "open" and results["side"] is not None
+    assert builtin.samples == 1 and simulator.stats()["requests"] == 1
+    # Served from the sampler's cache, not polled again
+    assert group.get("gate") is builtin.result and builtin.samples == 1
+    group.stop()
+
+
+def test_frames_from_several_cameras_share_a_batch(tmp_path):
+    # Different latencies: without the shared tick and batch window these would be scored one at a time.
+    sim = CameraSimulator({"all": [jpeg(0), jpeg(1), jpeg(2)]}, user=None, latency=0.01, jitter=0.02).start()
+    try:
+        group = make_group(tmp_path, sim, names=("a", "b", "c"), change_threshold=0, batch_window=0.5)
+        pool = group.pools[str(tmp_path / "model.tflite")]
+        checkouts = pool.stats()["checkouts"]
+        results = group.sample()
+        assert sorted(results) == ["a", "b", "c"]
+        assert pool.stats()["checkouts"] == checkouts + 1
+        group.stop()
+    finally:
+        sim.stop()
+
+
+def test_unchanged_frame_reuses_prediction(tmp_path):
+    sim = CameraSimulator({"all": [jpeg(0)]}, user=None).start()
+    try:
+        group = make_group(tmp_path, sim, force_every=2)
+        pool = group.pools[str(tmp_path / "model.tflite")]
+        first = group.sample_one("front")
+        checkouts = pool.stats()["checkouts"]
+        second = group.sample_one("front")
+        assert pool.stats()["checkouts"] == checkouts
+        assert second["status"] == first["status"] and second["captured_at"] > first["captured_at"]
+        group.sample_one("front")  # every 2nd frame is rescored anyway
+        assert pool.stats()["checkouts"] == checkouts + 1
+        assert group.stats()["change_detectors"]["front"]["skipped"] == 1
+        group.stop()
+    finally:
+        sim.stop()
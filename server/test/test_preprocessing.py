@@ -0,0 +1,126 @@
+import glob
+import io
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+import preprocessing as pp
+
+ROI = pp.load_roi(os.path.join(SERVER_DIR, "roi.json"))
+TRAIN_IMAGES = sorted(glob.glob(os.path.join(SERVER_DIR, "..", "data", "train", "*", "*.jpg")))
+
+
+def pil_reference(image, roi, size, resample):
+    """The pipeline the scripts used before: convert, crop, resize."""
+    img = image.convert('L').crop(roi).resize(size, resample=resample)
+    return np.asarray(img, dtype=np.float32) / 255.0
+
+
+def firmware_reference(rgb, roi, grid=64):
+    """Line-by-line port of tjpg_callback + the averaging loop in performInference()."""
+    x0, y0, x1, y1 = roi
+    roi_w, roi_h = x1 - x0, y1 - y0
+    sums = [0] * (grid * grid)
+    counts = [0] * (grid * grid)
+    height, width = rgb.shape[:2]
+    for abs_y in range(height):
+        for abs_x in range(width):
+            r8, g8, b8 = (int(v) for v in rgb[abs_y, abs_x])
+            pixel = ((r8 & 0xF8) << 8) | ((g8 & 0xFC) << 3) | (b8 >> 3)
+            r = (pixel >> 11) & 0x1F
+            g = (pixel >> 5) & 0x3F
+            b = pixel & 0x1F
+            gray = int((r * 255 // 31) * 0.299 + (g * 255 // 63) * 0.587 + (b * 255 // 31) * 0.114)
+            if x0 <= abs_x < x1 and y0 <= abs_y < y1:
+                idx = ((abs_y - y0) * grid // roi_h) * grid + (abs_x - x0) * grid // roi_w
+                sums[idx] = (sums[idx] + gray) & 0xFFFF
+                counts[idx] = (counts[idx] + 1) & 0xFF
+    out = np.zeros(grid * grid, dtype=np.float32)
+    for i in range(grid * grid):
+        if counts[i] > 0:
+            out[i] = np.float32(sums[i] // counts[i] & 0xFF) / np.float32(255.0)
+    return out.reshape(grid, grid)
+
+
+def test_box48_matches_pil_on_training_images():
+    assert TRAIN_IMAGES
+    for path in TRAIN_IMAGES:
+        with Image.open(path) as image:
+            ref = pil_reference(image, ROI, (48, 48), Image.BOX)
+            rgb = np.asarray(image.convert('RGB'))
+            gray = np.asarray(image.convert('L'))
+            assert np.array_equal(pp.preprocess(image, ROI, "box48"), ref)
+        assert np.array_equal(pp.preprocess_array(rgb, ROI, "box48"), ref)
+        assert np.array_equal(pp.preprocess_array(gray, ROI, "box48"), ref)
+
+
+def test_bicubic_mode_matches_pil_default_resize():
+    with Image.open(TRAIN_IMAGES[0]) as image:
+        ref = np.asarray(image.convert('L').crop(ROI).resize((96, 96)), dtype=np.float32) / 255.0
+        rgb = np.asarray(image.convert('RGB'))
+    assert np.array_equal(pp.preprocess_array(rgb, ROI, "bicubic96"), ref)
+
+
+def test_resize_gray_is_bit_exact_with_pil():
+    rng = np.random.default_rng(0)
+    for i in range(200):
+        h, w = rng.integers(8, 200, size=2)
+        out_w, out_h = (int(v) for v in rng.integers(1, 100, size=2))
+        gray = rng.integers(0, 256, size=(h, w), dtype=np.uint8)
+        box = None
+        if i % 2:
+            bx, by = rng.uniform(0, w / 2), rng.uniform(0, h / 2)
+            box = (bx, by, rng.uniform(bx + 1, w), rng.uniform(by + 1, h))
+        for method, resample in (("box", Image.BOX), ("bicubic", Image.BICUBIC)):
+            ref = np.asarray(Image.fromarray(gray).resize((out_w, out_h), resample=resample, box=box))
+            assert np.array_equal(pp.resize_gray(gray, (out_w, out_h), box=box, method=method), ref)
+
+
+def test_to_gray_matches_pil_convert():
+    rgb = np.random.default_rng(1).integers(0, 256, size=(64, 80, 3), dtype=np.uint8)
+    assert np.array_equal(pp.to_gray(rgb), np.asarray(Image.fromarray(rgb).convert('L')))
+
+
+def test_esp32_mode_matches_firmware_port():
+    rng = np.random.default_rng(2)
+    rgb = rng.integers(0, 256, size=(40, 90, 3), dtype=np.uint8)
+    # Small grid, an ROI that does not divide evenly and one that runs off the frame.
+    for roi in ((7, 3, 80, 31), (50, 20, 120, 60)):
+        ref = firmware_reference(rgb, roi, grid=16)
+        out = pp.preprocess_array(rgb, roi, pp.PreprocessMode((16, 16), "esp32"))
+        assert out.dtype == np.float32
+        assert np.array_equal(out, ref)
+
+
+def test_esp32_mode_on_real_frame():
+    with Image.open(TRAIN_IMAGES[0]) as image:
+        rgb = np.asarray(image.convert('RGB'))
+        out = pp.preprocess(image, ROI, "esp32")
+    x0, y0, x1, y1 = ROI
+    # Only the ROI rows/columns influence the result; keep the Python port quick.
+    crop = rgb[y0:y1, x0:x1]
+    assert np.array_equal(out, firmware_reference(crop, (0, 0, x1 - x0, y1 - y0)))
+
+
+def test_batched_input_matches_single():
+    rng = np.random.default_rng(3)
+    batch = rng.integers(0, 256, size=(5, 400, 700, 3), dtype=np.uint8)
+    for mode in ("box48", "esp32"):
+        out = pp.preprocess_array(batch, ROI, mode)
+        assert out.shape == (5,) + pp.MODES[mode].size[::-1]
+        for i in range(len(batch)):
+            assert np.array_equal(out[i], pp.preprocess_array(batch[i], ROI, mode))
+
+
+def test_fast_decode_stays_close_to_reference():
+    for path in TRAIN_IMAGES:
+        with open(path, "rb") as f:
+            data = f.read()
+        ref = pp.preprocess(Image.open(io.BytesIO(data)), ROI, "box48")
+        fast = pp.fast_crop_and_preprocess(Image.open(io.BytesIO(data)), ROI, (48, 48))
+        assert fast.shape == ref.shape
+        assert np.abs(fast - ref).mean() * 255.0 < 8.0
@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def run_concurrently(n, target):
+    threads = [threading.Thread(target=target) for _ in range(n)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return "frame"
+
+    threads = run_concurrently(8, lambda: results.append(flight.do("camera", fetch)))
+    while flight.stats()["calls"] < 8:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and results == ["frame"] * 8
+    assert flight.stats() == {"calls": 8, "executed": 1, "coalesced": 7, "in_flight": 0}
+
+
+def test_exception_reaches_every_waiter_and_clears_key():
+    flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def fetch():
+        release.wait(5)
+        raise OSError("camera down")
+
+    def call():
+        try:
+            flight.do("camera", fetch)
+        except OSError as e:
+            errors.append(str(e))
+
+    threads = run_concurrently(4, call)
+    while flight.stats()["calls"] < 4:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+    assert errors == ["camera down"] * 4
+    assert flight.stats()["in_flight"] == 0
+    assert flight.do("camera", lambda: "recovered") == "recovered"
+
+
+def test_async_shares_call_and_survives_a_cancelled_waiter():
+    async def main():
+        flight = AsyncSingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await release.wait()
+            return "frame"
+
+        waiters = [asyncio.ensure_future(flight.do("camera", fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        # Cancelling one waiter (here the one that started the call) must not
+        # cancel the shared call for the others.
+        waiters[0].cancel()
+        await asyncio.sleep(0)
+        release.set()
+        assert await asyncio.gather(*waiters[1:]) == ["frame", "frame"]
+        with pytest.raises(asyncio.CancelledError):
+            await waiters[0]
+        assert len(calls) == 1 and flight.stats()["coalesced"] == 2 and flight.stats()["in_flight"] == 0
+
+        async def fail():
+            raise OSError("camera down")
+
+        results = await asyncio.gather(flight.do("camera", fail), flight.do("camera", fail), return_exceptions=True)
+        assert [str(r) for r in results] == ["camera down"] * 2
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from state_events import Debouncer, StateTracker
+
+
+def sample(status):
+    return {"status": status, "confidence": 0.9, "captured_at": 0.0}
+
+
+def test_debouncer_matches_firmware():
+    """NUMCHECK=2: a flip needs two consecutive disagreeing samples."""
+    d = Debouncer(numcheck=2)
+    seq = ["closed", "open", "closed", "open", "open", "open", "closed", "closed"]
+    changes = [d.update(s) for s in seq]
+    assert changes == [True, False, False, False, True, False, False, True]
+    assert d.state == "closed"
+
+
+def test_tracker_history_and_resume():
+    t = StateTracker(numcheck=1, history=2)
+    for status in ["closed", "open", "closed"]:
+        t.observe(sample(status))
+    assert [e["id"] for e in t.events_since(1)] == [2, 3]
+    # Fell out of the history: only the latest state is replayed.
+    assert [e["id"] for e in t.events_since(0)] == [3]
+    # Id from before a restart.
+    assert [e["id"] for e in t.events_since(42)] == [3]
+    assert t.events_since(3) == []
+
+
+def test_tracker_wait_wakes_on_change():
+    t = StateTracker(numcheck=1)
+    timer = threading.Timer(0.05, t.observe, args=(sample("open"),))
+    timer.start()
+    events = t.wait(0, timeout=5)
+    assert [e["status"] for e in events] == ["open"]
+    assert t.wait(1, timeout=0.01) == []
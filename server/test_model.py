@@ -1,6 +1,4 @@
 import argparse
-import io
-import json
 import numpy as np
 try:
     import tensorflow as tf
@@ -15,8 +13,8 @@ except ImportError:
         import sys
         sys.exit(1)
 from PIL import Image
-import urllib.request
-import base64
+from camera_client import CameraClient
+from preprocessing import load_roi, preprocess, PreprocessMode
 import os
 import sys
 
@@ -27,47 +25,21 @@ GATE_URL = 'http://192.168.50.82/ISAPI/ContentMgmt/StreamingProxy/channels/801/p
 GATE_USER = 'admin'
 GATE_PASSWORD = 'pccw1234'
 
-def load_roi(filepath=ROI_PATH):
-    try:
-        with open(filepath, "r") as f:
-            roi_data = json.load(f)
-        return roi_data["x"], roi_data["y"], roi_data["x1"], roi_data["y1"]
-    except Exception as e:
-        print(f"Error loading ROI: {e}")
-        return 0, 0, 640, 480
-
-ROI = load_roi()
+ROI = load_roi(ROI_PATH)
 
 def get_camera_image():
     print(f"Fetching image from {GATE_URL}...")
-    auth_str = f'{GATE_USER}:{GATE_PASSWORD}'.encode('ascii')
-    auth_b64 = base64.b64encode(auth_str).decode('ascii')
-    headers = {'Authorization': 'Basic ' + auth_b64}
-    
     try:
-        req = urllib.request.Request(GATE_URL, headers=headers)
-        with urllib.request.urlopen(req, timeout=5) as response:
-            return Image.open(io.BytesIO(response.read()))
+        return CameraClient(GATE_URL, GATE_USER, GATE_PASSWORD).fetch_image()
     except Exception as e:
         print(f"Error fetching camera image: {e}")
         return None
 
 def preprocess_image(image, target_size=(48, 48)):
-    # Convert to grayscale
-    img = image.convert('L')
-    
-    # Crop
-    x, y, x1, y1 = ROI
+    # Grayscale, crop, BOX resize, normalize
     print(f"Cropping to ROI: {ROI}")
-    img = img.crop((x, y, x1, y1))
-    
-    # Resize
-    resample_filter = Image.BOX if hasattr(Image, 'BOX') else Image.BILINEAR
-    img = img.resize(target_size, resample=resample_filter)
-    
-    # Normalize
-    img_array = np.array(img).astype('float32') / 255.0
-    return img_array.reshape(1, 48, 48, 1)
+    img_array = preprocess(image, ROI, PreprocessMode(target_size, "box"))
+    return img_array.reshape(1, target_size[1], target_size[0], 1)
 
 def run_inference(image):
     if not os.path.exists(MODEL_PATH):
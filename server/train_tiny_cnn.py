@@ -1,68 +1,34 @@
 import os
-import json
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras import layers, models
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
-from PIL import Image
+from preprocessing import load_roi
+from dataset_store import open_dataset, stratified_split
+from training_data import make_dataset, write_manifest
 
 # === Load ROI from JSON ===
-def load_roi(filepath="roi.json"):
-    with open(filepath, "r") as f:
-        roi_data = json.load(f)
-    return roi_data["x"], roi_data["y"], roi_data["x1"], roi_data["y1"]
-
 ROI = load_roi()
 
-def crop_and_preprocess(img_path, target_size=(48, 48)):
-    img = Image.open(img_path).convert('L') # Convert to Grayscale
-    x, y, x1, y1 = ROI
-    img = img.crop((x, y, x1, y1))
-    # Use Image.BOX to match ESP32 averaging logic
-    resample_filter = Image.BOX if hasattr(Image, 'BOX') else Image.BILINEAR
-    img = img.resize(target_size, resample=resample_filter)
-    return np.array(img).astype('float32') / 255.0
-
-def load_dataset(dataset_path):
-    x_data = []
-    y_labels = []
-    classes = ['closed', 'open']
-    
-    for label, class_name in enumerate(classes):
-        # The data is in data/train/closed and data/train/open
-        class_dir = os.path.join(dataset_path, 'train', class_name)
-        if not os.path.exists(class_dir):
-            print(f"Warning: {class_dir} not found")
-            continue
-        for img_name in os.listdir(class_dir):
-            if img_name.endswith('.jpg'):
-                img_path = os.path.join(class_dir, img_name)
-                img_array = crop_and_preprocess(img_path)
-                x_data.append(img_array.reshape(48, 48, 1))
-                y_labels.append(label)
-                
-    return np.array(x_data), np.array(y_labels)
-
 # Load and preprocess data
+# The data is in data/train/closed and data/train/open; the packed store
+# only decodes images added since the last run, and the pipeline streams
+# from it instead of holding the dataset as one array.
 DATA_DIR = "./data"
-X, y = load_dataset(DATA_DIR)
-print(f"Loaded {len(X)} images.")
+BATCH_SIZE = 32
+VALIDATION_SPLIT = 0.2
+SEED = int(os.environ.get("GATE_TRAIN_SEED", "0"))
+
+dataset = open_dataset(DATA_DIR, ROI, "box48")
+print(f"Loaded {len(dataset)} images.")
 
-# SHUFFLE DATA (Crucial for subset='training'/'validation')
-indices = np.arange(len(X))
-np.random.shuffle(indices)
-X = X[indices]
-y = y[indices]
+# Stratified, deterministic split: same validation images on every run
+train_idx, val_idx = stratified_split(dataset, VALIDATION_SPLIT, seed=SEED)
+print(f"Training on {len(train_idx)} images, validating on {len(val_idx)}.")
+tf.keras.utils.set_random_seed(SEED)
 
-# Data Augmentation logic
-datagen = ImageDataGenerator(
-    brightness_range=[0.7, 1.3],
-    zoom_range=0.1,
-    width_shift_range=0.05,
-    height_shift_range=0.05,
-    horizontal_flip=False,
-    validation_split=0.2
-)
+# Data Augmentation (brightness, zoom, shift) runs in the input pipeline
+train_ds = make_dataset(dataset, train_idx, BATCH_SIZE, augment=True, shuffle=True, seed=SEED)
+val_ds = make_dataset(dataset, val_idx, BATCH_SIZE, cache=True)
 
 # Tiny CNN Architecture (Strided Conv for TFLM Compatibility)
 model = models.Sequential([
@@ -79,11 +45,12 @@ model.compile(optimizer='adam',
               metrics=['accuracy'])
 
 print("Starting training...")
-# Simple training without generator for faster convergence on small data
-history = model.fit(X, y, epochs=100, validation_split=0.2)
+history = model.fit(train_ds, epochs=100, validation_data=val_ds)
 
 # Export model in Keras format
 model.save("gate_detector_tiny.keras")
+write_manifest("gate_detector_tiny.keras", dataset, train_idx, seed=SEED,
+               val_accuracy=float(history.history['val_accuracy'][-1]))
 print("Tiny CNN model saved as gate_detector_tiny.keras")
 
 # Allow history to be accessed
@@ -0,0 +1,102 @@
+"""
+tf.data input pipeline for training on the packed dataset store.
+
+Images are streamed from the store's memory-mapped uint8 rows, so memory
+stays flat as data/train grows, and augmented per batch on the fly with
+the brightness/zoom/shift ranges the old ImageDataGenerator was configured
+with (but never applied).
+"""
+import json
+import os
+
+import numpy as np
+import tensorflow as tf
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+# Written next to the .keras model: which images (by content hash) it was
+# trained on, so finetune_tiny_cnn.py can tell new captures from old ones.
+MANIFEST_SUFFIX = ".train.json"
+
+BRIGHTNESS_RANGE = (0.7, 1.3)
+ZOOM_RANGE = 0.1
+SHIFT_RANGE = 0.05
+
+# Reflect-pad by this fraction of the image before cropping, enough for the
+# largest zoom-out plus shift, so the borders look like 'nearest'-style fill
+# instead of black bars.
+_PAD_FRACTION = ZOOM_RANGE / 2 + SHIFT_RANGE + 0.01
+
+
+def augment_batch(images):
+    """Random brightness, zoom and shift for a float (n, h, w, 1) batch in 0-1."""
+    n = tf.shape(images)[0]
+    height, width = images.shape[1], images.shape[2]
+    pad_y, pad_x = int(np.ceil(height * _PAD_FRACTION)), int(np.ceil(width * _PAD_FRACTION))
+    padded = tf.pad(images, [[0, 0], [pad_y, pad_y], [pad_x, pad_x], [0, 0]], mode="SYMMETRIC")
+
+    # Box of the output window in the padded image's normalized coordinates.
+    scale = tf.random.uniform([n], 1.0 - ZOOM_RANGE, 1.0 + ZOOM_RANGE)
+    cy = 0.5 + tf.random.uniform([n], -SHIFT_RANGE, SHIFT_RANGE)
+    cx = 0.5 + tf.random.uniform([n], -SHIFT_RANGE, SHIFT_RANGE)
+    half_h = scale * height / (2 * (height + 2 * pad_y))
+    half_w = scale * width / (2 * (width + 2 * pad_x))
+    cy = (cy * height + pad_y) / (height + 2 * pad_y)
+    cx = (cx * width + pad_x) / (width + 2 * pad_x)
+    boxes = tf.stack([cy - half_h, cx - half_w, cy + half_h, cx + half_w], axis=1)
+    images = tf.image.crop_and_resize(padded, boxes, tf.range(n), (height, width))
+
+    brightness = tf.random.uniform([n, 1, 1, 1], *BRIGHTNESS_RANGE)
+    return tf.clip_by_value(images * brightness, 0.0, 1.0)
+
+
+def make_dataset(dataset, indices, batch_size=32, augment=False, shuffle=False, cache=False, seed=0):
+    """
+    A tf.data.Dataset of (float (n, h, w, 1) images, int labels) batches for
+    the given indices of a PackedDataset. Rows are read from the memory map
+    as the pipeline pulls them; cache=True keeps the decoded uint8 rows in
+    memory after the first epoch (use it for small, repeatedly evaluated
+    sets such as validation).
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    width, height = dataset.size
+    labels = dataset.labels
+
+    def rows():
+        for i in indices:
+            yield dataset.images([i])[0], labels[i]
+
+    ds = tf.data.Dataset.from_generator(
+        rows,
+        output_signature=(tf.TensorSpec((height, width), tf.uint8), tf.TensorSpec((), tf.int64)),
+    )
+    if cache:
+        ds = ds.cache()
+    if shuffle:
+        ds = ds.shuffle(min(len(indices), 4096), seed=seed, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+    ds = ds.map(lambda x, y: (tf.cast(x, tf.float32)[..., tf.newaxis] / 255.0, y), num_parallel_calls=AUTOTUNE)
+    if augment:
+        ds = ds.map(lambda x, y: (augment_batch(x), y), num_parallel_calls=AUTOTUNE)
+    return ds.prefetch(AUTOTUNE)
+
+
+def manifest_path(model_path):
+    return os.path.splitext(model_path)[0] + MANIFEST_SUFFIX
+
+
+def read_manifest(model_path):
+    """The training manifest of model_path, or None if there is none."""
+    try:
+        with open(manifest_path(model_path), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(model_path, dataset, train_indices, **extra):
+    manifest = {"trained_on": sorted({dataset.hashes[i] for i in train_indices}), **extra}
+    tmp_path = manifest_path(model_path) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path(model_path))
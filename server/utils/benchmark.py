@@ -0,0 +1,262 @@
+"""
+Stage-level benchmark of the server hot path.
+
+Times (and measures Python-level allocations of) each stage gate.py runs
+for a request, on synthetic camera-resolution JPEGs plus the images in
+data/train:
+
+  camera_fetch     get_camera_image() against camera_simulator.py on localhost
+  decode           decode_image() (JPEG decode, drafted with GATE_FAST_DECODE=1)
+  preprocess       crop_and_preprocess() on a decoded frame
+  invoke           one interpreter invoke on a preprocessed frame
+  get_fresh        GET /?max_age=0 through Flask's test client (fetch + classify + JSON)
+  get_cached       GET / served from the sampler's cached result
+  save_image       save_image() (queueing a capture)
+  save_durable     save_image() plus waiting for the fsync'ed write
+
+Run from server/:
+  python utils/benchmark.py --save-baseline   # record benchmark_baseline.json
+  python utils/benchmark.py                   # compare against it; exit 1 on a regression
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+BASELINE_PATH = "benchmark_baseline.json"
+DEFAULT_RESOLUTIONS = "704x576,1920x1080"
+
+# === Synthetic frames ===
+def synthetic_jpeg(width, height, seed, quality=85):
+    """A camera-like frame: gradient sky, noisy ground and a few hard edges."""
+    rng = np.random.default_rng(seed)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None, None]
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :, None]
+    base = 60 + 120 * y + 40 * x + rng.normal(0, 12, (height, width, 3))
+    image = Image.fromarray(np.clip(base, 0, 255).astype(np.uint8))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x0, y0 = int(rng.integers(0, width - 20)), int(rng.integers(0, height - 20))
+        x1, y1 = x0 + int(rng.integers(10, width // 4)), y0 + int(rng.integers(10, height // 4))
+        draw.rectangle((x0, y0, x1, y1), fill=tuple(int(v) for v in rng.integers(0, 255, 3)))
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+def load_frames(resolutions, per_resolution, data_dir):
+    """{"synthetic WxH": [jpeg bytes], "data/train": [jpeg bytes]}"""
+    frames = {}
+    for width, height in resolutions:
+        frames[f"synthetic {width}x{height}"] = [synthetic_jpeg(width, height, seed)
+                                                 for seed in range(per_resolution)]
+    paths = sorted(glob.glob(os.path.join(data_dir, "train", "*", "*.jpg")))
+    if paths:
+        frames["data/train"] = [open(p, "rb").read() for p in paths]
+    return frames
+
+# === Measurement ===
+def measure(fn, iterations, warmup=3, alloc_iterations=5):
+    """
+    Runs fn() and returns latency stats in ms plus the mean peak and net
+    traced Python/numpy allocation per call (C allocations inside PIL and
+    TFLite are not traced).
+    """
+    for _ in range(warmup):
+        fn()
+    times = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        times[i] = (time.perf_counter() - start) * 1000
+
+    tracemalloc.start()
+    peaks, nets = [], []
+    for _ in range(alloc_iterations):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn()
+        after, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+        nets.append(after - before)
+    tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "mean_ms": round(float(times.mean()), 4),
+        "p50_ms": round(float(np.percentile(times, 50)), 4),
+        "p95_ms": round(float(np.percentile(times, 95)), 4),
+        "min_ms": round(float(times.min()), 4),
+        "alloc_peak_kb": round(float(np.mean(peaks)) / 1024, 1),
+        "alloc_net_kb": round(float(np.mean(nets)) / 1024, 1),
+    }
+
+def cycle(items):
+    state = {"i": 0}
+    def next_item():
+        item = items[state["i"] % len(items)]
+        state["i"] += 1
+        return item
+    return next_item
+
+def run_benchmarks(frames, iterations):
+    import gate
+    from camera_client import CameraClient
+    from camera_simulator import CameraSimulator
+    from capture_writer import CaptureWriter
+
+    pool = gate.interpreter_pool
+    if pool is None:
+        raise SystemExit(f"No model loaded from {gate.MODEL_PATH}")
+    target_size = gate.model_input_size(pool)
+    results = {}
+
+    tmp_dir = tempfile.mkdtemp(prefix="gate-bench-")
+    original_camera, original_writer = gate.camera, gate.capture_writer
+    gate.capture_writer = CaptureWriter(root=tmp_dir, fsync_batch=1)
+    client = gate.app.test_client()
+    try:
+        for name, jpegs in frames.items():
+            print(f"Benchmarking {name} ({len(jpegs)} frames)...")
+            stages = {}
+            stand_in = CameraSimulator({"frames": jpegs}).start()
+            gate.camera = CameraClient(stand_in.url, "admin", "")
+            try:
+                stages["camera_fetch"] = measure(gate.get_camera_image, iterations)
+
+                next_jpeg = cycle(jpegs)
+                def decode():
+                    image = Image.open(io.BytesIO(next_jpeg()))
+                    gate.decode_image(image, target_size)
+                stages["decode"] = measure(decode, iterations)
+
+                decoded = []
+                for data in jpegs:
+                    image = Image.open(io.BytesIO(data))
+                    decoded.append((image, target_size, gate.decode_image(image, target_size)))
+                next_decoded = cycle(decoded)
+                stages["preprocess"] = measure(lambda: gate.crop_and_preprocess(*next_decoded()), iterations)
+
+                inputs = [gate.crop_and_preprocess(*args) for args in decoded]
+                next_input = cycle(inputs)
+                def invoke():
+                    with pool.checkout() as slot:
+                        slot.run(next_input())
+                stages["invoke"] = measure(invoke, iterations)
+
+                def get_fresh():
+                    response = client.get("/?max_age=0")
+                    assert response.status_code == 200, response.data
+                stages["get_fresh"] = measure(get_fresh, iterations)
+                stages["get_cached"] = measure(lambda: client.get("/"), iterations)
+
+                stages["save_image"] = measure(lambda: gate.save_image(next_jpeg(), "bench"), iterations)
+                gate.capture_writer.flush()
+                def save_durable():
+                    gate.save_image(next_jpeg(), "bench")
+                    gate.capture_writer.flush()
+                stages["save_durable"] = measure(save_durable, iterations)
+            finally:
+                stand_in.stop()
+                gate.camera.close()
+            results[name] = stages
+    finally:
+        gate.capture_writer.close()
+        gate.camera, gate.capture_writer = original_camera, original_writer
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+# === Baseline ===
+def compare(results, baseline, threshold, min_delta_ms):
+    """Returns a list of regression messages: p50 latency or peak allocation up by more than threshold."""
+    regressions = []
+    for name, stages in results.items():
+        for stage, current in stages.items():
+            previous = baseline.get("results", {}).get(name, {}).get(stage)
+            if previous is None:
+                continue
+            limit = previous["p50_ms"] * (1 + threshold)
+            if current["p50_ms"] > limit and current["p50_ms"] - previous["p50_ms"] > min_delta_ms:
+                regressions.append(f"{name} / {stage}: p50 {previous['p50_ms']:.3f} -> {current['p50_ms']:.3f} ms")
+            if current["alloc_peak_kb"] > max(previous["alloc_peak_kb"] * (1 + threshold), previous["alloc_peak_kb"] + 4):
+                regressions.append(f"{name} / {stage}: peak allocation "
+                                   f"{previous['alloc_peak_kb']} -> {current['alloc_peak_kb']} KB")
+    return regressions
+
+def print_results(results, baseline=None):
+    for name, stages in results.items():
+        print(f"\n=== {name} ===")
+        print(f"{'stage':<14}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}{'peak KB':>10}{'net KB':>9}{'vs base':>10}")
+        for stage, s in stages.items():
+            previous = (baseline or {}).get("results", {}).get(name, {}).get(stage)
+            change = f"{(s['p50_ms'] / previous['p50_ms'] - 1) * 100:+.0f}%" if previous and previous["p50_ms"] else ""
+            print(f"{stage:<14}{s['p50_ms']:>10.3f}{s['p95_ms']:>10.3f}{s['mean_ms']:>10.3f}"
+                  f"{s['alloc_peak_kb']:>10.1f}{s['alloc_net_kb']:>9.1f}{change:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the gate server's per-stage latency and allocations")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--resolutions", default=DEFAULT_RESOLUTIONS, help="synthetic frame sizes, e.g. 704x576,1920x1080")
+    parser.add_argument("--frames", type=int, default=8, help="synthetic frames per resolution")
+    parser.add_argument("--data", default=os.path.join(SERVER_DIR, "..", "data"),
+                        help="also benchmark <data>/train/*/*.jpg (default: the repo's checked-in samples)")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed relative p50/peak-allocation increase over the baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=0.2,
+                        help="ignore p50 increases smaller than this (timer noise on sub-ms stages)")
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args()
+
+    resolutions = [tuple(int(v) for v in r.lower().split("x")) for r in args.resolutions.split(",") if r]
+    frames = load_frames(resolutions, args.frames, args.data)
+    results = run_benchmarks(frames, args.iterations)
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count(), "fast_decode": os.environ.get("GATE_FAST_DECODE", "0")},
+        "iterations": args.iterations,
+        "results": results,
+    }
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved as {args.baseline}")
+        return
+    if baseline is None:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to record one.")
+        return
+
+    regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+    if regressions:
+        print(f"\nFAIL: {len(regressions)} regression(s) over {args.threshold * 100:.0f}% vs {args.baseline}:")
+        for r in regressions:
+            print(f"  {r}")
+        sys.exit(1)
+    print(f"\nOK: no stage regressed more than {args.threshold * 100:.0f}% vs {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from preprocessing import load_roi, preprocess, fast_crop_and_preprocess, PreprocessMode
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the fast (JPEG draft) decode path against the reference path")
+    parser.add_argument("images", nargs="*", help="JPEG files (default: data/train/*/*.jpg)")
+    parser.add_argument("--roi", default="roi.json")
+    parser.add_argument("--size", type=int, default=48, help="Target size (square)")
+    parser.add_argument("--tolerance", type=float, default=8.0,
+                        help="Max allowed mean abs difference in 0-255 gray levels")
+    args = parser.parse_args()
+
+    roi = load_roi(args.roi)
+    target_size = (args.size, args.size)
+    paths = args.images or sorted(glob.glob(os.path.join("data", "train", "*", "*.jpg")))
+    if not paths:
+        print("No images found.")
+        sys.exit(1)
+
+    ref_time = fast_time = 0.0
+    worst = 0.0
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+
+        start = time.perf_counter()
+        ref = preprocess(Image.open(io.BytesIO(data)), roi, PreprocessMode(target_size, "box"))
+        ref_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        fast = fast_crop_and_preprocess(Image.open(io.BytesIO(data)), roi, target_size)
+        fast_time += time.perf_counter() - start
+
+        diff = np.abs(ref - fast) * 255.0
+        worst = max(worst, diff.mean())
+        print(f"{path}: mean abs diff {diff.mean():.2f}, max {diff.max():.0f}")
+
+    n = len(paths)
+    print(f"\nReference decode: {ref_time / n * 1000:.2f} ms/image")
+    print(f"Fast decode:      {fast_time / n * 1000:.2f} ms/image")
+    print(f"Worst mean abs diff: {worst:.2f} (tolerance {args.tolerance})")
+    if worst > args.tolerance:
+        print("FAIL: fast decode drifts too far from the reference path.")
+        sys.exit(1)
+    print("OK")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Load generator for the gate server's / and /capture endpoints.
+
+Closed loop (default): --concurrency clients each send a request, wait for
+the response (plus --think seconds) and send the next one, like the HomeKit
+bridge or a dashboard polling in a loop.
+
+Open loop: requests arrive at --rate per second whether or not earlier ones
+have finished, like many independent clients. Up to --concurrency are in
+flight at once; latency is measured from each request's scheduled start, so
+time spent queued behind a slow server counts (no coordinated omission).
+
+Endpoints are mixed by weight, e.g. --endpoint / --endpoint "/capture?status=loadtest@0.1".
+/capture writes real files to data/train/<status>; the default "loadtest"
+label is outside the training classes.
+
+Usage: python utils/load_test.py --url http://127.0.0.1:5001 --duration 30 --concurrency 8
+         [--mode open --rate 50 [--poisson]] [--csv timeline.csv] [--json report.json]
+"""
+import argparse
+import csv
+import http.client
+import json
+import queue
+import random
+import socket
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+DEFAULT_ENDPOINTS = ["/", "/capture?status=loadtest@0.05"]
+
+
+def parse_endpoints(specs):
+    """["/", "/capture?status=x@0.1"] -> ([paths], [weights])"""
+    paths, weights = [], []
+    for spec in specs:
+        path, _, weight = spec.rpartition("@") if "@" in spec else (spec, "", "1")
+        paths.append(path)
+        weights.append(float(weight))
+    return paths, weights
+
+
+class Client:
+    """One keep-alive connection to the server; reconnects after an error."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.timeout = timeout
+        self.conn = None
+
+    def get(self, path):
+        """Returns the outcome: the HTTP status code as a string, "timeout" or "connection error"."""
+        try:
+            if self.conn is None:
+                cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+                self.conn = cls(self.host, self.port, timeout=self.timeout)
+            self.conn.request("GET", path)
+            response = self.conn.getresponse()
+            response.read()
+            if response.will_close:
+                self.close()
+            return str(response.status)
+        except socket.timeout:
+            self.close()
+            return "timeout"
+        except (OSError, http.client.HTTPException):
+            self.close()
+            return "connection error"
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class Recorder:
+    """Collects (start offset, endpoint, latency, queue delay, outcome) per request."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self._lock = threading.Lock()
+        self.rows = []
+
+    def record(self, scheduled, started, finished, path, outcome):
+        with self._lock:
+            self.rows.append((scheduled - self.t0, path, (finished - scheduled) * 1000,
+                              (started - scheduled) * 1000, outcome))
+
+
+def run_closed(base_url, paths, weights, concurrency, deadline, max_requests, think, timeout, recorder):
+    remaining = [max_requests]
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        client = Client(base_url, timeout)
+        while time.perf_counter() < deadline:
+            with lock:
+                if remaining[0] is not None:
+                    if remaining[0] <= 0:
+                        break
+                    remaining[0] -= 1
+            path = rng.choices(paths, weights)[0]
+            start = time.perf_counter()
+            outcome = client.get(path)
+            recorder.record(start, start, time.perf_counter(), path, outcome)
+            if think:
+                time.sleep(think)
+        client.close()
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def run_open(base_url, paths, weights, concurrency, deadline, max_requests, rate, poisson, timeout, recorder):
+    pending = queue.Queue()
+
+    def worker():
+        client = Client(base_url, timeout)
+        while True:
+            item = pending.get()
+            if item is None:
+                break
+            scheduled, path = item
+            started = time.perf_counter()
+            outcome = client.get(path)
+            recorder.record(scheduled, started, time.perf_counter(), path, outcome)
+        client.close()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+
+    rng = random.Random(0)
+    scheduled = time.perf_counter()
+    sent = 0
+    while scheduled < deadline and (max_requests is None or sent < max_requests):
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pending.put((scheduled, rng.choices(paths, weights)[0]))
+        sent += 1
+        scheduled += rng.expovariate(rate) if poisson else 1.0 / rate
+    for _ in threads:
+        pending.put(None)
+    for t in threads:
+        t.join()
+
+
+def latency_stats(latencies):
+    if not latencies:
+        return {"count": 0}
+    values = np.asarray(latencies)
+    return {"count": len(values),
+            "p50_ms": round(float(np.percentile(values, 50)), 2),
+            "p95_ms": round(float(np.percentile(values, 95)), 2),
+            "p99_ms": round(float(np.percentile(values, 99)), 2),
+            "max_ms": round(float(values.max()), 2),
+            "mean_ms": round(float(values.mean()), 2)}
+
+
+def summarize(rows, elapsed):
+    """Per endpoint and overall: latency percentiles (successes only), outcomes and throughput."""
+    def block(selected):
+        ok = [r[2] for r in selected if r[4].startswith("2")]
+        outcomes = {}
+        for r in selected:
+            outcomes[r[4]] = outcomes.get(r[4], 0) + 1
+        return {"requests": len(selected), "ok": len(ok), "errors": len(selected) - len(ok),
+                "outcomes": dict(sorted(outcomes.items())),
+                "throughput_rps": round(len(selected) / elapsed, 2) if elapsed > 0 else None,
+                "latency": latency_stats(ok),
+                "queue_delay_p99_ms": round(float(np.percentile([r[3] for r in selected], 99)), 2) if selected else None}
+
+    report = {"elapsed_seconds": round(elapsed, 3), "total": block(rows), "endpoints": {}}
+    for path in sorted({r[1] for r in rows}):
+        report["endpoints"][path] = block([r for r in rows if r[1] == path])
+    return report
+
+
+def print_report(report, mode):
+    print(f"\n=== {mode} loop, {report['elapsed_seconds']}s ===")
+    print(f"{'endpoint':<32}{'reqs':>7}{'errors':>8}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, b in [*report["endpoints"].items(), ("TOTAL", report["total"])]:
+        lat = b["latency"]
+        cols = [lat.get(k) for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms")]
+        cells = "".join(f"{c:>9.1f}" if c is not None else f"{'-':>9}" for c in cols)
+        print(f"{name[:31]:<32}{b['requests']:>7}{b['errors']:>8}{b['throughput_rps']:>9.1f}{cells}")
+    print("Latencies in ms (successful requests)")
+    errors = {k: v for k, v in report["total"]["outcomes"].items() if not k.startswith("2")}
+    if errors:
+        print("Errors: " + ", ".join(f"{k}: {v}" for k, v in errors.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the gate server's / and /capture endpoints")
+    parser.add_argument("--url", default="http://127.0.0.1:5001", help="server base URL")
+    parser.add_argument("--endpoint", action="append",
+                        help=f"PATH[@WEIGHT], repeatable (default: {' '.join(DEFAULT_ENDPOINTS)})")
+    parser.add_argument("--mode", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", type=int, default=4, help="clients (closed) or max in flight (open)")
+    parser.add_argument("--rate", type=float, default=10.0, help="open loop: requests per second")
+    parser.add_argument("--poisson", action="store_true", help="open loop: exponential inter-arrival times")
+    parser.add_argument("--think", type=float, default=0.0, help="closed loop: pause between a client's requests (s)")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--requests", type=int, help="stop after this many requests")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout (s)")
+    parser.add_argument("--csv", help="write a per-request timeline here")
+    parser.add_argument("--json", help="write the summary here")
+    args = parser.parse_args()
+
+    paths, weights = parse_endpoints(args.endpoint or DEFAULT_ENDPOINTS)
+    recorder = Recorder()
+    deadline = recorder.t0 + args.duration
+    print(f"Load testing {args.url} ({args.mode} loop, concurrency {args.concurrency}"
+          + (f", {args.rate}/s" if args.mode == "open" else "") + f") for {args.duration}s: "
+          + ", ".join(f"{p} x{w:g}" for p, w in zip(paths, weights)))
+    if args.mode == "closed":
+        run_closed(args.url, paths, weights, args.concurrency, deadline, args.requests, args.think,
+                   args.timeout, recorder)
+    else:
+        run_open(args.url, paths, weights, args.concurrency, deadline, args.requests, args.rate, args.poisson,
+                 args.timeout, recorder)
+    elapsed = time.perf_counter() - recorder.t0
+
+    rows = sorted(recorder.rows)
+    report = summarize(rows, elapsed)
+    report["config"] = {k: v for k, v in vars(args).items() if k not in ("csv", "json")}
+    print_report(report, args.mode)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["start_s", "endpoint", "latency_ms", "queue_delay_ms", "outcome"])
+            for start, path, latency, queue_delay, outcome in rows:
+                writer.writerow([f"{start:.4f}", path, f"{latency:.2f}", f"{queue_delay:.2f}", outcome])
+        print(f"Timeline saved as {args.csv}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Summary saved as {args.json}")
+    if report["total"]["requests"] == 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,11 @@
-import io
-import json
 import numpy as np
 import tensorflow as tf
-from PIL import Image
-import urllib.request
-import base64
 import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from camera_client import CameraClient
+from preprocessing import load_roi, preprocess, mode_for_input_shape
 
 # === Configuration ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -18,40 +18,22 @@ gate_user = 'admin'
 gate_password = 'pccw1234'
 
 # === Load ROI from JSON ===
-def load_roi(filepath=ROI_PATH):
-    with open(filepath, "r") as f:
-        roi_data = json.load(f)
-    return roi_data["x"], roi_data["y"], roi_data["x1"], roi_data["y1"]
-
-ROI = load_roi()
+ROI = load_roi(ROI_PATH)
 
 def fetch_image():
     """Fetches the current image from the camera."""
-    auth_str = f'{gate_user}:{gate_password}'.encode('ascii')
-    auth_b64 = base64.b64encode(auth_str).decode('ascii')
-    headers = {'Authorization': 'Basic ' + auth_b64}
-    
-    req = urllib.request.Request(gate_url, headers=headers)
     try:
-        with urllib.request.urlopen(req, timeout=5) as response:
-            return Image.open(io.BytesIO(response.read()))
+        return CameraClient(gate_url, gate_user, gate_password).fetch_image()
     except Exception as e:
         print(f"Error fetching image: {e}")
         return None
 
-def preprocess_image(image, target_size=(96, 96)):
+def preprocess_image(image, mode):
     """Crops and resizes the image for the TinyML model."""
-    img = image.convert('L') # Grayscale
-    x, y, x1, y1 = ROI
-    img = img.crop((x, y, x1, y1))
-    
-    # Use BOX to match training and ESP32 logic
-    resample_filter = Image.BOX if hasattr(Image, 'BOX') else Image.BILINEAR
-    img = img.resize(target_size, resample=resample_filter)
-    
-    arr = np.array(img).astype('float32')
-    print(f"Python ROI Avg Brightness: {np.mean(arr):.2f}")
-    return arr / 255.0
+    # Grayscale, crop, BOX resize to match training
+    arr = preprocess(image, ROI, mode)
+    print(f"Python ROI Avg Brightness: {np.mean(arr) * 255.0:.2f}")
+    return arr
 
 def predict_current():
     image = fetch_image()
@@ -59,7 +41,6 @@ def predict_current():
         return
 
     print(f"Captured image resolution: {image.size}")
-    img_array = preprocess_image(image)
 
     # Load TFLite model
     interpreter = tf.lite.Interpreter(model_path=MODEL_PATH)
@@ -68,6 +49,8 @@ def predict_current():
     input_details = interpreter.get_input_details()
     output_details = interpreter.get_output_details()
 
+    img_array = preprocess_image(image, mode_for_input_shape(input_details[0]['shape']))
+
     # Check if input is quantized
     if input_details[0]['dtype'] == np.int8:
         input_scale, input_zero_point = input_details[0]['quantization']
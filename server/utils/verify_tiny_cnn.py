@@ -1,74 +1,97 @@
+import argparse
+import json
 import numpy as np
-import tensorflow as tf
 import os
-import json
-from PIL import Image
+import sys
 
-# === Load ROI from JSON ===
-def load_roi(filepath="roi.json"):
-    with open(filepath, "r") as f:
-        roi_data = json.load(f)
-    return roi_data["x"], roi_data["y"], roi_data["x1"], roi_data["y1"]
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from preprocessing import load_roi
+from model_eval import evaluate
 
+# === Load ROI from JSON ===
 ROI = load_roi()
+CLASSES = ['closed', 'open']
 
-def crop_and_preprocess(img_path, target_size=(96, 96)):
-    img = Image.open(img_path).convert('L') # Convert to Grayscale
-    x, y, x1, y1 = ROI
-    img = img.crop((x, y, x1, y1))
-    img = img.resize(target_size)
-    return np.array(img).astype('float32') / 255.0
+def print_model_report(model_path, result, show_misclassified=20):
+    print(f"\n=== {model_path} ({result['input_size'][0]}x{result['input_size'][1]}) ===")
+    for class_name, c in result["per_class"].items():
+        correct = round(c["accuracy"] * c["images"])
+        print(f"Class {class_name.upper()}: {correct}/{c['images']} correct ({c['accuracy']*100:.2f}%)")
+    if result["accuracy"] is not None:
+        print(f"Overall Accuracy: {result['accuracy']*100:.2f}% "
+              f"(class average {np.mean([c['accuracy'] for c in result['per_class'].values()])*100:.2f}%)")
 
-def verify_model(model_path, data_dir):
-    # Load TFLite model and allocate tensors.
-    interpreter = tf.lite.Interpreter(model_path=model_path)
-    interpreter.allocate_tensors()
+    # Confusion matrix: rows are the true class, columns the prediction
+    print("\nConfusion matrix (rows: true, columns: predicted)")
+    print(" " * 10 + "".join(f"{c:>10}" for c in CLASSES))
+    for class_name, row in zip(CLASSES, result["confusion_matrix"]):
+        print(f"{class_name:>10}" + "".join(f"{n:>10}" for n in row))
 
-    # Get input and output tensors.
-    input_details = interpreter.get_input_details()
-    output_details = interpreter.get_output_details()
+    print(f"\nConfidence histogram (expected calibration error {result['expected_calibration_error']:.4f})")
+    for b in result["calibration"]:
+        if b["count"]:
+            print(f"  {b['range'][0]:.1f}-{b['range'][1]:.1f}: {b['count']:>6} images, "
+                  f"accuracy {b['accuracy']*100:6.2f}%, mean confidence {b['mean_confidence']*100:6.2f}%")
 
-    input_shape = input_details[0]['shape']
-    
-    classes = ['closed', 'open']
-    results = []
+    misclassified = result["misclassified"]
+    print(f"\nMisclassified: {len(misclassified)}")
+    for m in misclassified[:show_misclassified]:
+        print(f"  {m['file']}: {m['label']} -> {m['predicted']} ({m['confidence']*100:.1f}%)")
+    if len(misclassified) > show_misclassified:
+        print(f"  ... {len(misclassified) - show_misclassified} more (see --json)")
 
-    print(f"Verifying model: {model_path}")
-    for label, class_name in enumerate(classes):
-        class_dir = os.path.join(data_dir, 'train', class_name)
-        if not os.path.exists(class_dir):
+    print(f"\nThroughput: {result['images_per_second']} images/sec "
+          f"({'batched' if result['batched'] else 'one invoke per image'}; "
+          f"dataset load {result['load_seconds']}s)")
+
+def verify_model(model_path, data_dir, batch_size=256, show_misclassified=20):
+    """Evaluates one model on data_dir/train and prints its report. Returns the report dict."""
+    return verify_models([model_path], data_dir, batch_size, show_misclassified)
+
+def verify_models(model_paths, data_dir, batch_size=256, show_misclassified=20):
+    """Evaluates the models side by side in one pass over the data and prints the reports."""
+    print(f"Verifying: {', '.join(model_paths)}")
+    report = evaluate(model_paths, data_dir, ROI, CLASSES, batch_size=batch_size)
+    for path in model_paths:
+        print_model_report(path, report["models"][path], show_misclassified)
+
+    for entry in report.get("comparison", []):
+        a, b = entry["models"]
+        print(f"\n=== {a} vs {b} ===")
+        if "agreement" not in entry:
+            print("Different input sizes; no per-image comparison.")
+            continue
+        ra, rb = report["models"][a], report["models"][b]
+        if ra["accuracy"] is None:
+            print("No images.")
             continue
-            
-        count = 0
-        correct = 0
-        for img_name in os.listdir(class_dir):
-            if img_name.endswith('.jpg'):
-                img_path = os.path.join(class_dir, img_name)
-                img_array = crop_and_preprocess(img_path)
-                
-                # Check if input is quantized
-                if input_details[0]['dtype'] == np.int8:
-                    input_scale, input_zero_point = input_details[0]['quantization']
-                    img_array = (img_array / input_scale + input_zero_point).astype(np.int8)
-                
-                input_data = img_array.reshape(input_shape)
-                interpreter.set_tensor(input_details[0]['index'], input_data)
-                interpreter.invoke()
+        print(f"Accuracy: {ra['accuracy']*100:.2f}% vs {rb['accuracy']*100:.2f}%")
+        print(f"Agreement: {entry['agreement']*100:.2f}% ({len(entry['disagreements'])} images differ)")
+        for d in entry["disagreements"][:show_misclassified]:
+            print(f"  {d['file']}: {d['predicted'][0]} vs {d['predicted'][1]}")
+    return report
 
-                output_data = interpreter.get_tensor(output_details[0]['index'])
-                predicted_label = np.argmax(output_data)
-                
-                if predicted_label == label:
-                    correct += 1
-                count += 1
-                
-        if count > 0:
-            accuracy = correct / count
-            print(f"Class {class_name.upper()}: {correct}/{count} correct ({accuracy*100:.2f}%)")
-            results.append(accuracy)
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate one or two TFLite models on the labeled training set")
+    parser.add_argument("models", nargs="*", default=["gate_detector_tiny.tflite"],
+                        help="model files; give two to compare them side by side")
+    parser.add_argument("--data", default="./data")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--show-misclassified", type=int, default=20, help="files to list per model")
+    parser.add_argument("--json", help="also write the full report (every misclassified file) here")
+    parser.add_argument("--min-accuracy", type=float,
+                        help="exit 1 if the first model's overall accuracy (0-1) is below this")
+    args = parser.parse_args()
 
-    if results:
-        print(f"Overall Accuracy: {np.mean(results)*100:.2f}%")
+    report = verify_models(args.models, args.data, args.batch_size, args.show_misclassified)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport saved as {args.json}")
+    accuracy = report["models"][args.models[0]]["accuracy"]
+    if args.min_accuracy is not None and (accuracy is None or accuracy < args.min_accuracy):
+        print(f"FAIL: accuracy {accuracy} is below {args.min_accuracy}")
+        sys.exit(1)
 
 if __name__ == "__main__":
-    verify_model("gate_detector_tiny.tflite", "./data")
+    main()